@@ -1,8 +1,12 @@
 """Provide an interface for the Rohde and Schwarz oscilloscopes."""
 
 __all__ = ["ScopeConnection", "RTMConnection", "RTOConnection",
-           "Vxi11Exception"]
+           "ScopeFleet", "CaptureRecorder", "CaptureReader",
+           "CommandError", "Vxi11Exception"]
 
 # Imports
 from rohdescope.connection import ScopeConnection, RTMConnection, RTOConnection
+from rohdescope.fleet import ScopeFleet
+from rohdescope.recorder import CaptureRecorder, CaptureReader
+from rohdescope.common import CommandError
 from vxi11.vxi11 import Vxi11Exception
@@ -0,0 +1,217 @@
+"""Provide streaming accumulators folding raw frames in place."""
+
+# Imports
+import numpy
+
+
+# Base accumulator class
+class Accumulator(object):
+    """Fold raw frames into running per-channel states.
+
+    The frames are dictionaries of raw values indexed by channel
+    (e.g. from get_waveform_data or parse_waveform_string), possibly
+    2-D for the envelopes (see acquire_reduced). The states
+    are allocated on the first frame and updated in place, so folding
+    a frame does not allocate. The results are converted to divisions
+    (or volts if scales and positions are given) only once, with the
+    conversion of the connection (see ScopeConnection.get_conversion).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drop the states and the frame count."""
+        self.states = {}
+        self.dtypes = {}
+        self.count = 0
+
+    def add(self, data_dict):
+        """Fold a frame into the states."""
+        self.count += 1
+        for channel, data in data_dict.items():
+            state = self.states.get(channel)
+            if state is None:
+                state = self.states[channel] = self.create(data)
+                self.dtypes[channel] = data.dtype
+            elif data.shape != state[0].shape:
+                raise ValueError("The frame shape changed")
+            self.fold(state, data)
+
+    def create(self, data):
+        """Return the initial state of a channel.
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    def fold(self, state, data):
+        """Fold the raw values of a channel into its state.
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    def get_conversion(self, connection, channel, scales=None,
+                       positions=None):
+        """Return the (median, factor, offset) tuple of a channel."""
+        dtype = self.dtypes[channel]
+        if dtype.kind == "f":
+            return 0.0, 1.0, 0.0
+        scale = None if scales is None else scales[channel]
+        position = None if positions is None else positions[channel]
+        return connection.get_conversion(dtype, scale, position)
+
+    def convert(self, connection, channel, values, scales=None,
+                positions=None):
+        """Convert raw values (as floats) of a channel in place."""
+        median, factor, offset = self.get_conversion(
+            connection, channel, scales, positions)
+        values -= median
+        values *= factor
+        values -= offset
+        return values
+
+    def result(self, connection, scales=None, positions=None):
+        """Return the converted result as a dictionary.
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+
+# Mean accumulator class
+class MeanAccumulator(Accumulator):
+    """Average the frames by summing the raw integer values.
+
+    The sums use the given integer type: int32 is enough for up to
+    2**23 frames of 8-bit values (or 2**15 frames of 16-bit values).
+    """
+
+    def __init__(self, dtype=numpy.int64):
+        self.dtype = numpy.dtype(dtype)
+        super(MeanAccumulator, self).__init__()
+
+    def create(self, data):
+        """Return the sums of a channel."""
+        dtype = numpy.double if data.dtype.kind == "f" else self.dtype
+        return (numpy.zeros(data.shape, dtype),)
+
+    def fold(self, state, data):
+        """Add the raw values to the sums."""
+        numpy.add(state[0], data, out=state[0], casting="unsafe")
+
+    def result(self, connection, scales=None, positions=None):
+        """Return the mean values as a dictionary."""
+        result = {}
+        for channel, (total,) in self.states.items():
+            mean = total / float(self.count)
+            result[channel] = self.convert(
+                connection, channel, mean, scales, positions)
+        return result
+
+
+# Variance accumulator class
+class VarianceAccumulator(Accumulator):
+    """Compute the running mean and variance with the Welford algorithm.
+
+    The state is kept in double precision, with scratch arrays
+    so the update does not allocate.
+    """
+
+    def create(self, data):
+        """Return the mean, the sum of squared deviations
+        and the scratch arrays of a channel."""
+        shape = data.shape
+        return (numpy.zeros(shape), numpy.zeros(shape),
+                numpy.empty(shape), numpy.empty(shape))
+
+    def fold(self, state, data):
+        """Update the mean and the sum of squared deviations."""
+        mean, m2, delta, scratch = state
+        numpy.subtract(data, mean, out=delta, casting="unsafe")
+        numpy.multiply(delta, 1.0 / self.count, out=scratch)
+        mean += scratch
+        numpy.subtract(data, mean, out=scratch, casting="unsafe")
+        delta *= scratch
+        m2 += delta
+
+    def get_means(self, connection, scales=None, positions=None):
+        """Return the mean values as a dictionary."""
+        return dict(
+            (channel, self.convert(connection, channel, state[0].copy(),
+                                   scales, positions))
+            for channel, state in self.states.items())
+
+    def result(self, connection, scales=None, positions=None,
+               deviation=True):
+        """Return the standard deviations (or the variances if deviation
+        is False) as a dictionary, using the unbiased estimator.
+
+        The positions do not affect the result.
+        """
+        result = {}
+        count = max(self.count - 1, 1)
+        for channel, state in self.states.items():
+            _, factor, _ = self.get_conversion(
+                connection, channel, scales, positions)
+            values = state[1] * (factor ** 2 / count)
+            result[channel] = numpy.sqrt(values, out=values) \
+                if deviation else values
+        return result
+
+
+# Envelope accumulator class
+class EnvelopeAccumulator(Accumulator):
+    """Track the minimum and maximum raw values of every sample."""
+
+    def create(self, data):
+        """Return the minimum and maximum values of a channel."""
+        return data.copy(), data.copy()
+
+    def fold(self, state, data):
+        """Update the minimum and maximum values."""
+        numpy.minimum(state[0], data, out=state[0])
+        numpy.maximum(state[1], data, out=state[1])
+
+    def result(self, connection, scales=None, positions=None):
+        """Return the (minimum, maximum) envelopes as a dictionary."""
+        result = {}
+        for channel, state in self.states.items():
+            result[channel] = tuple(
+                self.convert(connection, channel, values.astype(numpy.double),
+                             scales, positions)
+                for values in state)
+        return result
+
+
+# Exponential accumulator class
+class ExponentialAccumulator(Accumulator):
+    """Compute the exponential moving average of the frames:
+
+        average += alpha * (raw - average)
+    """
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        super(ExponentialAccumulator, self).__init__()
+
+    def create(self, data):
+        """Return the average and the scratch array of a channel."""
+        return numpy.array(data, numpy.double), numpy.empty(data.shape)
+
+    def fold(self, state, data):
+        """Move the average towards the raw values."""
+        if self.count == 1:
+            return
+        average, scratch = state
+        numpy.subtract(data, average, out=scratch, casting="unsafe")
+        scratch *= self.alpha
+        average += scratch
+
+    def result(self, connection, scales=None, positions=None):
+        """Return the moving averages as a dictionary."""
+        return dict(
+            (channel, self.convert(connection, channel, state[0].copy(),
+                                   scales, positions))
+            for channel, state in self.states.items())
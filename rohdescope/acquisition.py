@@ -0,0 +1,194 @@
+"""Provide a background acquisition engine and its frame buffer."""
+
+# Imports
+import threading
+from time import sleep
+from collections import deque
+from timeit import default_timer as time
+
+
+# Frame buffer class
+class FrameBuffer(object):
+    """Fixed-size ring buffer of timestamped frames.
+
+    There is a single writer and any number of readers. Readers never
+    block: they get (sequence, timestamp, frame) tuples for the latest
+    frames. Slots are recycled by the writer, so a frame is only valid
+    as long as is_valid returns True for its sequence number.
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError("The frame buffer needs at least 2 slots")
+        self.size = size
+        self.slots = [None] * size
+        self.sequence = 0
+        self.read_sequence = 0
+        self.dropped = 0
+
+    def recycle(self):
+        """Return the frame of the slot to be written next, if any."""
+        slot = self.slots[self.sequence % self.size]
+        return slot[2] if slot else None
+
+    def push(self, timestamp, frame):
+        """Store a new frame, overwriting the oldest one."""
+        index = self.sequence % self.size
+        slot = self.slots[index]
+        if slot and slot[0] > self.read_sequence:
+            self.dropped += 1
+        self.slots[index] = (self.sequence + 1, timestamp, frame)
+        self.sequence += 1
+
+    def is_valid(self, sequence):
+        """Return whether the frame has not been recycled yet."""
+        return sequence > self.sequence - self.size + 1
+
+    def latest(self):
+        """Return the latest frame, or None if the buffer is empty."""
+        frames = self.last(1)
+        return frames[0] if frames else None
+
+    def last(self, number):
+        """Return the last frames, from the oldest to the latest.
+
+        The slot to be recycled next is never returned.
+        """
+        sequence = self.sequence
+        number = min(number, sequence, self.size - 1)
+        slots = [self.slots[(sequence - index) % self.size]
+                 for index in range(number, 0, -1)]
+        self.read_sequence = max(self.read_sequence, sequence)
+        return slots
+
+
+# Acquisition engine class
+class AcquisitionEngine(object):
+    """Run the acquisition cycle of a scope connection in a thread.
+
+    The frames are pushed into a frame buffer. The single and busy
+    arguments are passed to stamp_acquisition if they are not None.
+    If a publisher is given (e.g. a shared.FramePublisher), the parsed
+    frames are also published to it.
+    """
+
+    # Number of frames used to compute the achieved rate
+    rate_window = 100
+
+    def __init__(self, connection, channels, size=16, single=None,
+                 busy=None, publisher=None):
+        self.connection = connection
+        self.publisher = publisher
+        self.channels = channels
+        self.buffer = FrameBuffer(size)
+        self.kwargs = dict((key, value) for key, value in
+                           (("single", single), ("busy", busy))
+                           if value is not None)
+        self.stamps = deque(maxlen=self.rate_window)
+        self.resumed = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.errors = 0
+        self.error = None
+
+    # Control methods
+
+    def start(self):
+        """Start the acquisition thread."""
+        if self.running:
+            return
+        self.stopped.clear()
+        self.resumed.set()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the acquisition thread and wait for it to finish."""
+        self.stopped.set()
+        self.resumed.set()
+        if self.thread:
+            self.thread.join()
+        self.thread = None
+
+    def pause(self):
+        """Pause the acquisition after the current cycle."""
+        self.resumed.clear()
+
+    def resume(self):
+        """Resume a paused acquisition."""
+        self.resumed.set()
+
+    @property
+    def running(self):
+        """Property to indicate whether the acquisition thread is alive."""
+        return bool(self.thread and self.thread.is_alive())
+
+    @property
+    def paused(self):
+        """Property to indicate whether the acquisition is paused."""
+        return not self.resumed.is_set()
+
+    # Counters
+
+    @property
+    def count(self):
+        """Number of acquired frames."""
+        return self.buffer.sequence
+
+    @property
+    def dropped(self):
+        """Number of frames overwritten before being read."""
+        return self.buffer.dropped
+
+    @property
+    def rate(self):
+        """Achieved acquisition rate in frames per second."""
+        stamps = list(self.stamps)
+        if len(stamps) < 2 or stamps[-1] == stamps[0]:
+            return 0.0
+        return (len(stamps) - 1) / (stamps[-1] - stamps[0])
+
+    # Frame access
+
+    def latest(self):
+        """Return the latest (sequence, timestamp, frame) tuple."""
+        return self.buffer.latest()
+
+    def last(self, number):
+        """Return the last (sequence, timestamp, frame) tuples."""
+        return self.buffer.last(number)
+
+    # Acquisition loop
+
+    def run(self):
+        """Run the RUNS, wait and readout cycle until stopped."""
+        while True:
+            self.resumed.wait()
+            if self.stopped.is_set():
+                return
+            out = self.buffer.recycle()
+            if out is None:
+                out = self.connection.empty_buffer(self.channels)
+            try:
+                stamp, frame = self.connection.stamp_acquisition(
+                    self.channels, out=out, **self.kwargs)
+            except Exception as exc:
+                self.errors += 1
+                self.error = exc
+                sleep(self.connection.tick)
+                continue
+            self.buffer.push(stamp, frame)
+            if self.publisher is not None:
+                self.publish(stamp, frame)
+            self.stamps.append(time())
+
+    def publish(self, stamp, frame):
+        """Parse a frame and publish it."""
+        try:
+            values = self.connection.parse_waveform_string(
+                self.channels, frame, copy=False)
+            self.publisher.publish(stamp, values)
+        except Exception as exc:
+            self.errors += 1
+            self.error = exc
@@ -0,0 +1,648 @@
+"""Provide an asyncio interface for the Rohde and Schwarz oscilloscopes.
+
+This module requires python 3.5 or later.
+"""
+
+# Imports
+import copy
+import random
+import struct
+import asyncio
+import numpy
+from timeit import default_timer as time
+from vxi11.vxi11 import Vxi11Exception
+from rohdescope.common import support_channel_dict, split_blocks, Backoff
+from rohdescope.common import pack_uint, pack_opaque, unpack_opaque
+from rohdescope.connection import ScopeConnection
+from rohdescope.connection import RTMConnection, RTOConnection
+
+# ONC RPC constants
+RPC_VERSION = 2
+LAST_FRAGMENT = 0x80000000
+
+# Port mapper constants
+PMAP_PORT = 111
+PMAP_PROG = 100000
+PMAP_VERS = 2
+PMAP_GETPORT = 3
+IPPROTO_TCP = 6
+
+# VXI-11 core channel constants
+DEVICE_CORE_PROG = 0x0607af
+DEVICE_CORE_VERS = 1
+CREATE_LINK = 10
+DEVICE_WRITE = 11
+DEVICE_READ = 12
+DEVICE_READSTB = 13
+DESTROY_LINK = 23
+OP_FLAG_END = 8
+RX_CHR = 2
+RX_END = 4
+
+
+# RPC client class
+class AsyncRPCClient(object):
+    """ONC RPC client over an asyncio TCP stream.
+
+    A call interrupted by an error or a cancellation closes the stream,
+    since its reply can no longer be matched.
+    """
+
+    def __init__(self, prog, vers):
+        self.prog = prog
+        self.vers = vers
+        self.xid = random.getrandbits(31)
+        self.reader = self.writer = None
+
+    async def open(self, host, port):
+        """Open the TCP stream."""
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    def close(self):
+        """Close the TCP stream."""
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    @property
+    def closed(self):
+        """Property to indicate whether the stream is closed."""
+        return self.writer is None
+
+    async def call(self, proc, args=b""):
+        """Run a remote procedure and return the packed result."""
+        if self.closed:
+            raise Vxi11Exception("RPC stream closed", "call")
+        self.xid = (self.xid + 1) & 0xffffffff
+        # Call header with null credentials and verifier
+        record = pack_uint(self.xid, 0, RPC_VERSION, self.prog, self.vers,
+                           proc, 0, 0, 0, 0) + args
+        try:
+            self.writer.write(pack_uint(LAST_FRAGMENT | len(record)))
+            self.writer.write(record)
+            await self.writer.drain()
+            reply = await self.read_record()
+        except BaseException:
+            self.close()
+            raise
+        # Reply header
+        xid, kind, status = struct.unpack_from(">3I", reply)
+        if xid != self.xid or kind != 1 or status != 0:
+            self.close()
+            raise Vxi11Exception("RPC call rejected", "call")
+        verifier, offset = unpack_opaque(reply, 16)
+        accept, = struct.unpack_from(">I", reply, offset)
+        if accept != 0:
+            raise Vxi11Exception("RPC error {0}".format(accept), "call")
+        return reply[offset+4:]
+
+    async def read_record(self):
+        """Read a record made of one or several fragments."""
+        fragments = []
+        last = False
+        while not last:
+            marker, = struct.unpack(">I", await self.reader.readexactly(4))
+            last = marker & LAST_FRAGMENT
+            size = marker & ~LAST_FRAGMENT
+            fragments.append(await self.reader.readexactly(size))
+        return b"".join(fragments)
+
+
+# Instrument class
+class AsyncInstrument(object):
+    """Non-blocking VXI-11 instrument, mirroring vxi11.Instrument.
+
+    The timeouts are in seconds.
+    """
+
+    def __init__(self, host, name=None, timeout=10, lock_timeout=10):
+        self.host = host
+        self.name = name or "inst0"
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.client_id = random.getrandbits(31)
+        self.client = None
+        self.link = None
+        self.max_recv_size = 0
+
+    @property
+    def timeouts(self):
+        """IO and lock timeouts in milliseconds."""
+        return int(self.timeout * 1000), int(self.lock_timeout * 1000)
+
+    async def open(self):
+        """Open the link to the instrument."""
+        if self.link is not None and not self.client.closed:
+            return
+        # Get the core channel port
+        mapper = AsyncRPCClient(PMAP_PROG, PMAP_VERS)
+        await mapper.open(self.host, PMAP_PORT)
+        try:
+            args = pack_uint(DEVICE_CORE_PROG, DEVICE_CORE_VERS,
+                             IPPROTO_TCP, 0)
+            port, = struct.unpack(">I", await mapper.call(PMAP_GETPORT, args))
+        finally:
+            mapper.close()
+        # Create the link
+        self.client = AsyncRPCClient(DEVICE_CORE_PROG, DEVICE_CORE_VERS)
+        await self.client.open(self.host, port)
+        args = pack_uint(self.client_id, 0, self.timeouts[1])
+        args += pack_opaque(self.name.encode())
+        reply = await self.client.call(CREATE_LINK, args)
+        error, link, abort_port, max_recv_size = struct.unpack_from(
+            ">4I", reply)
+        if error:
+            self.client.close()
+            raise Vxi11Exception(error, "open")
+        self.link = link
+        self.max_recv_size = min(max_recv_size, 2**20)
+
+    async def close(self):
+        """Close the link."""
+        if self.link is None:
+            return
+        try:
+            if not self.client.closed:
+                await self.client.call(DESTROY_LINK, pack_uint(self.link))
+        finally:
+            self.client.close()
+            self.link = None
+
+    async def write_raw(self, data):
+        """Write binary data to the instrument."""
+        await self.open()
+        io_timeout, lock_timeout = self.timeouts
+        offset = 0
+        while True:
+            block = data[offset:offset+self.max_recv_size]
+            last = offset + len(block) >= len(data)
+            flags = OP_FLAG_END if last else 0
+            args = pack_uint(self.link, io_timeout, lock_timeout, flags)
+            reply = await self.client.call(
+                DEVICE_WRITE, args + pack_opaque(block))
+            error, size = struct.unpack_from(">2I", reply)
+            if error:
+                raise Vxi11Exception(error, "write")
+            offset += size
+            if last and size == len(block):
+                return
+
+    async def read_raw(self, num=-1):
+        """Read binary data from the instrument.
+
+        If num is positive, return as soon as num bytes are read.
+        """
+        await self.open()
+        io_timeout, lock_timeout = self.timeouts
+        result = bytearray()
+        while True:
+            size = self.max_recv_size
+            if 0 < num - len(result) < size:
+                size = num - len(result)
+            args = pack_uint(self.link, size, io_timeout, lock_timeout, 0, 0)
+            reply = await self.client.call(DEVICE_READ, args)
+            error, reason = struct.unpack_from(">2I", reply)
+            if error:
+                raise Vxi11Exception(error, "read")
+            result += unpack_opaque(reply, 8)[0]
+            if reason & (RX_END | RX_CHR):
+                return bytes(result)
+            if 0 < num <= len(result):
+                return bytes(result)
+
+    async def read_stb(self):
+        """Read the status byte."""
+        await self.open()
+        io_timeout, lock_timeout = self.timeouts
+        args = pack_uint(self.link, 0, lock_timeout, io_timeout)
+        reply = await self.client.call(DEVICE_READSTB, args)
+        error, status = struct.unpack_from(">2I", reply)
+        if error:
+            raise Vxi11Exception(error, "read_stb")
+        return status
+
+    async def write(self, message):
+        """Write a string to the instrument."""
+        await self.write_raw(message.encode())
+
+    async def read(self, num=-1):
+        """Read a string from the instrument."""
+        return (await self.read_raw(num)).decode().rstrip("\r\n")
+
+    async def ask(self, message, num=-1):
+        """Write a string and read the answer."""
+        await self.write(message)
+        return await self.read(num)
+
+
+# Replay helpers
+class Pending(Exception):
+    """Raised by a replayed method needing the answer to a query."""
+
+    def __init__(self, command):
+        super(Pending, self).__init__(command)
+        self.command = command
+
+
+def replay_class(cls):
+    """Return a subclass of a connection class whose ask method returns
+    the recorded answers, or raises Pending for the next query.
+
+    The writes are recorded in the writes list and return at once,
+    so only the queries require the method to be run again.
+    The methods transferring blocks are not available. The lists,
+    dictionaries and sets of the model are copied, so a method run
+    several times does not alter them (see update_model).
+    """
+    class Replay(cls):
+        def __init__(self, model, answers):
+            self.__dict__.update(
+                (key, copy.copy(value)
+                 if isinstance(value, (list, dict, set)) else value)
+                for key, value in model.__dict__.items())
+            self.answers = answers
+            self.index = 0
+            self.writes = []
+
+        def ask(self, commands):
+            if self.index < len(self.answers):
+                self.index += 1
+                return self.answers[self.index - 1]
+            raise Pending(self.prepare_command(commands))
+
+        def write(self, command):
+            self.writes.append(self.prepare_command(command))
+
+        def transfer(self, command, *args, **kwargs):
+            raise NotImplementedError(
+                "No block transfer in a replayed method")
+
+    Replay.__name__ = "Replay" + cls.__name__
+    return Replay
+
+
+# Async scope connection class
+class AsyncScopeConnection(object):
+    """Asyncio connection to a rohde scope.
+
+    The I/O runs on the event loop through a non-blocking VXI-11 client,
+    so many scopes can be driven from a single thread. Every coroutine
+    can be cancelled; a cancelled transfer closes the link, which is
+    reopened by the next connect.
+
+    The accessors (get_*, set_* and issue_* methods) of the model class
+    are mirrored as coroutines: the synchronous implementation is
+    replayed, each ask or write being awaited in turn. The accessors
+    transferring blocks are not mirrored (see unmirrored).
+    """
+
+    # Synchronous connection class
+    model_class = ScopeConnection
+
+    # Accessors of the model class transferring blocks, not mirrored
+    unmirrored = frozenset([
+        "get_channel_string", "get_channels_string", "get_segments"])
+
+    def __init__(self, host, **kwargs):
+        self.model = self.model_class(host, **kwargs)
+        self.replay_class = replay_class(self.model_class)
+        self.lock = asyncio.Lock()
+        self.firmware_version = None
+        self.scope = None
+
+    @property
+    def tick(self):
+        """Minimal tick duration."""
+        return self.model.tick
+
+    # Connection methods
+
+    async def connect(self):
+        """Connect to the scope if not already connected."""
+        connected = self.connected
+        # Instanciate the instrument
+        if not self.scope:
+            timeout = self.model.kwargs.get("instrument_timeout", 10000)
+            self.scope = AsyncInstrument(
+                self.model.host, self.model.kwargs.get("name"),
+                timeout / 1000.0)
+        # Get firmware_version
+        if not self.firmware_version:
+            self.firmware_version = await self.get_firmware_version()
+            self.model.firmware_version = self.firmware_version
+        # Configure the scope
+        if not connected:
+            await self.configure()
+
+    async def disconnect(self):
+        """Disconnect from the scope if not already disconnected."""
+        if self.scope:
+            async with self.lock:
+                await self.scope.close()
+        self.scope = None
+        self.firmware_version = None
+        self.model.firmware_version = None
+        self.model.clear_cache()
+
+    @property
+    def connected(self):
+        """Property to indicate whether the device is connected."""
+        return self.scope and self.firmware_version
+
+    async def get_firmware_version(self):
+        """Get the firmware version."""
+        if not self.scope:
+            raise RuntimeError("Vxi11 Instrument not instanciated.")
+        async with self.lock:
+            idn = await self.scope.ask("*IDN?")
+        company, line, model, fw = idn.split(",")
+        return tuple(int(part) for part in fw.split("."))
+
+    # Operation methods
+
+    async def ask(self, commands):
+        """Prepare and run a command list"""
+        if not self.connected:
+            raise RuntimeError("not connected to the scope")
+        command = self.model.prepare_command(commands)
+        cache = self.model.cache
+        if cache:
+            answer = cache.get(command)
+            if answer is not None:
+                return answer
+        async with self.lock:
+            answer = await self.scope.ask(command)
+        if cache:
+            cache.store(command, answer)
+        return answer
+
+    async def write(self, command):
+        """Perform a write operation"""
+        if not self.connected:
+            raise RuntimeError("not connected to the scope")
+        command = self.model.prepare_command(command)
+        async with self.lock:
+            await self.scope.write(command)
+        if self.model.cache:
+            self.model.cache.invalidate(command)
+
+    async def replay(self, name, *args, **kwargs):
+        """Run a method of the model class, awaiting its operations.
+
+        The method runs again after each query, with the answers
+        received so far; the writes are sent once, before the query
+        following them. The attributes set by the method are then
+        set on the model.
+        """
+        answers = []
+        sent = 0
+        while True:
+            proxy = self.replay_class(self.model, answers)
+            try:
+                result = getattr(proxy, name)(*args, **kwargs)
+                query = None
+            except Pending as pending:
+                query = pending.command
+            finally:
+                for command in proxy.writes[sent:]:
+                    await self.write(command)
+                sent = len(proxy.writes)
+            if query is None:
+                self.update_model(proxy)
+                return result
+            answers.append(await self.ask(query))
+
+    def update_model(self, proxy):
+        """Set the attributes changed by a replayed method on the model."""
+        state = self.model.__dict__
+        for key, value in proxy.__dict__.items():
+            if key not in ("answers", "index", "writes") and \
+               state.get(key, proxy) is not value:
+                state[key] = value
+
+    def __getattr__(self, name):
+        """Mirror the accessors of the model class as coroutines."""
+        if not name.startswith(("get_", "set_", "issue_")) or \
+           name in self.unmirrored or \
+           not callable(getattr(self.model_class, name, None)):
+            raise AttributeError(name)
+
+        async def accessor(*args, **kwargs):
+            return await self.replay(name, *args, **kwargs)
+
+        accessor.__name__ = name
+        accessor.__doc__ = getattr(self.model_class, name).__doc__
+        return accessor
+
+    async def configure(self):
+        """Configure the scope if it requires some custom settings."""
+        await self.replay("configure")
+
+    async def clear_buffer(self):
+        """Clear the error buffer."""
+        await self.replay("clear_buffer")
+
+    async def clear_reduction(self):
+        """Restore the settings changed by the data reduction."""
+        await self.replay("clear_reduction")
+
+    # Settings snapshot
+
+    @support_channel_dict
+    async def get_settings_snapshot(self, channels):
+        """Return the timebase, trigger and channel settings
+        using a single compound query.
+        """
+        queries = self.model.get_snapshot_queries(channels)
+        command = self.model.prepare_command(
+            [query for _, query, _ in queries])
+        if not self.connected:
+            raise RuntimeError("not connected to the scope")
+        start = time()
+        async with self.lock:
+            answer = await self.scope.ask(command)
+        stop = time()
+        answers = answer.split(";")
+        if len(answers) != len(queries):
+            raise ValueError("Unexpected answer: {0!r}".format(answer))
+        values = {}
+        for (key, query, parser), value in zip(queries, answers):
+            values[key] = parser(value.strip())
+            if self.model.cache:
+                self.model.cache.store(query, value)
+        return self.model.build_snapshot(
+            channels, values, timestamp=stop,
+            duration=stop - start, queries=len(queries))
+
+    # Block readout
+
+    async def read_block(self, out=None, callback=None, flush=True):
+        """Read a definite length block chunk by chunk
+        (see ScopeConnection.read_block).
+
+        The lock has to be acquired by the caller.
+        """
+        header = bytearray(await self.scope.read_raw(2))
+        if header[:1] != bytearray(b"#"):
+            raise ValueError("Not a definite length block")
+        header += await self.scope.read_raw(int(chr(header[1])))
+        block = self.model.prepare_block(header, out)
+        received = len(header)
+        while received < block.size:
+            size = min(self.model.chunk_size, block.size - received)
+            chunk = numpy.frombuffer(
+                await self.scope.read_raw(size), numpy.uint8)
+            block[received:received+chunk.size] = chunk
+            received += chunk.size
+            if callback:
+                callback(block, received)
+        if flush:
+            await self.scope.read_raw()
+        return block
+
+    # Acquisition
+
+    async def read_query(self, query, out=None, callback=None):
+        """Run a waveform query and return the block."""
+        async with self.lock:
+            await self.scope.write(query)
+            if out is None and callback is None:
+                return await self.scope.read_raw()
+            return await self.read_block(out, callback)
+
+    async def read_compound_query(self, queries, out=None, callback=None):
+        """Run several waveform queries as a single compound query
+        and return the list of blocks.
+        """
+        out = out or [None] * len(queries)
+        async with self.lock:
+            await self.scope.write(self.model.prepare_command(queries))
+            if all(buf is None for buf in out) and callback is None:
+                strings = split_blocks(await self.scope.read_raw())
+            else:
+                strings = []
+                for index, buf in enumerate(out):
+                    last = index == len(out) - 1
+                    strings.append(
+                        await self.read_block(buf, callback, flush=last))
+                    if not last:
+                        await self.scope.read_raw(1)
+        if len(strings) != len(queries) or any(
+                isinstance(string, str) for string in strings):
+            raise ValueError("Unexpected compound answer")
+        return strings
+
+    @support_channel_dict
+    async def get_waveform_string(self, channels, out=None, callback=None):
+        """Return a string containing the waveform values
+        for the given channels.
+        """
+        query = self.model.waveform_query
+        if self.model.multichannel_export:
+            if not channels:
+                return ""
+            return await self.read_query(
+                query.format(channels[0]), out, callback)
+        if len(channels) > 1 and getattr(
+                self.model, "compound_readout", False):
+            queries = [query.format(channel) for channel in channels]
+            return await self.read_compound_query(queries, out, callback)
+        out = out or [None] * len(channels)
+        return [await self.read_query(query.format(channel), buf, callback)
+                for channel, buf in zip(channels, out)]
+
+    def parse_waveform_string(self, channels, string, out=None, copy=True):
+        """Return the waveform values as a dictionary."""
+        return self.model.parse_waveform_string(
+            channels, string, out, copy=copy)
+
+    def convert_waveforms(self, data_dict, scales=None, positions=None,
+                          out=None, dtype=numpy.double):
+        """Convert the values in the acquisition dictionary
+        to divisions or volts.
+        """
+        return self.model.convert_waveforms(
+            data_dict, scales, positions, out, dtype)
+
+    async def get_waveform_data(self, channels, out=None, copy=True):
+        """Return the waveform raw data as a dictionary
+        for the given channels.
+        """
+        string = await self.get_waveform_string(channels)
+        return self.parse_waveform_string(channels, string, out, copy)
+
+    async def get_waveforms(self, channels, scales=None, positions=None):
+        """Return the waveform values as a dictionary."""
+        data_dict = await self.get_waveform_data(channels, copy=False)
+        return self.convert_waveforms(data_dict, scales, positions)
+
+    async def stamp_acquisition(self, channels, single=None, busy=None,
+                                out=None, callback=None):
+        """Return the time stamp of an acquisition
+        along with the values as a string.
+
+        The single and busy arguments default to the model behavior.
+        """
+        if single is None:
+            single = self.model.default_single
+        if channels and single:
+            await self.run_single(busy)
+        string = await self.get_waveform_string(channels, out, callback)
+        return time(), string
+
+    async def run_single(self, busy=None):
+        """Run a single acquisition and wait for it to complete
+        (see ScopeConnection.run_single).
+        """
+        if busy is None:
+            busy = self.model.default_busy
+        if busy:
+            await self.write("RUNS")
+        await self.wait(busy)
+
+    async def wait(self, busy=True, srq=None):
+        """Wait for the last commands to complete
+        (see ScopeConnection.wait).
+        """
+        if not busy:
+            return await self.ask("RUNS;*OPC?")
+        timeout = self.model.kwargs['instrument_timeout'] / 1000.0
+        timeout += time()
+        if srq is None:
+            srq = self.model.srq
+        if srq:
+            return await self.wait_service_request(timeout)
+        await self.write("*OPC")
+        while not int(await self.ask("*ESR?")) % 2:
+            if time() > timeout:
+                raise Vxi11Exception(15, "wait")
+            await asyncio.sleep(self.tick)
+
+    async def wait_service_request(self, timeout):
+        """Wait for the last commands to complete using a service request
+        (see ScopeConnection.wait_service_request).
+        """
+        bit = self.model.event_status_bit
+        await self.write("*ESE 1;*SRE {0};*OPC".format(bit))
+        backoff = Backoff(self.tick)
+        while True:
+            async with self.lock:
+                status = await self.scope.read_stb()
+            if status & bit:
+                break
+            if time() > timeout:
+                raise Vxi11Exception(15, "wait")
+            await asyncio.sleep(backoff.next())
+        await self.ask("*ESR?")
+
+
+# Async RTM scope connection class
+class AsyncRTMConnection(AsyncScopeConnection):
+    """Asyncio connection class for the RTM scope."""
+    model_class = RTMConnection
+
+
+# Async RTO scope connection class
+class AsyncRTOConnection(AsyncScopeConnection):
+    """Asyncio connection class for the RTO scope."""
+    model_class = RTOConnection
@@ -0,0 +1,344 @@
+"""Provide benchmarks for the acquisition paths of the library."""
+
+# Imports
+import numpy
+from timeit import default_timer as time
+from rohdescope.connection import RTMConnection, RTOConnection
+from rohdescope.simulator import ScopeSimulator
+
+# Optional allocation tracing (python >= 3.4)
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Block helpers
+def make_block(length, channel_number=1, dtype="int8"):
+    """Return a definite length block containing random interleaved data."""
+    dtype = numpy.dtype(dtype)
+    info = numpy.iinfo(dtype)
+    data = numpy.random.randint(info.min, info.max + 1,
+                                size=length * channel_number)
+    payload = data.astype(dtype).tobytes()
+    size = str(len(payload))
+    header = "#{0}{1}".format(len(size), size).encode()
+    return header + payload
+
+
+def legacy_parse(channels, string, dtype="int8"):
+    """Reference implementation of the slice-and-copy parsing."""
+    result = {}
+    channel_number = len(channels)
+    data_length_length = int(string[1:2])
+    data_length = int(string[2:2+data_length_length])
+    string = string[2+data_length_length:]
+    for index, channel in enumerate(channels):
+        substring = string[index:data_length:channel_number]
+        result[channel] = numpy.frombuffer(substring, dtype=dtype).copy()
+    return result
+
+
+def legacy_convert(data_dict, scales=None, positions=None):
+    """Reference implementation of the arithmetic conversion."""
+    result = {}
+    for channel, data in data_dict.items():
+        info = numpy.iinfo(data.dtype)
+        data_median = (info.max + info.min) * 0.5
+        factor = 10.0
+        factor /= info.max - info.min
+        if scales is not None:
+            factor *= scales[channel]
+        position = 0
+        if positions is not None:
+            position = positions[channel] * scales[channel]
+        data = data.astype(numpy.double)
+        result[channel] = ((data - data_median) * factor) - position
+    return result
+
+
+# Measurement
+def measure(func, repeat=10):
+    """Return the average duration and the bytes allocated per call."""
+    allocated = None
+    if tracemalloc:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        func()
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    start = time()
+    for _ in range(repeat):
+        func()
+    return (time() - start) / repeat, allocated
+
+
+# Benchmarks
+def benchmark_parsing(length=10**6, channels=(1, 2, 3, 4), repeat=10):
+    """Compare the parsing modes for a multichannel RTO block.
+
+    Return a dictionary of (duration, bytes copied) per mode.
+    """
+    scope = RTOConnection("localhost")
+    dtype = scope.data_dtype
+    string = make_block(length, len(channels), dtype)
+    out = dict((channel, numpy.empty(length, dtype)) for channel in channels)
+    # Run the benchmarks
+    return {
+        "legacy": measure(
+            lambda: legacy_parse(channels, string, dtype), repeat),
+        "views": measure(
+            lambda: scope.parse_waveform_string(
+                channels, string, copy=False), repeat),
+        "out": measure(
+            lambda: scope.parse_waveform_string(channels, string, out),
+            repeat)}
+
+
+def benchmark_conversion(lengths=(10**6, 10**7), repeat=5):
+    """Compare the conversion modes for a single 8 bit RTO channel.
+
+    Lengths up to 10**8 points are relevant for the RTO, but need a few
+    gigabytes of memory for the legacy path.
+    Return a dictionary of (duration, bytes allocated) per mode and length.
+    """
+    scope = RTOConnection("localhost")
+    results = {}
+    for length in lengths:
+        data = {1: numpy.random.randint(-128, 128, length).astype("int8")}
+        scales, positions = {1: 0.5}, {1: 1.0}
+        out64 = {1: numpy.empty(length, numpy.double)}
+        out32 = {1: numpy.empty(length, numpy.float32)}
+        results["legacy", length] = measure(
+            lambda: legacy_convert(data, scales, positions), repeat)
+        results["table", length] = measure(
+            lambda: scope.convert_waveforms(data, scales, positions),
+            repeat)
+        results["table/out", length] = measure(
+            lambda: scope.convert_waveforms(data, scales, positions, out64),
+            repeat)
+        results["table/out/float32", length] = measure(
+            lambda: scope.convert_waveforms(
+                data, scales, positions, out32, numpy.float32), repeat)
+    return results
+
+
+def benchmark_wait(scope, count=100, bins=10):
+    """Compare the completion modes of the wait method on a connected scope.
+
+    Return a dictionary of latency histograms (counts, bin edges) per mode.
+    """
+    modes = {"opc": {"busy": False},
+             "esr": {"busy": True, "srq": False},
+             "srq": {"busy": True, "srq": True}}
+    latencies = {}
+    for name, kwargs in modes.items():
+        values = []
+        for _ in range(count):
+            start = time()
+            if kwargs["busy"]:
+                scope.write("RUNS")
+            scope.wait(**kwargs)
+            values.append(time() - start)
+        latencies[name] = numpy.array(values)
+    # Use the same bins for all the modes
+    values = numpy.concatenate(list(latencies.values()))
+    edges = numpy.linspace(values.min(), values.max(), bins + 1)
+    return dict((name, numpy.histogram(values, edges))
+                for name, values in latencies.items())
+
+
+def read_settings(scope, channels):
+    """Read the settings of a snapshot using the individual accessors."""
+    scope.clear_cache()
+    scope.get_time_scale()
+    scope.get_time_range()
+    scope.get_time_position()
+    scope.get_record_length()
+    scope.get_trigger_source()
+    scope.get_trigger_slope()
+    for channel in channels:
+        scope.get_channel_scale(channel)
+        scope.get_channel_position(channel)
+        scope.get_channel_offset(channel)
+        scope.get_channel_enabled(channel)
+        scope.get_channel_coupling(channel)
+        scope.get_trigger_level(channel)
+
+
+def benchmark_snapshot(scope, channels=(1, 2, 3, 4), repeat=10):
+    """Compare the settings snapshot with the individual accessors
+    on a connected scope.
+
+    Return a dictionary of (duration, bytes allocated) per mode.
+    """
+    return {
+        "accessors": measure(
+            lambda: read_settings(scope, channels), repeat),
+        "snapshot": measure(
+            lambda: scope.get_settings_snapshot(channels), repeat)}
+
+
+def benchmark_readout(scope, channels=(1, 2, 3, 4), repeat=10):
+    """Compare the serial and the parallel multichannel readout
+    on a connected RTM scope opened with several links.
+
+    Return a dictionary of (duration, bytes allocated) per mode.
+    """
+    links = scope.links
+    try:
+        scope.links = []
+        serial = measure(
+            lambda: scope.get_waveform_string(channels), repeat)
+    finally:
+        scope.links = links
+    parallel = measure(
+        lambda: scope.get_waveform_string(channels), repeat)
+    return {"serial": serial, "parallel": parallel}
+
+
+# Simulated acquisition
+def simulated_scope(model="RTO", links=1, **kwargs):
+    """Return a scope connection bound to a new simulator.
+
+    The keyword arguments are passed to the simulator.
+    """
+    simulator = ScopeSimulator(model, **kwargs)
+    kwargs = {"factory": simulator.instrument, "instrument_timeout": 10000}
+    if simulator.model == "RTM":
+        scope = RTMConnection("simulator", links=links, **kwargs)
+    else:
+        scope = RTOConnection("simulator", **kwargs)
+    scope.connect()
+    # Update the export states
+    for channel in range(1, simulator.channels + 1):
+        scope.get_channel_enabled(channel)
+    return scope
+
+
+def measure_acquisition(func, repeat=20):
+    """Return the acquisitions per second, the average trigger-to-array
+    latency and the bytes allocated per frame.
+
+    The function runs an acquisition and returns the number of frames.
+    """
+    allocated = None
+    func()
+    if tracemalloc:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        frames = func()
+        allocated = tracemalloc.get_traced_memory()[1] // frames
+        tracemalloc.stop()
+    latencies, frames = [], 0
+    start = time()
+    for _ in range(repeat):
+        stamp = time()
+        frames += func()
+        latencies.append(time() - stamp)
+    return frames / (time() - start), numpy.mean(latencies), allocated
+
+
+def benchmark_acquisition(scope, channels=(1, 2, 3, 4), repeat=20,
+                          segments=10):
+    """Compare the acquisition paths of a connected scope, from the run
+    command to the arrays in volts.
+
+    Return a dictionary of (acquisitions/s, latency, bytes per frame)
+    per path.
+    """
+    channels = list(channels)
+    scales = scope.get_channel_scales(channels)
+    positions = scope.get_channel_positions(channels)
+
+    def string():
+        _, string = scope.stamp_acquisition(channels, single=True)
+        data = scope.parse_waveform_string(channels, string, copy=False)
+        scope.convert_waveforms(data, scales, positions)
+        return 1
+
+    # Preallocate the reusable buffers
+    _, buffer = scope.stamp_acquisition(
+        channels, single=True, out=scope.empty_buffer(channels))
+    arrays = dict((channel, numpy.array(values)) for channel, values in
+                  scope.parse_waveform_string(channels, buffer).items())
+    volts = scope.convert_waveforms(arrays, scales, positions)
+
+    def reuse(srq=False):
+        scope.srq = srq
+        _, string = scope.stamp_acquisition(
+            channels, single=True, out=buffer)
+        data = scope.parse_waveform_string(channels, string, arrays)
+        scope.convert_waveforms(data, scales, positions, volts)
+        return 1
+
+    def segmented():
+        _, data = scope.acquire_segments(channels, segments)
+        scope.convert_segments(data, scales, positions)
+        return segments
+
+    srq = scope.srq
+    try:
+        results = {
+            "string": measure_acquisition(string, repeat),
+            "buffers": measure_acquisition(reuse, repeat),
+            "buffers/srq": measure_acquisition(lambda: reuse(True), repeat)}
+    finally:
+        scope.srq = srq
+    try:
+        results["segments"] = measure_acquisition(segmented, repeat)
+    finally:
+        scope.set_segment_count(0)
+    return results
+
+
+# Report
+def report_acquisition(results):
+    """Print acquisition benchmark results."""
+    for name, (rate, latency, allocated) in sorted(results.items()):
+        copied = "n/a" if allocated is None else "{0:,} B".format(allocated)
+        print("{0:>28}: {1:9.1f} acq/s, {2:9.3f} ms, {3} per frame".format(
+            name, rate, latency * 1000, copied))
+
+
+def report_histograms(histograms):
+    """Print latency histograms."""
+    for name, (counts, edges) in sorted(histograms.items()):
+        print("{0}:".format(name))
+        for count, edge in zip(counts, edges):
+            print("  {0:9.3f} ms | {1}".format(edge * 1000, "#" * count))
+
+
+def report(results):
+    """Print benchmark results."""
+    for name, (duration, allocated) in sorted(results.items()):
+        if not isinstance(name, tuple):
+            name = name,
+        name = " ".join(str(part) for part in name)
+        copied = "n/a" if allocated is None else "{0:,} B".format(allocated)
+        print("{0:>28}: {1:9.3f} ms, {2} allocated".format(
+            name, duration * 1000, copied))
+
+
+# Main function
+def main():
+    """Run the benchmarks."""
+    report(benchmark_parsing())
+    report(benchmark_conversion())
+    # Simulated scopes (100 us latency, 100 MB/s)
+    settings = {"record_length": 10**5, "latency": 1e-4,
+                "bandwidth": 100e6}
+    for model in ("RTM", "RTO"):
+        print("{0} simulator:".format(model))
+        scope = simulated_scope(model, links=4, **settings)
+        try:
+            report_acquisition(benchmark_acquisition(scope))
+            if model == "RTM":
+                report(benchmark_readout(scope))
+        finally:
+            scope.disconnect()
+
+
+# Main execution
+if __name__ == "__main__":
+    main()
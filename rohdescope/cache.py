@@ -0,0 +1,116 @@
+"""Provide a cache for the scope settings."""
+
+# Imports
+import re
+import threading
+from timeit import default_timer as time
+
+# SCPI node pattern
+NODE = re.compile(r"([A-Za-z]+)(\d*)")
+
+
+# Path normalization
+def scpi_path(command):
+    """Return the normalized header path of a SCPI command.
+
+    Each node is reduced to its first three letters (upper case) followed
+    by its suffix, so long and short forms are equivalent:
+    CHANnel1:SCALe? and CHAN1:SCAL 0.5 both give ('CHA1', 'SCA').
+    """
+    header = command.strip().lstrip(":").split(" ")[0].rstrip("?")
+    path = []
+    for node in header.split(":"):
+        match = NODE.match(node)
+        if not match:
+            return ()
+        path.append(match.group(1)[:3].upper() + match.group(2))
+    return tuple(path)
+
+
+# Settings cache class
+class SettingsCache(object):
+    """Cache the answers to the settings queries.
+
+    Entries are keyed by query and expire after ttl seconds
+    (never if ttl is None). A write to a root node invalidates
+    the entries of this node and of the coupled nodes.
+    """
+
+    # Root nodes of the cached queries
+    roots = ("TIM", "ACQ", "CHA", "TRI", "FOR", "EXP")
+
+    # Nodes of the queries that are never cached
+    volatile = ("HIS", "DAT")
+
+    # Root nodes depending on each other
+    coupled = (("TIM", "ACQ"),)
+
+    # Nodes whose writes only affect their own query
+    independent = ("EXP",)
+
+    # Commands resetting all the settings
+    resets = (("AUT",), ("SYS", "PRE"))
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Remove all the entries."""
+        with self.lock:
+            self.entries.clear()
+
+    def cacheable(self, query):
+        """Return whether the answer to a query can be cached."""
+        if ";" in query or not query.strip().endswith("?"):
+            return False
+        path = scpi_path(query)
+        if not path or path[0][:3] not in self.roots:
+            return False
+        return not any(node[:3] in self.volatile for node in path)
+
+    def get(self, query):
+        """Return the cached answer to a query, or None."""
+        entry = self.entries.get(query)
+        if entry is None:
+            return None
+        path, stamp, answer = entry
+        if self.ttl is not None and time() > stamp + self.ttl:
+            return None
+        return answer
+
+    def store(self, query, answer):
+        """Store the answer to a query if it can be cached."""
+        if self.cacheable(query):
+            with self.lock:
+                self.entries[query] = scpi_path(query), time(), answer
+
+    def invalidate(self, commands):
+        """Invalidate the entries affected by the given write commands."""
+        for command in commands.split(";"):
+            path = scpi_path(command)
+            if command.strip().upper().startswith("*RST") or any(
+                    path[:len(reset)] == reset for reset in self.resets):
+                self.clear()
+            elif path:
+                self.discard(path)
+
+    def discard(self, path):
+        """Remove the entries affected by a write to the given path."""
+        if any(node[:3] in self.independent for node in path[1:]):
+            def affected(other):
+                return other == path
+        else:
+            roots = set([path[0][:3]])
+            for group in self.coupled:
+                if path[0][:3] in group:
+                    roots.update(group)
+
+            def affected(other):
+                return other[0] == path[0] or (
+                    other[0][:3] in roots and other[0][:3] != path[0][:3])
+        with self.lock:
+            for query, (other, _, _) in list(self.entries.items()):
+                if affected(other):
+                    del self.entries[query]
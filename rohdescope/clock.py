@@ -0,0 +1,217 @@
+"""Provide the correlation of the scope clock with the host clock."""
+
+# Imports
+import numpy
+from collections import deque
+
+# Seconds per day (the scope time stamps are times of day)
+DAY = 86400.0
+
+
+# Scope time parsing
+def parse_scope_time(answer):
+    """Return the time of day in seconds of a scope time stamp
+    (e.g. 12:34:56.789012), or the value of a number of seconds.
+    """
+    text = answer.strip().strip('"').split()[-1]
+    if ":" not in text:
+        return float(text)
+    hours, minutes, seconds = text.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+# Time stamp class
+class Timestamp(float):
+    """Host time stamp (in seconds) with its uncertainty (in seconds)
+    and the scope time stamp it was corrected from.
+    """
+
+    def __new__(cls, value, uncertainty=0.0, scope_time=None):
+        stamp = super(Timestamp, cls).__new__(cls, value)
+        stamp.uncertainty = uncertainty
+        stamp.scope_time = scope_time
+        return stamp
+
+    def __repr__(self):
+        return "Timestamp({0!r}, uncertainty={1!r})".format(
+            float(self), self.uncertainty)
+
+    def __reduce__(self):
+        return Timestamp, (float(self), self.uncertainty, self.scope_time)
+
+
+# Clock correlator class
+class ClockCorrelator(object):
+    """Map the scope trigger time stamps to the host clock.
+
+    Each acquisition bounds the host time of its trigger. The last window
+    acquisitions, spaced by spacing seconds, give the slope and offset
+    of the mapping, and the uncertainty covers all the consistent ones.
+    """
+
+    def __init__(self, window=64, spacing=1.0):
+        self.samples = deque(maxlen=window)
+        self.spacing = spacing
+        self.previous = None
+        self.wraps = 0
+        self.reference = 0.0
+        self.intercept = 0.0
+        self.slope = 1.0
+        self.origin = 0.0
+        self.slopes = self.intercepts = numpy.zeros(0)
+        self.uncertainty = float("inf")
+
+    def reset(self):
+        """Drop the acquisitions and the estimate."""
+        self.__init__(self.samples.maxlen, self.spacing)
+
+    @property
+    def drift(self):
+        """Relative drift of the scope clock with respect to the host."""
+        return 1.0 / self.slope - 1.0
+
+    def unwrap(self, scope_time):
+        """Return the scope time stamp made continuous across midnight."""
+        if self.previous is not None and scope_time < self.previous - DAY / 2:
+            self.wraps += 1
+        self.previous = scope_time
+        return scope_time + self.wraps * DAY
+
+    def add(self, scope_time, lower, upper):
+        """Add an acquisition and update the estimate.
+
+        Return the unwrapped scope time stamp.
+        """
+        scope_time = self.unwrap(scope_time)
+        sample = scope_time, lower, upper
+        appended = not self.samples or \
+            scope_time - self.samples[-1][0] >= self.spacing
+        changed = True
+        if appended:
+            self.samples.append(sample)
+        elif upper - lower < self.samples[-1][2] - self.samples[-1][1]:
+            self.samples[-1] = sample
+        else:
+            changed = False
+        scope_times, lowers, uppers = numpy.array(self.samples).T
+        relative = scope_times - scope_time
+        if appended:
+            self.slope = self.get_slope(relative, lowers, uppers)
+        low, high = self.get_bounds(relative, lowers, uppers, self.slope)
+        if low > high and not appended:
+            self.slope = self.get_slope(relative, lowers, uppers)
+            low, high = self.get_bounds(relative, lowers, uppers, self.slope)
+        if low > high:
+            self.samples.clear()
+            self.samples.append(sample)
+            low, high = lower, upper
+            changed = True
+        self.reference = scope_time
+        self.intercept = (low + high) / 2.0
+        if changed:
+            self.update_vertices()
+        low, high = self.get_range(scope_time)
+        self.uncertainty = max(self.intercept - low, high - self.intercept)
+        return scope_time
+
+    def get_bounds(self, relative, lowers, uppers, slope):
+        """Return the bounds of the intercept allowed by the acquisitions
+        for the given slope (inconsistent if the lower one is higher).
+        """
+        low = numpy.max(lowers - slope * relative)
+        high = numpy.min(uppers - slope * relative)
+        return float(low), float(high)
+
+    def get_slope(self, relative, lowers, uppers):
+        """Return the slope leaving the widest range to the intercept,
+        the current one if it is as good as the others.
+
+        The candidates are the current slope and the slopes between
+        the bounds of any two acquisitions.
+        """
+        first, second = numpy.triu_indices(len(relative), 1)
+        spans = relative[second] - relative[first]
+        valid = spans > 0
+        candidates = [numpy.array([self.slope])]
+        for values in (lowers, uppers):
+            deltas = values[second] - values[first]
+            candidates.append(deltas[valid] / spans[valid])
+        candidates = numpy.concatenate(candidates)[:, None]
+        shifts = candidates * relative[None, :]
+        widths = numpy.min(uppers - shifts, axis=1) - \
+            numpy.max(lowers - shifts, axis=1)
+        return float(candidates[numpy.argmax(widths), 0])
+
+    def update_vertices(self):
+        """Update the vertices of the polygon of the (slope, intercept)
+        estimates consistent with every acquisition (none if the slope
+        is not bounded).
+        """
+        scope_times, lowers, uppers = numpy.array(self.samples).T
+        self.origin = scope_times[-1]
+        relative = scope_times - self.origin
+        first, second = numpy.triu_indices(len(relative), 1)
+        spans = relative[second] - relative[first]
+        valid = spans != 0
+        first, second, spans = first[valid], second[valid], spans[valid]
+        self.slopes = self.intercepts = numpy.zeros(0)
+        if not len(spans):
+            return
+        # Slopes allowed by any two acquisitions
+        limits = numpy.array([
+            (lowers[second] - uppers[first]) / spans,
+            (uppers[second] - lowers[first]) / spans])
+        low = limits.min(axis=0).max()
+        high = limits.max(axis=0).min()
+        if low > high:
+            return
+        breakpoints = numpy.concatenate([
+            (lowers[second] - lowers[first]) / spans,
+            (uppers[second] - uppers[first]) / spans])
+        slopes = numpy.concatenate([
+            [low, high], breakpoints[(breakpoints > low) &
+                                     (breakpoints < high)]])
+        shifts = slopes[:, None] * relative[None, :]
+        self.slopes = numpy.concatenate([slopes, slopes])
+        self.intercepts = numpy.concatenate([
+            numpy.max(lowers - shifts, axis=1),
+            numpy.min(uppers - shifts, axis=1)])
+
+    def get_range(self, scope_time):
+        """Return the range of host times of an unwrapped scope time stamp
+        allowed by the acquisitions.
+        """
+        if not self.samples:
+            return -float("inf"), float("inf")
+        if not len(self.slopes):
+            # The slope is not bounded
+            origin, lower, upper = self.samples[-1]
+            if scope_time == origin:
+                return lower, upper
+            return -float("inf"), float("inf")
+        times = self.intercepts + self.slopes * (scope_time - self.origin)
+        return float(times.min()), float(times.max())
+
+    def convert(self, scope_time):
+        """Return the host time of an unwrapped scope time stamp."""
+        return self.intercept + self.slope * (scope_time - self.reference)
+
+    def correct(self, scope_time, lower, upper):
+        """Add an acquisition and return its corrected Timestamp,
+        within the bounds of the acquisition.
+
+        A lower bound of None (continuous mode) only converts the time.
+        """
+        if lower is None:
+            unwrapped = self.unwrap(scope_time)
+        else:
+            unwrapped = self.add(scope_time, lower, upper)
+        low, high = self.get_range(unwrapped)
+        high = min(high, upper)
+        if lower is not None:
+            low = max(low, lower)
+        if not numpy.isfinite(low) or low > high:
+            return Timestamp(upper, float("inf"), scope_time)
+        value = min(max(self.convert(unwrapped), low), high)
+        uncertainty = max(value - low, high - value)
+        return Timestamp(value, uncertainty, scope_time)
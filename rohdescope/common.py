@@ -1,11 +1,21 @@
 """Common functions for the library."""
 
 # Imports
+import numpy
+import struct
 from time import sleep
 from functools import wraps
-from collections import Mapping
 from timeit import default_timer as time
 
+# Python 3 compatibility
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Number of analog channels of the scopes
+CHANNELS = 4
+
 
 # Decorator to support the anbled channel dictionary
 def support_channel_dict(func):
@@ -23,6 +33,93 @@ def support_channel_dict(func):
     return wrapper
 
 
+# Definite length block header
+def parse_block_header(block):
+    """Return the data offset and the data length
+    of an IEEE 488.2 definite length block (#<n><length><data>).
+
+    The block can be any object supporting slicing and the buffer protocol
+    (string, bytearray, memoryview or uint8 array).
+    """
+    header = bytearray(block[:2])
+    if len(header) < 2 or header[0] != ord("#"):
+        raise ValueError("Not a definite length block")
+    size = int(chr(header[1]))
+    length = int(bytearray(block[2:2+size]).decode())
+    return 2 + size, length
+
+
+# Compound answer splitting
+def split_blocks(answer):
+    """Split a compound answer containing definite length blocks.
+
+    The blocks (with their header) are returned as uint8 views
+    on the answer, and the other parts as strings.
+    """
+    data = numpy.frombuffer(answer, numpy.uint8)
+    parts, position = [], 0
+    while position < len(data):
+        if data[position] == ord("#"):
+            offset, length = parse_block_header(data[position:])
+            end = position + offset + length
+            parts.append(data[position:end])
+        else:
+            end = position
+            while end < len(data) and data[end] != ord(";"):
+                end += 1
+            part = bytearray(data[position:end]).decode().strip()
+            if part:
+                parts.append(part)
+        # Skip the separator or the termination character
+        position = end + 1
+    return parts
+
+
+# Command coalescing
+def join_commands(commands, size):
+    """Join commands with ; into compound commands of at most size
+    characters (a longer command is kept alone).
+    """
+    compound, length = [], 0
+    for command in commands:
+        extra = len(command) + bool(compound)
+        if compound and length + extra > size:
+            yield ";".join(compound)
+            compound, length, extra = [], 0, len(command)
+        compound.append(command)
+        length += extra
+    if compound:
+        yield ";".join(compound)
+
+
+# XDR helpers
+def pack_uint(*values):
+    """Pack unsigned integers."""
+    return struct.pack(">{0}I".format(len(values)), *values)
+
+
+def pack_opaque(data):
+    """Pack variable length opaque data."""
+    return pack_uint(len(data)) + data + b"\0" * (-len(data) % 4)
+
+
+def unpack_opaque(data, offset):
+    """Unpack variable length opaque data and return the next offset."""
+    length, = struct.unpack_from(">I", data, offset)
+    start = offset + 4
+    return data[start:start+length], start + length + (-length % 4)
+
+
+# Command error exception
+class CommandError(RuntimeError):
+    """Raised when the scope reports errors in its error queue."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        message = "; ".join("{0}: {1}".format(*error) for error in errors)
+        super(CommandError, self).__init__(message)
+
+
 # Tick control decorator
 def tick_control(tick):
     """Return a decorator that controls the duration of its execution."""
@@ -39,3 +136,34 @@ def tick_control(tick):
             return value
         return wrapper
     return decorator
+
+
+# Adaptive backoff
+class Backoff(object):
+    """Provide sleep durations growing exponentially
+    from a minimum up to a maximum."""
+
+    # Default minimal sleep duration
+    default_minimum = 50e-6
+
+    def __init__(self, maximum, minimum=None, factor=2.0):
+        if minimum is None:
+            minimum = min(self.default_minimum, maximum)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.delay = minimum
+
+    def reset(self):
+        """Reset the sleep duration to the minimum."""
+        self.delay = self.minimum
+
+    def next(self):
+        """Return the sleep duration and increase the next one."""
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+    def sleep(self):
+        """Sleep and increase the next sleep duration."""
+        sleep(self.next())
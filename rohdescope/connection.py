@@ -1,12 +1,29 @@
 """Provide the connection classes for the different kind of scopes."""
 
 # Imports
+import re
 import numpy
 import vxi11
 import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from timeit import default_timer as time
 from vxi11.vxi11 import Vxi11Exception
 from rohdescope.common import support_channel_dict, tick_control
+from rohdescope.common import parse_block_header, split_blocks, Backoff
+from rohdescope.common import join_commands, CommandError
+from rohdescope.acquisition import AcquisitionEngine
+from rohdescope.cache import SettingsCache
+from rohdescope.settings import ChannelSettings, SettingsSnapshot, DataHeader
+from rohdescope.metrics import Metrics, stage_timer
+from rohdescope.waveform import Waveform
+from rohdescope.clock import ClockCorrelator, parse_scope_time
+from rohdescope.control import RateController
+from rohdescope.resilience import CircuitBreaker, CircuitOpenError
+from rohdescope.resilience import HealthProbe, is_idempotent, is_link_error
+
+# Data format pattern (e.g. INT,8)
+DATA_FORMAT = re.compile(r"([A-Za-z]+),?(\d+)")
 
 
 # Scope connection class
@@ -20,19 +37,110 @@ class ScopeConnection(object):
     # Trigger name
     trigger_name = "trigger"
 
+    # Channel couplings (indexable)
+    channel_couplings = ['DC', 'AC', 'DCL', 'ACL']
+
+    # Trigger slopes (indexable)
+    trigger_slopes = ['NEG', 'POS', 'EITH']
+
     # Data format
     data_format = "uint8"
 
+    # Data formats by number of useful bits
+    data_formats = {8: "UINT,8", 16: "UINT,16"}
+
+    # Byte order of the multi-byte data formats (LSBFirst or MSBFirst)
+    byte_order = "LSBFirst"
+
+    # Waveform data query (formatted with the channel)
+    waveform_query = None
+
+    # Whether all the channels are exported in a single block
+    multichannel_export = False
+
+    # Data header query (formatted with the channel)
+    data_header_query = None
+
+    # Trigger time stamp query (formatted with the first channel)
+    timestamp_query = None
+
+    # Automatic measurement types by name
+    measurement_types = {}
+
+    # Automatic measurement source (formatted with the channel)
+    measurement_source = None
+
+    # Number of automatic measurement places
+    measurement_count = 4
+
+    # Value returned for an invalid measurement
+    invalid_value = 9.91e37
+
+    # Maximal length of a coalesced write (in characters)
+    write_buffer_size = 2**12
+
+    # Maximal number of errors read from the error queue
+    max_errors = 32
+
     # Minimal tick duration
     default_tick = 0.001
 
+    # Whether stamp_acquisition runs a single acquisition by default
+    default_single = True
+
+    # Whether the completion of an acquisition is polled by default
+    default_busy = True
+
+    # Whether the data reduction sets a number of points
+    reduction_points = True
+
+    # Chunk size for the block readout
+    default_chunk_size = 2**20
+
+    # Chunk size for the lookup table conversion (in points)
+    conversion_chunk_size = 2**16
+
+    # Status byte bits
+    event_status_bit = 2**5
+
     def __init__(self, host, **kwargs):
-        self.tick = kwargs.pop("tick", self.default_tick)
+        self.tick = self.initial_tick = kwargs.pop("tick", self.default_tick)
+        self.srq = kwargs.pop("srq", False)
+        self.chunk_size = kwargs.pop("chunk_size", self.default_chunk_size)
+        self.factory = kwargs.pop("factory", vxi11.Instrument)
+        self.metrics = Metrics(kwargs.pop("metrics", True))
+        self.retries = kwargs.pop("retries", 0)
+        self.breaker = None
+        threshold = kwargs.pop("breaker", None)
+        breaker_timeout = kwargs.pop("breaker_timeout", None)
+        if threshold:
+            self.breaker = CircuitBreaker(threshold, breaker_timeout)
+        self.probe_period = kwargs.pop("probe", None)
+        self.probe = None
+        self.correlator = None
+        if kwargs.pop("hardware_timestamps", False):
+            self.correlator = ClockCorrelator()
+        self.scope_time = None
+        self.controller = None
+        self.cache = None
+        cache_ttl = kwargs.pop("cache_ttl", None)
+        if kwargs.pop("cache", False):
+            self.cache = SettingsCache(cache_ttl)
         self.host = host
         self.kwargs = kwargs
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
         self.firmware_version = None
         self.scope = None
+        self.engine = None
+        self.lookup_tables = {}
+        self.reduction = None
+        self.saved_reduction = []
+        self.measurements = None
+        self.link_lock = threading.RLock()
+        self.relinking = None
+        self.batches = threading.local()
+        self.broken = False
+        self.last_activity = time()
 
     # Connection methods
 
@@ -41,21 +149,74 @@ class ScopeConnection(object):
         connected = self.connected
         # Instanciate the vxi11 instrument
         if not self.scope:
-            self.scope = vxi11.Instrument(self.host, **self.kwargs)
+            self.scope = self.make_instrument()
         # Get firmware_version
         if not self.firmware_version:
             self.firmware_version = self.get_firmware_version()
         # Configure the scope
         if not connected:
             self.configure()
+        # Start the health probe
+        if self.probe_period and not self.probe:
+            self.probe = HealthProbe(self, self.probe_period)
+            self.probe.start()
+
+    def make_instrument(self):
+        """Return a new vxi11 instrument (i.e. a new link) to the scope.
+
+        The factory keyword given at instanciation can provide another
+        instrument class (e.g. a simulated instrument).
+        """
+        return self.factory(self.host, **self.kwargs)
 
     def disconnect(self):
         """Disconnect from the scope if not already disconnected."""
+        self.stop_acquisition()
+        if self.probe:
+            self.probe.stop()
+        self.probe = None
         if self.scope:
             with self.lock:
                 self.scope.close()
         self.scope = None
         self.firmware_version = None
+        self.broken = False
+        self.clear_cache()
+
+    def relink(self):
+        """Replace the main link with a new one and configure the scope
+        again (e.g. after a link failure).
+
+        The transfers of the other threads wait for the new link. The link
+        stays broken until the scope is configured.
+        """
+        with self.link_lock, self.lock:
+            self.relinking = threading.current_thread()
+            try:
+                scope, self.scope = self.scope, None
+                if scope:
+                    try:
+                        scope.close()
+                    except Exception:
+                        pass
+                self.clear_cache()
+                self.scope = self.make_instrument()
+                self.firmware_version = self.get_firmware_version()
+                self.configure()
+                self.broken = False
+            finally:
+                self.relinking = None
+
+    def get_link(self, index=0):
+        """Return the (lock, instrument) tuple of a link, the main link
+        being the index 0.
+        """
+        return self.lock, self.scope
+
+    def check_link(self):
+        """Check the main link by reading the status byte."""
+        with self.transfer("*STB?"):
+            return self.scope.read_stb()
 
     @property
     def connected(self):
@@ -66,8 +227,9 @@ class ScopeConnection(object):
         """Get the firmware version."""
         if not self.scope:
             raise RuntimeError("Vxi11 Instrument not instanciated.")
-        with self.lock:
+        with self.transfer("*IDN?") as transfer:
             idn = self.scope.ask("*IDN?")
+            transfer.received = len(idn)
         company, line, model, fw = idn.split(",")
         return tuple(int(part) for part in fw.split("."))
 
@@ -82,17 +244,151 @@ class ScopeConnection(object):
         if not self.connected:
             raise RuntimeError("not connected to the scope")
         command = self.prepare_command(commands)
-        with self.lock:
-            answer = self.scope.ask(command)
+        if self.cache:
+            answer = self.cache.get(command)
+            if answer is not None:
+                return answer
+
+        def query():
+            with self.transfer(command) as transfer:
+                answer = self.scope.ask(command)
+                transfer.received = len(answer)
+            return answer
+
+        answer = self.call_link(query, is_idempotent(command))
+        if self.cache:
+            self.cache.store(command, answer)
         return answer
 
     def write(self, command):
-        """Perform a write operation"""
+        """Perform a write operation, or queue it in a batch"""
         if not self.connected:
             raise RuntimeError("not connected to the scope")
         command = self.prepare_command(command)
-        with self.lock:
-            self.scope.write(command)
+        queue = getattr(self.batches, "queue", None)
+        if queue is not None:
+            queue.append(command)
+            if self.cache:
+                self.cache.invalidate(command)
+            return
+        self.send(command)
+
+    def send(self, command):
+        """Send a write command to the scope."""
+
+        def write():
+            with self.transfer(command):
+                self.scope.write(command)
+
+        self.call_link(write)
+        if self.cache:
+            self.cache.invalidate(command)
+
+    def transfer(self, command, lock=None):
+        """Return a context acquiring the lock of a link (the main link by
+        default) and recording the metrics and the outcome of the command.
+
+        The writes batched by the current thread are flushed first.
+        Raise CircuitOpenError if the circuit breaker is open.
+        """
+        self.flush_batch()
+        if self.breaker:
+            self.breaker.allow()
+        return self.metrics.transfer(
+            command, lock or self.lock, self.record_outcome)
+
+    def record_outcome(self, error):
+        """Update the link state after a transfer."""
+        self.last_activity = time()
+        if error is None:
+            if self.breaker:
+                self.breaker.success()
+        elif is_link_error(error):
+            self.broken = True
+            if self.breaker:
+                self.breaker.failure()
+
+    def call_link(self, func, idempotent=False):
+        """Run a link operation, relinking first if the link is broken.
+
+        Idempotent operations are retried up to the number of retries
+        given at instanciation. If a health probe is running, a broken
+        link fails fast and is relinked by the probe.
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            try:
+                if self.broken and \
+                   self.relinking is not threading.current_thread():
+                    if self.probe and self.probe.running:
+                        raise CircuitOpenError("link broken")
+                    with self.link_lock:
+                        if self.broken:
+                            self.relink()
+                return func()
+            except Exception as exc:
+                if not is_link_error(exc) or attempt + 1 == attempts:
+                    raise
+
+    # Batched writes
+
+    @contextmanager
+    def batch(self, check=False):
+        """Return a context queuing the writes of the current thread and
+        sending them in as few transfers as possible.
+
+        The writes are joined with ; up to the write buffer size and
+        flushed on exit, or before the next transfer of the thread so
+        the queries see the previous writes. The queued writes are
+        dropped if the context exits with an exception. Nested batches
+        are flushed with the outermost one.
+
+        If check is true, the error queue is read once the outermost
+        batch is flushed and CommandError is raised if it is not empty.
+        """
+        if getattr(self.batches, "queue", None) is not None:
+            yield
+            self.batches.check = self.batches.check or check
+            return
+        self.batches.queue = []
+        self.batches.check = check
+        try:
+            yield
+            self.flush_batch()
+        finally:
+            self.batches.queue = None
+        if self.batches.check:
+            self.check_errors()
+
+    def flush_batch(self):
+        """Send the writes queued by the current thread, if any."""
+        queue = getattr(self.batches, "queue", None)
+        if not queue:
+            return
+        commands, queue[:] = list(queue), []
+        for command in join_commands(commands, self.write_buffer_size):
+            self.send(command)
+
+    def get_errors(self):
+        """Read the error queue and return the (code, message) list."""
+        errors = []
+        for _ in range(self.max_errors):
+            answer = self.ask("SYSTem:ERRor?")
+            code, _, message = answer.partition(",")
+            if int(code) == 0:
+                break
+            errors.append((int(code), message.strip().strip('"')))
+        return errors
+
+    def check_errors(self):
+        """Raise CommandError if the error queue is not empty."""
+        errors = self.get_errors()
+        if errors:
+            raise CommandError(errors)
+
+    def get_metrics(self):
+        """Return a snapshot of the command and stage metrics."""
+        return self.metrics.snapshot()
 
     def prepare_command(self, commands):
         """Generate a single command from a command list."""
@@ -100,13 +396,164 @@ class ScopeConnection(object):
             return commands
         return ";".join(commands)
 
+    # Settings cache
+
+    def clear_cache(self):
+        """Clear the settings cache to force a refresh from the scope.
+
+        The data reduction and the measurements are also configured
+        again on next use.
+        """
+        self.reduction = None
+        self.measurements = None
+        if self.cache:
+            self.cache.clear()
+
+    @support_channel_dict
+    def get_channel_scales(self, channels):
+        """Return the scales of the given channels as a dictionary."""
+        return dict((channel, self.get_channel_scale(channel))
+                    for channel in channels)
+
+    @support_channel_dict
+    def get_channel_positions(self, channels):
+        """Return the positions of the given channels as a dictionary."""
+        return dict((channel, self.get_channel_position(channel))
+                    for channel in channels)
+
+    # Settings snapshot
+
+    def get_snapshot_queries(self, channels):
+        """Return the (key, query, parser) list of a settings snapshot."""
+        trigger = self.trigger_name
+        queries = [
+            ("time_scale", "TIMebase:SCALe?", float),
+            ("time_range", "TIMebase:RANGe?", float),
+            ("time_position", "TIMebase:POSition?", float),
+            ("record_length", "ACQuire:POINts?", int),
+            ("trigger_source", trigger + ":SOUR?", self.channel_names.index),
+            ("trigger_slope", trigger + ":EDGE:SLOPE?",
+             self.trigger_slopes.index)]
+        for channel in channels:
+            queries += [
+                (("scale", channel), "CHAN{0}:SCALe?", float),
+                (("position", channel), "CHAN{0}:POSition?", float),
+                (("offset", channel), "CHAN{0}:OFFSet?", float),
+                (("enabled", channel), "CHAN{0}:STATe?",
+                 lambda state: bool(int(state))),
+                (("coupling", channel), "CHAN{0}:COUPLing?",
+                 self.channel_couplings.index),
+                (("trigger_level", channel), trigger + ":LEV{0}?", float)]
+        return [(key, query.format(*key[1:]), parser)
+                for key, query, parser in queries]
+
+    def build_snapshot(self, channels, values, **kwargs):
+        """Build a settings snapshot from the parsed query values."""
+        channel_settings = {}
+        trigger_levels = {}
+        for channel in channels:
+            fields = ChannelSettings._fields
+            channel_settings[channel] = ChannelSettings(
+                *(values[field, channel] for field in fields))
+            trigger_levels[channel] = values["trigger_level", channel]
+        return SettingsSnapshot(
+            time_scale=values["time_scale"],
+            time_range=values["time_range"],
+            time_position=values["time_position"],
+            record_length=values["record_length"],
+            trigger_source=values["trigger_source"],
+            trigger_slope=values["trigger_slope"],
+            trigger_levels=trigger_levels,
+            channels=channel_settings,
+            **kwargs)
+
+    @support_channel_dict
+    def get_settings_snapshot(self, channels):
+        """Return the timebase, trigger and channel settings
+        using a single compound query.
+
+        The answers also refresh the settings cache, if enabled.
+        """
+        queries = self.get_snapshot_queries(channels)
+        commands = [query for _, query, _ in queries]
+        command = self.prepare_command(commands)
+        if not self.connected:
+            raise RuntimeError("not connected to the scope")
+        # Run the compound query
+        start = time()
+
+        def query():
+            with self.transfer(command) as transfer:
+                answer = self.scope.ask(command)
+                transfer.received = len(answer)
+            return answer
+
+        answer = self.call_link(query, True)
+        stop = time()
+        # Parse the answers
+        answers = answer.split(";")
+        if len(answers) != len(queries):
+            raise ValueError("Unexpected answer: {0!r}".format(answer))
+        values = {}
+        for (key, query, parser), value in zip(queries, answers):
+            values[key] = parser(value.strip())
+            if self.cache:
+                self.cache.store(query, value)
+        return self.build_snapshot(
+            channels, values, timestamp=stop,
+            duration=stop - start, queries=len(queries))
+
     # Acquisition settings
 
     def set_binary_readout(self):
         """Set the output format to binary."""
         cmd = "FORMAT:DATA " + self.data_format
+        if self.data_dtype.itemsize > 1:
+            cmd += ";FORMat:BORDer " + self.byte_order
         self.write(cmd)
 
+    @property
+    def data_dtype(self):
+        """Numpy type corresponding to the data format and byte order."""
+        kind, bits = DATA_FORMAT.match(self.data_format).groups()
+        kind = {"INT": "i", "UINT": "u", "REAL": "f"}[kind.upper()]
+        order = ">" if self.byte_order.upper().startswith("MSBF") else "<"
+        return numpy.dtype(order + kind + str(int(bits) // 8))
+
+    def set_data_format(self, data_format):
+        """Set the data format (e.g. INT,8, INT,16 or REAL,32)
+        and the binary readout.
+        """
+        self.data_format = data_format
+        self.set_binary_readout()
+
+    @support_channel_dict
+    def get_data_resolution(self, channels):
+        """Return the number of useful bits for the given channels:
+        16 if a channel uses the high resolution or averaging mode,
+        8 otherwise.
+        """
+        for channel in channels:
+            mode = self.get_waveform_mode(channel).upper()
+            cmd = "CHAN{0}:ARIThmetics?".format(channel)
+            arithmetics = str(self.ask(cmd)).upper()
+            if mode.startswith("HRES") or arithmetics.startswith("AVER"):
+                return 16
+        return 8
+
+    @support_channel_dict
+    def negotiate_data_format(self, channels):
+        """Set the data format with the fewest bytes per useful bit
+        for the current acquisition mode of the given channels.
+
+        Return the new data format.
+        """
+        resolution = self.get_data_resolution(channels)
+        data_format = self.data_formats[resolution]
+        if data_format != self.data_format:
+            self.set_data_format(data_format)
+        return data_format
+
     def get_acquisition_count(self):
         """Return the number of aquisition for single mode."""
         cmd = " ACQuire:COUNt?"
@@ -151,10 +598,126 @@ class ScopeConnection(object):
         cmd = '*CLS'
         self.write(cmd)
 
+    # Block readout
+
+    def read_block(self, out=None, callback=None, instrument=None,
+                   flush=True):
+        """Read a definite length block from the scope chunk by chunk
+        into out (uint8 array or file name to memory-map), calling the
+        callback with the block and the bytes received after each chunk.
+
+        The lock of the instrument (the main link by default) has to be
+        acquired by the caller. If flush is False, the rest of the answer
+        is left to be read.
+        """
+        instrument = instrument or self.scope
+        # Read the header
+        header = bytearray(instrument.read_raw(2))
+        if header[:1] != bytearray(b"#"):
+            raise ValueError("Not a definite length block")
+        header += bytearray(instrument.read_raw(int(chr(header[1]))))
+        block = self.prepare_block(header, out)
+        # Read the data
+        received = len(header)
+        while received < block.size:
+            size = min(self.chunk_size, block.size - received)
+            chunk = numpy.frombuffer(instrument.read_raw(size), numpy.uint8)
+            block[received:received+chunk.size] = chunk
+            received += chunk.size
+            if callback:
+                callback(block, received)
+        # Flush the termination character
+        if flush:
+            instrument.read_raw()
+        return block
+
+    def prepare_block(self, header, out=None):
+        """Return the array receiving a block, with its header written.
+
+        See read_block for the out argument.
+        """
+        offset, length = parse_block_header(header)
+        total = offset + length
+        if isinstance(out, str):
+            out = numpy.memmap(out, numpy.uint8, "w+", shape=(total,))
+        if out is None or out.size < total or not out.flags.writeable:
+            out = numpy.empty(total, numpy.uint8)
+        block = out[:total]
+        block[:offset] = header
+        return block
+
+    def read_compound(self, queries, out=None, callback=None, link=None,
+                      trailer=None):
+        """Run a compound query made of block queries, optionally followed
+        by a text query (e.g. the trigger time stamp), and return the list
+        of blocks.
+
+        Without output buffers and callback, a single block is returned
+        as the raw answer and several blocks as zero-copy views on the
+        answer. Otherwise, they are streamed into the output buffers
+        (see read_block). The answer to the trailer query is parsed
+        and stored as scope_time.
+        The link is the index of the link (see get_link), the main link
+        by default. A broken link is relinked first (see call_link).
+        """
+        count = len(queries)
+        out = out or [None] * count
+        cmd = self.prepare_command(list(queries) + [trailer] * bool(trailer))
+        whole = all(buf is None for buf in out) and callback is None
+
+        def query():
+            lock, instrument = self.get_link(link or 0)
+            with self.transfer(cmd, lock) as transfer:
+                instrument.write(cmd)
+                if whole:
+                    answer = instrument.read_raw()
+                    transfer.received = len(answer)
+                    if count == 1 and not trailer:
+                        return [answer]
+                    return split_blocks(answer)
+                # Stream the blocks, skipping the separators
+                parts = []
+                for index, buf in enumerate(out):
+                    last = index == count - 1 and not trailer
+                    parts.append(self.read_block(
+                        buf, callback, instrument, flush=last))
+                    if not last:
+                        instrument.read_raw(1)
+                if trailer:
+                    parts.append(instrument.read_raw().decode().strip())
+                transfer.received = sum(len(part) for part in parts)
+            return parts
+
+        parts = self.call_link(query, is_idempotent(cmd))
+        if whole and count == 1 and not trailer:
+            return parts
+        if len(parts) != count + bool(trailer) or any(
+                isinstance(part, str) for part in parts[:count]):
+            raise ValueError("Unexpected compound answer")
+        if trailer:
+            self.scope_time = parse_scope_time(parts[-1])
+        return parts[:count]
+
+    def get_timestamp_trailer(self, channels):
+        """Return the trigger time stamp query appended to the waveform
+        queries, or None if the hardware time stamps are disabled.
+        """
+        if self.correlator is None or not self.timestamp_query:
+            return None
+        return self.timestamp_query.format(*channels[:1])
+
     # Acquisition
 
     @support_channel_dict
-    def get_waveform_string(self, channels):
+    def empty_buffer(self, channels):
+        """Return an empty output buffer for get_waveform_string.
+
+        It gets reallocated by the block readout on first use.
+        """
+        return numpy.empty(0, numpy.uint8)
+
+    @support_channel_dict
+    def get_waveform_string(self, channels, out=None, callback=None):
         """Return a string containing the waveform values
         for the given channels.
 
@@ -163,92 +726,566 @@ class ScopeConnection(object):
         raise NotImplementedError
 
     @support_channel_dict
-    def parse_waveform_string(self, channels, string):
+    @stage_timer("parse")
+    def parse_waveform_string(self, channels, string, out=None,
+                              values_per_sample=1, copy=True):
         """Return the waveform values as a dictionary.
 
         The channels argument are the channels included in the acquisition.
         The string argument is the data from the scope.
+        The values are returned as new arrays, unless the out argument
+        provides preallocated arrays to fill. If copy is False, they are
+        returned as strided views on the string instead (read-only if the
+        string is). Samples with several values (e.g. envelopes) are
+        returned as 2-D arrays (sample, value); values_per_sample is
+        either a number or a dictionary indexed by channel.
         """
         result = {}
         channel_number = len(channels)
-        if not channel_number or not string:
+        if not channel_number or string is None or not len(string):
             return result
-        # Prepare string
-        dtype = self.data_format.replace(',', '').lower()
-        data_length_length = int(string[1])
-        data_length = int(string[2:2+data_length_length])
-        string = string[2+data_length_length:]
+        # Wrap the data without copying
+        dtype = self.data_dtype
+        offset, length = parse_block_header(string)
+        data = numpy.frombuffer(string, dtype=dtype,
+                                count=length // dtype.itemsize,
+                                offset=offset)
         # Loop over channels
+        if isinstance(values_per_sample, dict):
+            counts = [values_per_sample.get(channel, 1)
+                      for channel in channels]
+        else:
+            counts = [values_per_sample] * channel_number
+        frame = sum(counts)
+        if frame != channel_number:
+            samples = data[:len(data) // frame * frame].reshape(-1, frame)
+        position = 0
         for index, channel in enumerate(channels):
-            substring = string[index:data_length:channel_number]
-            result[channel] = numpy.fromstring(substring, dtype=dtype)
+            count = counts[index]
+            if frame == channel_number:
+                view = data[index::channel_number]
+            elif count == 1:
+                view = samples[:, position]
+            else:
+                view = samples[:, position:position + count]
+            position += count
+            array = out.get(channel) if out else None
+            if array is not None:
+                array = array[:len(view)]
+                array[...] = view
+                view = array
+            elif copy:
+                view = view.copy()
+            result[channel] = view
         # Return dictionary
         return result
 
-    def convert_waveforms(self, data_dict, scales=None, positions=None):
+    def get_conversion(self, dtype, scale=None, position=None):
+        """Return the (median, factor, offset) tuple converting raw values
+        of the given type to divisions (or volts if a scale is given):
+
+            result = (raw - median) * factor - offset
+        """
+        # Get median
+        info = numpy.iinfo(dtype)
+        data_median = (info.max + info.min) * 0.5
+        # Get factor
+        factor = 10.0
+        factor /= info.max - info.min
+        if scale is not None:
+            factor *= scale
+        # Get offset
+        offset = 0
+        if position is not None:
+            offset = position * scale
+        return data_median, factor, offset
+
+    def get_lookup_table(self, channel, dtype, scale=None, position=None,
+                         output=numpy.double):
+        """Return the conversion table for 8 or 16 bit raw values,
+        indexed by the raw values viewed as unsigned.
+
+        The table is cached per channel and only rebuilt when the type,
+        the scale or the position changes.
+        """
+        dtype = numpy.dtype(dtype)
+        key = dtype, scale, position, numpy.dtype(output)
+        cached = self.lookup_tables.get(channel)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        median, factor, offset = self.get_conversion(dtype, scale, position)
+        unsigned = numpy.dtype(dtype.byteorder + "u" + str(dtype.itemsize))
+        values = numpy.arange(2 ** (8 * dtype.itemsize), dtype=unsigned)
+        values = values.view(dtype).astype(numpy.double)
+        table = ((values - median) * factor - offset).astype(output)
+        self.lookup_tables[channel] = key, table
+        return table
+
+    @stage_timer("convert")
+    def convert_waveforms(self, data_dict, scales=None, positions=None,
+                          out=None, dtype=numpy.double):
         """Convert the values in the acquisition dictionary
         to divisions or volts.
 
         If scales and positions are given, the result is returned in volts.
         Otherwise, the result is in divisions.
+        The out argument is an optional dictionary of reusable arrays,
+        and dtype the output type (e.g. numpy.float32 to halve the size).
+        8 and 16 bit values are converted with a single lookup.
+        Floating point values (REAL,32) are already in volts
+        and are returned as such.
         """
         result = {}
         # Loop over the channels
         for channel, data in data_dict.items():
-            # Get median
-            info = numpy.iinfo(data.dtype)
-            data_median = (info.max + info.min) * 0.5
-            # Get factor
-            factor = 10.0
-            factor /= info.max - info.min
-            if scales is not None:
-                factor *= scales[channel]
-            # Get position
-            position = 0
-            if positions is not None:
-                position = positions[channel] * scales[channel]
-            # Convert
-            data = data.astype(numpy.double)
-            result[channel] = ((data - data_median) * factor) - position
+            scale = None if scales is None else scales[channel]
+            position = None if positions is None else positions[channel]
+            array = out.get(channel) if out else None
+            if array is not None:
+                array = array[:len(data)]
+            # Convert using a lookup table
+            if data.dtype.kind in "iu" and data.dtype.itemsize <= 2:
+                table = self.get_lookup_table(
+                    channel, data.dtype, scale, position, dtype)
+                unsigned = data.dtype.byteorder + "u"
+                index = data.view(unsigned + str(data.dtype.itemsize))
+                if array is None:
+                    array = numpy.empty(data.shape, dtype)
+                # Work by chunks to keep the index conversion small
+                step = self.conversion_chunk_size
+                for start in range(0, len(data), step):
+                    stop = start + step
+                    numpy.take(table, index[start:stop],
+                               out=array[start:stop])
+                result[channel] = array
+                continue
+            # Floating point values are already in volts
+            if data.dtype.kind == "f":
+                if array is None:
+                    array = numpy.empty(data.shape, dtype)
+                array[...] = data
+                result[channel] = array
+                continue
+            # Convert using arithmetic
+            median, factor, offset = self.get_conversion(
+                data.dtype, scale, position)
+            if array is None:
+                array = numpy.empty(data.shape, dtype)
+            numpy.subtract(data, median, out=array, casting="unsafe")
+            array *= factor
+            array -= offset
+            result[channel] = array
         # Return dict
         return result
 
-    def get_waveform_data(self, channels):
+    def get_waveform_data(self, channels, out=None, copy=True):
         """Return the waveform raw data as a dictionary
         for the given channels.
+
+        The out argument is an optional dictionary of reusable arrays.
+        If copy is False, the values are views on the readout
+        (see parse_waveform_string).
         """
         string = self.get_waveform_string(channels)
-        return self.parse_waveform_string(channels, string)
+        return self.parse_waveform_string(channels, string, out, copy=copy)
 
-    def get_waveforms(self, channels, scales=None, positions=None):
+    def get_waveforms(self, channels, scales=None, positions=None,
+                      waveforms=False):
         """Return the waveform values as a dictionary.
 
         The channels are the channels to include in the acquisition.
+        If waveforms is True, Waveform objects are returned instead,
+        with the settings read in a single snapshot query.
         """
+        if not waveforms:
+            data_dict = self.get_waveform_data(channels, copy=False)
+            return self.convert_waveforms(data_dict, scales, positions)
+        snapshot = self.get_settings_snapshot(channels)
         data_dict = self.get_waveform_data(channels)
-        return self.convert_waveforms(data_dict, scales, positions)
-
-    def stamp_acquisition(self, channels, single=True, busy=True):
+        start = snapshot.time_position - snapshot.time_range / 2
+        starts = dict.fromkeys(data_dict, start)
+        stops = dict.fromkeys(data_dict, start + snapshot.time_range)
+        return self.make_waveforms(
+            data_dict, snapshot.scales, snapshot.positions, starts, stops,
+            time())
+
+    def make_waveforms(self, data_dict, scales, positions, starts, stops,
+                       timestamp=None):
+        """Return the raw values in the acquisition dictionary as
+        Waveform objects, computing the volts and the time axis lazily.
+
+        The starts and stops are the times of the first sample and
+        after the last sample, as dictionaries indexed by channel.
+        """
+        return dict(
+            (channel, Waveform(self, channel, data, scales[channel],
+                               positions[channel], starts[channel],
+                               stops[channel], timestamp))
+            for channel, data in data_dict.items())
+
+    def stamp_acquisition(self, channels, single=None, busy=None,
+                          out=None, callback=None):
         """Return the time stamp of an acquisition
         along with the values as a string.
+
+        The single and busy arguments default to the default_single and
+        default_busy attributes. With hardware_timestamps, the time stamp
+        is a clock.Timestamp (see clock.ClockCorrelator).
         """
+        if single is None:
+            single = self.default_single
+        start = time()
         if channels and single:
+            with self.metrics.stage("wait"):
+                self.run_single(busy)
+        stamp = time()
+        self.scope_time = None
+        with self.metrics.stage("readout"):
+            string = self.get_waveform_string(channels, out, callback)
+        if self.controller is not None:
+            self.controller.observe(
+                stamp - start, time() - stamp, string, single)
+        if self.correlator is not None and self.scope_time is not None:
+            # Without a single run, the trigger may precede the call
+            lower = start if channels and single else None
+            stamp = self.correlator.correct(self.scope_time, lower, stamp)
+        return stamp, string
+
+    # Accumulation
+
+    @support_channel_dict
+    def accumulate_waveforms(self, channels, count, accumulators,
+                             single=None, busy=None):
+        """Run the given number of acquisitions and fold their raw values
+        into the accumulators (see rohdescope.accumulators).
+
+        The readout buffer is reused and the values are passed as views,
+        so the averaging does not allocate per frame.
+        Return the accumulators.
+        """
+        out = self.empty_buffer(channels)
+        for _ in range(count):
+            stamp, out = self.stamp_acquisition(
+                channels, single, busy, out=out)
+            with self.metrics.stage("accumulate"):
+                data_dict = self.parse_waveform_string(
+                    channels, out, copy=False)
+                for accumulator in accumulators:
+                    accumulator.add(data_dict)
+        return accumulators
+
+    # Segmented acquisition
+
+    def set_segment_count(self, count):
+        """Set the number of segments acquired by a single run
+        (0 to disable the segmented acquisition).
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    @support_channel_dict
+    def get_segments(self, channels, count, out=None):
+        """Return the relative time stamps and the raw values
+        of the last segments.
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    def acquire_segments(self, channels, count, busy=None, out=None):
+        """Acquire the given number of triggered segments with a single run
+        and wait, and read them back in bulk.
+
+        Return the relative time stamps of the segments as an array
+        (in seconds) and the raw values as a dictionary of 2-D arrays
+        (segment, point), from the oldest segment to the latest.
+        The segmented acquisition stays enabled afterwards
+        (see set_segment_count).
+        """
+        self.set_segment_count(count)
+        self.run_single(busy)
+        return self.get_segments(channels, count, out)
+
+    def convert_segments(self, data_dict, scales=None, positions=None,
+                         dtype=numpy.double):
+        """Convert the segments returned by acquire_segments
+        to divisions or volts (see convert_waveforms).
+        """
+        flat = dict((channel, data.reshape(-1))
+                    for channel, data in data_dict.items())
+        result = self.convert_waveforms(flat, scales, positions, dtype=dtype)
+        return dict((channel, result[channel].reshape(data.shape))
+                    for channel, data in data_dict.items())
+
+    # Data reduction
+
+    def get_reduction_commands(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the commands configuring the data reduction.
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    def get_reduction_settings(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the headers of the settings changed by the data
+        reduction (e.g. ACQuire:POINts).
+
+        Not implemented here.
+        """
+        raise NotImplementedError
+
+    @support_channel_dict
+    def set_reduction(self, channels, points=None, start=None, stop=None,
+                      envelope=None):
+        """Configure the scope-side data reduction: number of points,
+        time range (start and stop in seconds) and envelope mode.
+
+        None keeps the scope defaults (see get_reduction_commands).
+        The changed settings are restored by clear_reduction.
+        """
+        if (points, start, stop, envelope) == (None, None, None, None):
+            return self.clear_reduction()
+        reduction = tuple(channels), points, start, stop, envelope
+        if reduction == self.reduction:
+            return
+        commands = self.get_reduction_commands(
+            channels, points, start, stop, envelope)
+        saved = set(setting for setting, _ in self.saved_reduction)
+        settings = [setting for setting in self.get_reduction_settings(
+            channels, points, start, stop, envelope) if setting not in saved]
+        if settings:
+            answers = self.ask([setting + "?" for setting in settings])
+            self.saved_reduction += zip(settings, answers.split(";"))
+        self.write(commands)
+        self.reduction = reduction
+
+    def clear_reduction(self):
+        """Restore the settings changed by the data reduction."""
+        if self.saved_reduction:
+            self.write(["{0} {1}".format(setting, value)
+                        for setting, value in self.saved_reduction])
+        self.saved_reduction = []
+        self.reduction = None
+
+    @support_channel_dict
+    def get_data_headers(self, channels):
+        """Return the data headers of the given channels as a dictionary,
+        using a single compound query.
+        """
+        if not channels:
+            return {}
+        commands = [self.data_header_query.format(channel)
+                    for channel in channels]
+        answers = self.ask(commands).split(";")
+        return dict((channel, DataHeader.parse(answer))
+                    for channel, answer in zip(channels, answers))
+
+    @support_channel_dict
+    def acquire_reduced(self, channels, points=None, start=None, stop=None,
+                        envelope=None, scales=None, positions=None,
+                        single=None, busy=None, waveforms=False,
+                        keep=False):
+        """Acquire waveforms with a scope-side data reduction
+        (see set_reduction).
+
+        Return the time stamp, the values in volts (or Waveform objects)
+        and the data headers. The settings are restored unless keep is set.
+        """
+        self.set_reduction(channels, points, start, stop, envelope)
+        try:
+            stamp, string = self.stamp_acquisition(channels, single, busy)
+            headers = self.get_data_headers(channels)
+        finally:
+            if not keep:
+                self.clear_reduction()
+        values_per_sample = dict(
+            (channel, header.values_per_sample)
+            for channel, header in headers.items())
+        data = self.parse_waveform_string(
+            channels, string, values_per_sample=values_per_sample,
+            copy=waveforms)
+        if scales is None:
+            scales = self.get_channel_scales(channels)
+        if positions is None:
+            positions = self.get_channel_positions(channels)
+        if waveforms:
+            values = self.make_waveforms(
+                data, scales, positions,
+                dict((key, value.start) for key, value in headers.items()),
+                dict((key, value.stop) for key, value in headers.items()),
+                stamp)
+        else:
+            values = self.convert_waveforms(data, scales, positions)
+        return stamp, values, headers
+
+    # Automatic measurements
+
+    def get_measurement_commands(self, measurements):
+        """Return the commands configuring the automatic measurements,
+        given as a list of (channel, name) tuples (see measurement_types).
+
+        The measurement places are used in order and the others
+        are disabled.
+        """
+        if len(measurements) > self.measurement_count:
+            raise ValueError("Too many measurements")
+        commands = []
+        for index, (channel, name) in enumerate(measurements, 1):
+            commands += [
+                "MEASurement{0}:SOURce {1}".format(
+                    index, self.measurement_source.format(channel)),
+                "MEASurement{0}:MAIN {1}".format(
+                    index, self.measurement_types[name]),
+                "MEASurement{0}:ENABle ON".format(index)]
+        for index in range(len(measurements) + 1,
+                           self.measurement_count + 1):
+            commands.append("MEASurement{0}:ENABle OFF".format(index))
+        return commands
+
+    def set_measurements(self, measurements):
+        """Configure the automatic measurements, given as a list of
+        (channel, name) tuples (e.g. [(1, "peak_to_peak"), (2, "frequency")]).
+
+        The commands are only sent when the measurements change.
+        """
+        measurements = list(measurements)
+        if measurements == self.measurements:
+            return
+        self.write(self.get_measurement_commands(measurements))
+        self.measurements = measurements
+
+    def get_measurement_results(self):
+        """Return the results of the configured measurements as a
+        dictionary indexed by (channel, name), using a single compound
+        query. Invalid results are returned as NaN.
+        """
+        if not self.measurements:
+            return {}
+        commands = ["MEASurement{0}:RESult:ACTual?".format(index)
+                    for index in range(1, len(self.measurements) + 1)]
+        answers = self.ask(commands).split(";")
+        if len(answers) != len(commands):
+            raise ValueError("Unexpected answer: {0!r}".format(answers))
+        results = {}
+        for key, answer in zip(self.measurements, answers):
+            value = float(answer)
+            if abs(value) >= self.invalid_value:
+                value = float("nan")
+            results[key] = value
+        return results
+
+    def acquire_measurements(self, measurements=None, single=None,
+                             busy=None):
+        """Run an acquisition and return its time stamp along with the
+        results of the automatic measurements (see get_measurement_results).
+
+        The measurements are configured first, if given.
+        """
+        if single is None:
+            single = self.default_single
+        if measurements is not None:
+            self.set_measurements(measurements)
+        if single:
+            with self.metrics.stage("wait"):
+                self.run_single(busy)
+        stamp = time()
+        with self.metrics.stage("readout"):
+            results = self.get_measurement_results()
+        return stamp, results
+
+    # Background acquisition
+
+    @support_channel_dict
+    def start_acquisition(self, channels, size=16, single=None, busy=None,
+                          publisher=None):
+        """Start acquiring continuously in a background thread.
+
+        The frames are stored in a ring buffer of the given size, and
+        the parsed frames are published to the publisher, if any (e.g.
+        a shared.FramePublisher feeding other processes).
+        Return the acquisition engine.
+        """
+        self.stop_acquisition()
+        self.engine = AcquisitionEngine(
+            self, channels, size, single, busy, publisher)
+        self.engine.start()
+        return self.engine
+
+    def pause_acquisition(self):
+        """Pause the background acquisition."""
+        if self.engine:
+            self.engine.pause()
+
+    def resume_acquisition(self):
+        """Resume the background acquisition."""
+        if self.engine:
+            self.engine.resume()
+
+    def stop_acquisition(self):
+        """Stop the background acquisition."""
+        if self.engine:
+            self.engine.stop()
+
+    def run_single(self, busy=None):
+        """Run a single acquisition and wait for it to complete.
+
+        If busy is set, the completion is polled (see wait). Otherwise,
+        the acquisition is started and waited for with a single RUNS;*OPC?
+        query, holding the link for the whole acquisition. The busy
+        argument defaults to the default_busy attribute.
+        """
+        if busy is None:
+            busy = self.default_busy
+        if busy:
             self.write("RUNS")
-            self.wait(busy)
-        return time(), self.get_waveform_string(channels)
+        self.wait(busy)
 
-    def wait(self, busy=True):
-        """Wait for the last commands to complete."""
+    # Rate control
+
+    def enable_rate_control(self, **kwargs):
+        """Start a control.RateController with the given keyword arguments
+        and return it. An active controller is disabled first.
+        """
+        self.disable_rate_control()
+        self.controller = RateController(self, **kwargs)
+        return self.controller
+
+    def disable_rate_control(self):
+        """Stop the rate control and restore the initial tick,
+        the wait mode and the data reduction settings.
+        """
+        controller, self.controller = self.controller, None
+        if controller is not None and controller.points is not None:
+            self.clear_reduction()
+        self.tick = self.initial_tick
+        self.default_busy = type(self).default_busy
+
+    def wait(self, busy=True, srq=None):
+        """Wait for the last commands to complete.
+
+        If busy is set, the completion is polled through the event
+        status register (*ESR?), or through the status byte if srq is set
+        (see wait_service_request). The srq argument defaults to the srq
+        keyword given at instanciation.
+        """
         # Use hardware wait
         if not busy:
             return self.ask("RUNS;*OPC?")
+        # Prepare timeout
+        timeout = self.kwargs['instrument_timeout'] / 1000.0
+        timeout += time()
+        # Use service request
+        if srq is None:
+            srq = self.srq
+        if srq:
+            return self.wait_service_request(timeout)
         # Prepare test condition
         @tick_control(self.tick)
         def finished():
             return int(self.ask("*ESR?")) % 2
-        # Prepare timeout
-        timeout = self.kwargs['instrument_timeout'] / 1000.0
-        timeout += time()
         self.write("*OPC")
         # Wait for the commands to complete
         while not finished():
@@ -256,6 +1293,34 @@ class ScopeConnection(object):
             if time() > timeout:
                 raise Vxi11Exception(15, "wait")
 
+    def wait_service_request(self, timeout):
+        """Wait for the last commands to complete using a service request.
+
+        The operation complete event is routed to the status byte
+        (*ESE/*SRE), which is read with the VXI-11 read_stb call.
+        The polling period starts small and grows up to the tick,
+        so the latency is bounded by the instrument for fast triggers.
+        """
+        self.write("*ESE 1;*SRE {0};*OPC".format(self.event_status_bit))
+        backoff = Backoff(self.tick)
+
+        # Read the status byte
+        def read_status():
+            with self.transfer("*STB?"):
+                return self.scope.read_stb()
+
+        # Wait for the event status bit
+        while True:
+            status = self.call_link(read_status, True)
+            if status & self.event_status_bit:
+                break
+            # Handle timeout
+            if time() > timeout:
+                raise Vxi11Exception(15, "wait")
+            backoff.sleep()
+        # Clear the event status register
+        self.ask("*ESR?")
+
     # General accessor methods
 
     def get_identifier(self):
@@ -382,7 +1447,7 @@ class ScopeConnection(object):
         """Return the trigger coupling.
         (0 for DC, 1 for AC, 2 for DCLimit, 3 for ACLimit)
         """
-        lst = ['DC', 'AC', 'DCL', 'ACL']
+        lst = self.channel_couplings
         cmd = "CHAN{0}:COUPLing?".format(channel)
         return lst.index(self.ask(cmd))
 
@@ -390,7 +1455,7 @@ class ScopeConnection(object):
         """Set the channel coupling.
         (0 for DC, 1 for AC, 2 for DCLimit, 3 for ACLimit)
         """
-        lst = ['DC', 'AC', 'DCL', 'ACL']
+        lst = self.channel_couplings
         cmd = "CHAN{0}:COUPLing {1}".format(channel, lst[coupling])
         self.write(cmd)
 
@@ -422,7 +1487,7 @@ class ScopeConnection(object):
         """Return the trigger slope.
         (0 for negative, 1 for positive and 2 for either)
         """
-        lst = ['NEG', 'POS', 'EITH']
+        lst = self.trigger_slopes
         cmd = self.trigger_name + ":EDGE:SLOPE?"
         return lst.index(self.ask(cmd))
 
@@ -430,7 +1495,7 @@ class ScopeConnection(object):
         """Set the trigger slope.
         (0 for negative, 1 for positive and 2 for either)
         """
-        lst = ['NEG', 'POS', 'EITH']
+        lst = self.trigger_slopes
         cmd = self.trigger_name + ":EDGE:SLOPE {0}".format(lst[slope])
         self.write(cmd)
 
@@ -464,6 +1529,98 @@ class RTMConnection(ScopeConnection):
     # Data format
     data_format = "UINT,8"
 
+    # Waveform data query (formatted with the channel)
+    waveform_query = "CHAN{0}:DATA?"
+
+    # Data header query (formatted with the channel)
+    data_header_query = "CHAN{0}:DATA:HEAD?"
+
+    # Automatic measurement types by name
+    measurement_types = {
+        "frequency": "FREQuency",
+        "period": "PERiod",
+        "peak_to_peak": "PEAK",
+        "maximum": "UPEakvalue",
+        "minimum": "LPEakvalue",
+        "amplitude": "AMPLitude",
+        "high": "HIGH",
+        "low": "LOW",
+        "mean": "MEAN",
+        "rms": "RMS",
+        "rise_time": "RTIMe",
+        "fall_time": "FTIMe"}
+
+    # Automatic measurement source (formatted with the channel)
+    measurement_source = "CH{0}"
+
+    # Whether stamp_acquisition runs a single acquisition by default
+    default_single = False
+
+    # Data points modes by reduction points value
+    data_points_modes = {"DMAX": "DMAX", "DMAXIMUM": "DMAX",
+                         "DEF": "DEF", "DEFAULT": "DEF"}
+
+    # Whether the data reduction sets a number of points
+    reduction_points = False
+
+    # Number of history segments read per compound query
+    segment_batch = 16
+
+    # Minimal firmware version reading several channels per query
+    compound_readout_version = (5, 0)
+
+    # Trigger time stamp query
+    timestamp_query = "CHANnel:HISTory:TSABsolute?"
+
+    def __init__(self, host, **kwargs):
+        self.link_number = kwargs.pop("links", 1)
+        super(RTMConnection, self).__init__(host, **kwargs)
+        self.links = []
+        self.pool = None
+
+    # Connection methods
+
+    def connect(self):
+        """Connect to the scope and open the additional links."""
+        super(RTMConnection, self).connect()
+        while len(self.links) < self.link_number - 1:
+            self.links.append((threading.Lock(), self.make_instrument()))
+        if self.links and not self.pool:
+            self.pool = ThreadPool(len(self.links) + 1)
+
+    def relink(self):
+        """Replace all the links with new ones and configure the scope
+        again (e.g. after a link failure).
+        """
+        with self.link_lock:
+            for index, (lock, instrument) in enumerate(self.links):
+                with lock:
+                    try:
+                        instrument.close()
+                    except Exception:
+                        pass
+                    self.links[index] = lock, self.make_instrument()
+            super(RTMConnection, self).relink()
+
+    def get_link(self, index=0):
+        """Return the (lock, instrument) tuple of a link, the main link
+        being the index 0 and the additional links the following ones.
+        """
+        if not index:
+            return super(RTMConnection, self).get_link()
+        return self.links[index - 1]
+
+    def disconnect(self):
+        """Close the additional links and disconnect from the scope."""
+        super(RTMConnection, self).disconnect()
+        for lock, instrument in self.links:
+            with lock:
+                instrument.close()
+        self.links = []
+        if self.pool:
+            self.pool.close()
+        self.pool = None
+
     # State accessors
 
     def get_state(self):
@@ -505,42 +1662,212 @@ class RTMConnection(ScopeConnection):
         raise NotImplementedError
 
     @support_channel_dict
-    def get_waveform_string(self, channels):
+    def get_waveform_string(self, channels, out=None, callback=None):
         """Return a string containing the waveform values
         for the given channels.
+
+        If a list of output buffers or a callback is given, the blocks
+        are streamed using the chunked readout (see read_block).
+        If additional links are open, the channels are read concurrently,
+        distributed over the links. The channels of a link are read
+        with a single compound query if the firmware supports it
+        (see compound_readout).
         """
-        result = []
-        # Loop over channels
-        for channel in channels:
-            with self.lock:
-                cmd = "CHAN{0}:DATA?".format(channel)
-                self.scope.write(cmd)
-                result.append(self.scope.read_raw())
-        # Return list
-        return result
+        out = out or [None] * len(channels)
+        links = 1 + len(self.links)
+        trailer = self.get_timestamp_trailer(channels)
+        # Serial readout
+        if links == 1 or len(channels) < 2:
+            return self.get_channels_string(
+                channels, out, callback, trailer=trailer)
+        # Parallel readout
+        jobs = [[] for _ in range(links)]
+        for index, item in enumerate(zip(channels, out)):
+            jobs[index % links].append(item)
+
+        def read(index):
+            if not jobs[index]:
+                return []
+            subset, buffers = zip(*jobs[index])
+            return self.get_channels_string(
+                subset, buffers, callback, index,
+                None if index else trailer)
+
+        results = self.pool.map(read, range(links))
+        return [results[index % links][index // links]
+                for index in range(len(channels))]
+
+    @property
+    def compound_readout(self):
+        """Property to indicate whether several channels can be read
+        with a single compound query.
+        """
+        version = self.firmware_version
+        return bool(version) and version >= self.compound_readout_version
+
+    def get_channels_string(self, channels, out=None, callback=None,
+                            link=None, trailer=None):
+        """Return a list of strings containing the waveform values
+        of the given channels.
+
+        The channels are read with a single compound query if supported,
+        one query per channel otherwise (see read_compound). The trailer
+        is an optional text query appended to the first query.
+        The link is the index of the link, the main link by default.
+        """
+        out = out or [None] * len(channels)
+        if len(channels) < 2 or not self.compound_readout:
+            return [self.get_channel_string(channel, buf, callback, link,
+                                            None if index else trailer)
+                    for index, (channel, buf) in
+                    enumerate(zip(channels, out))]
+        commands = [self.waveform_query.format(channel)
+                    for channel in channels]
+        return self.read_compound(commands, out, callback, link, trailer)
+
+    def get_channel_string(self, channel, out=None, callback=None,
+                           link=None, trailer=None):
+        """Return a string containing the waveform values of a channel.
+
+        The link is the index of the link, the main link by default,
+        and the trailer an optional text query (see read_compound).
+        """
+        query = self.waveform_query.format(channel)
+        return self.read_compound([query], [out], callback, link, trailer)[0]
 
     @support_channel_dict
-    def parse_waveform_string(self, channels, strings):
+    def parse_waveform_string(self, channels, strings, out=None,
+                              values_per_sample=1, copy=True):
         """Return the waveform values as a dictionary.
 
         The channels argument are the channels included in the acquisition.
         The strings argument is the data from the scope.
+        The out argument is an optional dictionary of reusable arrays
+        (see ScopeConnection.parse_waveform_string for copy).
         """
         result = {}
         # Loop over the channels
         for channel, string in zip(channels, strings):
             parent = super(RTMConnection, self)
-            dct = parent.parse_waveform_string([channel], string)
+            dct = parent.parse_waveform_string(
+                [channel], string, out, values_per_sample, copy)
             result.update(dct)
         # Return dict
         return result
 
-    def stamp_acquisition(self, channels, single=False, busy=True):
-        """Return the time stamp of an acquisition
-        along with the values as a string.
+    @support_channel_dict
+    def empty_buffer(self, channels):
+        """Return a list of empty output buffers for get_waveform_string.
+
+        They get reallocated by the block readout on first use.
+        """
+        return [numpy.empty(0, numpy.uint8) for _ in channels]
+
+    # Data reduction
+
+    def get_reduction_commands(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the commands configuring the data reduction.
+
+        The points are None for the full record or DEFault for the
+        display resolution. The time range is not supported.
+        """
+        if start is not None or stop is not None:
+            raise NotImplementedError("No data range export on the RTM")
+        mode = "DMAX" if points is None else \
+            self.data_points_modes.get(str(points).upper())
+        if mode is None:
+            raise ValueError(
+                "The RTM exports the full record (None) or the display "
+                "resolution (DEFault), not {0!r} points".format(points))
+        commands = []
+        for channel in channels:
+            commands.append("CHAN{0}:DATA:POIN {1}".format(channel, mode))
+            if envelope is not None:
+                kind = ("SAMP", "PDET")[bool(envelope)]
+                commands.append("CHAN{0}:TYPE {1}".format(channel, kind))
+        return commands
+
+    def get_reduction_settings(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the headers of the settings changed by the data
+        reduction.
+        """
+        settings = []
+        for channel in channels:
+            settings.append("CHANnel{0}:DATA:POINts".format(channel))
+            if envelope is not None:
+                settings.append("CHANnel{0}:TYPE".format(channel))
+        return settings
+
+    # Segmented acquisition
+
+    def set_segment_count(self, count):
+        """Set the number of acquisitions of a single run,
+        kept in the history (0 to get a single acquisition).
+        """
+        cmd = "ACQuire:NSINgle:COUNt {0}".format(max(count, 1))
+        self.write(cmd)
+
+    @support_channel_dict
+    def get_segments(self, channels, count, out=None):
+        """Return the relative time stamps and the raw values
+        of the last segments in the history.
+
+        Each compound query selects a history segment, then reads the
+        channels and the segment time stamp, for segment_batch segments
+        at once. Without compound readout support (see compound_readout),
+        the segments and the channels are read with separate queries.
+        The out argument is an optional dictionary of 2-D arrays.
         """
-        args = channels, single, busy
-        return super(RTMConnection, self).stamp_acquisition(*args)
+        timestamps = numpy.empty(count)
+        result = {}
+        parent = super(RTMConnection, self)
+        step = len(channels) + 1
+        batch = self.segment_batch if self.compound_readout else 1
+        for start in range(0, count, batch):
+            indexes = range(start, min(start + batch, count))
+            commands = []
+            for index in indexes:
+                commands.append("CHAN:HIST:CURR {0}".format(index + 1 - count))
+                commands += [self.waveform_query.format(channel)
+                             for channel in channels]
+                commands.append("CHAN:HIST:TSR?")
+            command = self.prepare_command(commands)
+
+            def query():
+                with self.transfer(command) as transfer:
+                    self.scope.write(command)
+                    answer = self.scope.read_raw()
+                    transfer.received = len(answer)
+                return answer
+
+            # Selecting a history segment can be repeated
+            if self.compound_readout:
+                parts = split_blocks(self.call_link(query, True))
+            else:
+                self.write(commands[0])
+                parts = [self.get_channel_string(channel)
+                         for channel in channels]
+                parts.append(self.ask(commands[-1]))
+            if len(parts) != step * len(indexes):
+                raise ValueError("Unexpected history answer")
+            # Fill the segments
+            for position, index in enumerate(indexes):
+                segment = parts[position * step:(position + 1) * step]
+                timestamps[index] = float(segment[-1])
+                for channel, block in zip(channels, segment):
+                    values = parent.parse_waveform_string(
+                        [channel], block, copy=False)[channel]
+                    array = result.get(channel)
+                    if array is None:
+                        array = out.get(channel) if out else None
+                        shape = count, len(values)
+                        if array is None or array.shape != shape:
+                            array = numpy.empty(shape, values.dtype)
+                        result[channel] = array
+                    array[index] = values
+        return timestamps, result
 
 
 # RTO scope connection class
@@ -556,6 +1883,43 @@ class RTOConnection(ScopeConnection):
     # Data format
     data_format = "INT,8"
 
+    # Data formats by number of useful bits
+    data_formats = {8: "INT,8", 16: "INT,16"}
+
+    # Waveform data query (formatted with the first channel)
+    waveform_query = "CHAN{0}:WAV1:DATA:VAL?"
+
+    # Data header query (formatted with the channel)
+    data_header_query = "CHAN{0}:WAV1:DATA:HEAD?"
+
+    # Automatic measurement types by name
+    measurement_types = {
+        "frequency": "FREQuency",
+        "period": "PERiod",
+        "peak_to_peak": "PDELta",
+        "maximum": "MAXimum",
+        "minimum": "MINimum",
+        "amplitude": "AMPLitude",
+        "high": "HIGH",
+        "low": "LOW",
+        "mean": "MEAN",
+        "rms": "RMS",
+        "rise_time": "RTIMe",
+        "fall_time": "FTIMe",
+        "area": "AREA"}
+
+    # Automatic measurement source (formatted with the channel)
+    measurement_source = "C{0}W1"
+
+    # Number of automatic measurement places
+    measurement_count = 8
+
+    # Whether all the channels are exported in a single block
+    multichannel_export = True
+
+    # Trigger time stamp query (formatted with the first channel)
+    timestamp_query = "CHANnel{0}:WAVeform1:HISTory:TSABsolute?"
+
     # State accessors
 
     def get_state(self):
@@ -581,19 +1945,20 @@ class RTOConnection(ScopeConnection):
 
     def configure(self):
         """Configure the scope for fast acquisition mode."""
-        # Clear the buffer
-        super(RTOConnection, self).configure()
-        # Do not include time values when reading the waveforms
-        cmd = "EXPort:WAVeform:INCXvalues OFF"
-        self.write(cmd)
-        # Multichannel mode for fast export
-        cmd = "EXPort:WAVeform:MULTichannel ON"
-        self.write(cmd)
-        # Set the fast binary readout
-        self.set_fast_readout(True)
-        self.set_binary_readout()
-        # Set acquisiton count for run single
-        self.set_acquisition_count(1)
+        with self.batch():
+            # Clear the buffer
+            super(RTOConnection, self).configure()
+            # Do not include time values when reading the waveforms
+            cmd = "EXPort:WAVeform:INCXvalues OFF"
+            self.write(cmd)
+            # Multichannel mode for fast export
+            cmd = "EXPort:WAVeform:MULTichannel ON"
+            self.write(cmd)
+            # Set the fast binary readout
+            self.set_fast_readout(True)
+            self.set_binary_readout()
+            # Set acquisiton count for run single
+            self.set_acquisition_count(1)
 
     def set_channel_export(self, channel, export):
         """Set the channel export for fast acquisition."""
@@ -625,18 +1990,122 @@ class RTOConnection(ScopeConnection):
         return super(RTOConnection, self).set_record_length(length)
 
     @support_channel_dict
-    def get_waveform_string(self, channels):
+    def get_waveform_string(self, channels, out=None, callback=None):
         """Return a string containing the waveform values
         for the given channels.
+
+        If an output buffer or a callback is given, the block
+        is streamed using the chunked readout (see read_block).
         """
         if not channels:
             return ""
-        with self.lock:
-            self.scope.write("CHAN{0}:WAV1:DATA:VAL?".format(channels[0]))
-            return self.scope.read_raw()
+        query = self.waveform_query.format(channels[0])
+        trailer = self.get_timestamp_trailer(channels)
+        return self.read_compound([query], [out], callback, None, trailer)[0]
+
+    # Data reduction
+
+    def get_reduction_commands(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the commands configuring the data reduction.
+
+        The points value sets the record length, so the decimation
+        happens at acquisition (None keeps the record length).
+        The time range is exported using the manual export scope.
+        """
+        commands = []
+        if points is not None:
+            commands.append("ACQuire:POINts:AUTO RECL")
+            commands.append("ACQuire:POINts {0}".format(points))
+        if start is None and stop is None:
+            commands.append("EXPort:WAVeform:SCOPe WFM")
+        else:
+            commands.append("EXPort:WAVeform:SCOPe MAN")
+            if start is not None:
+                commands.append("EXPort:WAVeform:STARt {0}".format(start))
+            if stop is not None:
+                commands.append("EXPort:WAVeform:STOP {0}".format(stop))
+        if envelope is not None:
+            kind = ("SAMP", "PDET")[bool(envelope)]
+            commands += ["CHAN{0}:WAV1:TYPE {1}".format(channel, kind)
+                         for channel in channels]
+        return commands
+
+    def get_reduction_settings(self, channels, points=None, start=None,
+                               stop=None, envelope=None):
+        """Return the headers of the settings changed by the data
+        reduction.
+        """
+        settings = []
+        if points is not None:
+            settings += ["ACQuire:POINts:AUTO", "ACQuire:POINts"]
+        settings.append("EXPort:WAVeform:SCOPe")
+        if start is not None:
+            settings.append("EXPort:WAVeform:STARt")
+        if stop is not None:
+            settings.append("EXPort:WAVeform:STOP")
+        if envelope is not None:
+            settings += ["CHANnel{0}:WAVeform1:TYPE".format(channel)
+                         for channel in channels]
+        return settings
+
+    # Segmented acquisition
+
+    def set_segment_count(self, count):
+        """Set the number of FastFrame segments acquired by a single run
+        (0 to disable the segmented acquisition).
+        """
+        state = ("OFF", "ON")[bool(count)]
+        cmd = "ACQuire:SEGMented:STATe {0}".format(state)
+        cmd += ";ACQuire:COUNt {0}".format(max(count, 1))
+        self.write(cmd)
+
+    @support_channel_dict
+    def get_segments(self, channels, count, out=None):
+        """Return the relative time stamps and the raw values
+        of the last segments in the history.
+
+        The history replay exports all the segments in a single block,
+        so the 2-D arrays are views on the block. The out argument
+        is passed to get_waveform_string. The replay is turned off
+        after the readout.
+        """
+        if not channels:
+            return numpy.empty(0), {}
+        first = channels[0]
+        cmd = "CHANnel{0}:HISTory:STARt {1};CHANnel{0}:HISTory:STOP 0;"
+        cmd += "CHANnel{0}:HISTory:REPLay ON"
+        self.write(cmd.format(first, 1 - count))
+        try:
+            cmd = "CHANnel{0}:WAVeform1:HISTory:TSRAll?".format(first)
+            timestamps = numpy.array(
+                self.ask(cmd).split(","), float)[-count:]
+            string = self.get_waveform_string(channels, out)
+        finally:
+            self.write("CHANnel{0}:HISTory:REPLay OFF".format(first))
+        data = self.parse_waveform_string(channels, string, copy=False)
+        return timestamps, dict((channel, values.reshape(count, -1))
+                                for channel, values in data.items())
 
     # Time position correction
 
+    def get_snapshot_queries(self, channels):
+        """Return the (key, query, parser) list of a settings snapshot."""
+        parent = super(RTOConnection, self)
+        queries = [query for query in parent.get_snapshot_queries(channels)
+                   if query[0] != "time_position"]
+        return queries + [
+            ("horizontal_position", "TIMebase:HORizontal:POSition?", float),
+            ("reference", "TIMebase:REFerence?", float)]
+
+    def build_snapshot(self, channels, values, **kwargs):
+        """Build a settings snapshot, correcting the time position."""
+        shift = 0.5 - values.pop("reference") / 100
+        position = values.pop("horizontal_position")
+        values["time_position"] = position + shift * values["time_range"]
+        parent = super(RTOConnection, self)
+        return parent.build_snapshot(channels, values, **kwargs)
+
     def get_time_position(self):
         """Return the time position in seconds."""
         # Get position
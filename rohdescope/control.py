@@ -0,0 +1,202 @@
+"""Provide an adaptive controller of the acquisition rate."""
+
+# Imports
+import threading
+from timeit import default_timer as time
+
+
+# Frame size
+def frame_size(frame):
+    """Return the size in bytes of a raw frame (string or list of
+    strings, as returned by stamp_acquisition).
+    """
+    if isinstance(frame, (list, tuple)):
+        return sum(len(part) for part in frame)
+    return len(frame) if frame is not None else 0
+
+
+# Rate controller class
+class RateController(object):
+    """Tune the tick, the wait mode and optionally (if channels are given)
+    the reduction points of a connection from its observed acquisitions.
+
+    The decisions are updated every period seconds (see get_state).
+    """
+
+    # Number of status polls per trigger period
+    polls_per_trigger = 8
+
+    # Contention above which the completion is polled, so the link
+    # is released between polls (half of it to stop polling)
+    max_contention = 0.05
+
+    # Relative change of points below which the reduction is kept
+    points_hysteresis = 0.2
+
+    def __init__(self, connection, target_rate=None, target_latency=None,
+                 channels=None, min_tick=50e-6, max_tick=0.01,
+                 min_points=1000, max_points=None, period=1.0,
+                 smoothing=0.2):
+        self.connection = connection
+        self.target_rate = target_rate
+        self.target_latency = target_latency
+        self.channels = channels
+        self.min_tick = min_tick
+        self.max_tick = max_tick
+        self.min_points = min_points
+        self.max_points = max_points
+        self.period = period
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop the measurements and the decisions."""
+        with self.lock:
+            self.trigger_period = None
+            self.readout_time = None
+            self.bandwidth = None
+            self.frame_period = None
+            self.contention = 0.0
+            self.size = None
+            self.points = None
+            self.record_length = None
+            self.last_frame = None
+            self.last_adjust = time()
+            self.last_totals = self.get_lock_totals()
+
+    # Measurements
+
+    def average(self, previous, value):
+        """Return the exponential moving average updated with a value."""
+        if previous is None:
+            return value
+        return previous + self.smoothing * (value - previous)
+
+    def observe(self, wait, readout, frame, single=True):
+        """Observe an acquisition: the wait and readout durations
+        (in seconds) and the raw frame.
+        """
+        now = time()
+        size = frame_size(frame)
+        with self.lock:
+            if single and wait > 0:
+                self.trigger_period = self.average(self.trigger_period, wait)
+            self.readout_time = self.average(self.readout_time, readout)
+            if readout > 0 and size:
+                self.bandwidth = self.average(self.bandwidth, size / readout)
+            if self.last_frame is not None:
+                self.frame_period = self.average(
+                    self.frame_period, now - self.last_frame)
+            self.last_frame = now
+            self.size = size
+            due = now > self.last_adjust + self.period
+        if due:
+            self.adjust()
+
+    def get_lock_totals(self):
+        """Return the total lock wait of the connection commands
+        along with the current time.
+        """
+        commands = self.connection.metrics.snapshot()["commands"]
+        lock_wait = sum(item["lock_wait"] for item in commands.values())
+        return lock_wait, time()
+
+    # Decisions
+
+    def adjust(self):
+        """Update the contention and apply the decisions
+        to the connection.
+        """
+        if self.record_length is None and self.controls_points():
+            self.record_length = self.connection.get_record_length()
+        with self.lock:
+            lock_wait, now = self.get_lock_totals()
+            previous_wait, previous = self.last_totals
+            if now > previous:
+                self.contention = self.average(
+                    self.contention, (lock_wait - previous_wait) /
+                    (now - previous))
+            self.last_totals = lock_wait, now
+            self.last_adjust = now
+            tick, busy, points = self.get_decisions()
+        connection = self.connection
+        connection.tick = tick
+        connection.default_busy = busy
+        if points is not None and points != self.points:
+            connection.set_reduction(self.channels, points)
+            self.points = points
+
+    def get_tick(self):
+        """Return the poll interval."""
+        if self.trigger_period is None:
+            return self.connection.tick
+        tick = self.trigger_period / self.polls_per_trigger
+        tick *= 1 + self.contention
+        return min(max(tick, self.min_tick), self.max_tick)
+
+    def get_busy(self):
+        """Return whether the completion has to be polled, since the
+        hardware wait holds the link.
+        """
+        if self.trigger_period is None:
+            return self.connection.default_busy
+        timeout = self.connection.kwargs.get("instrument_timeout")
+        if timeout and self.trigger_period > timeout / 2000.0:
+            return True
+        # Hysteresis
+        if self.connection.default_busy:
+            return self.contention > self.max_contention / 2
+        return self.contention > self.max_contention
+
+    def controls_points(self):
+        """Return whether the points of the data reduction are controlled
+        (not on the RTM).
+        """
+        return self.channels is not None and \
+            self.connection.reduction_points and \
+            bool(self.target_rate or self.target_latency)
+
+    def get_points(self):
+        """Return the number of points fitting the readout in the budget,
+        or None if the points are not controlled.
+
+        The readout time is assumed to scale with the record length.
+        """
+        if not self.controls_points() or self.record_length is None:
+            return None
+        budgets = []
+        if self.target_rate:
+            budgets.append(1.0 / self.target_rate)
+        if self.target_latency:
+            budgets.append(self.target_latency)
+        if not self.readout_time:
+            return None
+        budget = min(budgets) - (self.trigger_period or 0.0)
+        current = self.points or self.record_length
+        points = int(current * max(budget, 0.0) / self.readout_time)
+        points = min(points, self.max_points or self.record_length)
+        points = max(points, self.min_points)
+        if self.points and abs(points - self.points) < \
+           self.points_hysteresis * self.points:
+            return self.points
+        return points
+
+    def get_decisions(self):
+        """Return the (tick, busy, points) decisions."""
+        return self.get_tick(), self.get_busy(), self.get_points()
+
+    def get_state(self):
+        """Return the measured rates and the decisions as a dictionary."""
+        with self.lock:
+            period = self.trigger_period
+            return {
+                "trigger_rate": 1.0 / period if period else None,
+                "frame_rate": (1.0 / self.frame_period
+                               if self.frame_period else None),
+                "readout_time": self.readout_time,
+                "bandwidth": self.bandwidth,
+                "contention": self.contention,
+                "tick": self.connection.tick,
+                "busy": self.connection.default_busy,
+                "points": self.points}
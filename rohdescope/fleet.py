@@ -0,0 +1,135 @@
+"""Provide a manager running several scope connections in parallel."""
+
+# Imports
+from collections import OrderedDict
+from rohdescope.common import Mapping
+from multiprocessing.pool import ThreadPool
+
+
+# Scope fleet class
+class ScopeFleet(object):
+    """Manage several scope connections in parallel.
+
+    The connections are given as a dictionary indexed by name.
+    Each operation runs concurrently on the scopes through a thread pool,
+    so it takes about as long as the slowest scope. Failures are
+    recorded per scope: failed scopes are skipped by the acquisition
+    until they are reconnected.
+    """
+
+    def __init__(self, connections, workers=None):
+        self.connections = dict(connections)
+        self.workers = workers or max(len(self.connections), 1)
+        self.errors = {}
+        self.pool = None
+
+    # Pool management
+
+    def get_pool(self):
+        """Return the thread pool, creating it if necessary."""
+        if self.pool is None:
+            self.pool = ThreadPool(self.workers)
+        return self.pool
+
+    def close(self):
+        """Close the thread pool."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+        self.pool = None
+
+    # Parallel execution
+
+    def map(self, func, names=None):
+        """Run func(connection) concurrently on the given scopes
+        (all of them by default).
+
+        Return the results and the errors as dictionaries indexed by name.
+        """
+        return self.run(lambda name: func(self.connections[name]), names)
+
+    def run(self, func, names=None):
+        """Run func(name) concurrently for the given scopes
+        (all of them by default).
+
+        Return the results and the errors as dictionaries indexed by name.
+        """
+        if names is None:
+            names = list(self.connections)
+
+        def run(name):
+            try:
+                return name, func(name), None
+            except Exception as exc:
+                return name, None, exc
+
+        results, errors = {}, {}
+        for name, result, error in self.get_pool().map(run, names):
+            if error is None:
+                results[name] = result
+                self.errors.pop(name, None)
+            else:
+                errors[name] = self.errors[name] = error
+        return results, errors
+
+    @property
+    def failed(self):
+        """Names of the scopes whose last operation failed."""
+        return sorted(self.errors)
+
+    @property
+    def available(self):
+        """Names of the scopes whose last operation succeeded."""
+        return sorted(name for name in self.connections
+                      if name not in self.errors)
+
+    # Connection methods
+
+    def connect(self, names=None):
+        """Connect to the scopes concurrently."""
+        return self.map(lambda connection: connection.connect(), names)
+
+    def disconnect(self, names=None):
+        """Disconnect from the scopes concurrently."""
+        return self.map(lambda connection: connection.disconnect(), names)
+
+    def reconnect(self, names=None):
+        """Reconnect the given scopes (the failed ones by default),
+        without affecting the others.
+        """
+        if names is None:
+            names = self.failed
+
+        def relink(connection):
+            connection.disconnect()
+            connection.connect()
+
+        return self.map(relink, names)
+
+    # Acquisition
+
+    def acquire(self, channels, **kwargs):
+        """Run stamp_acquisition concurrently on the available scopes.
+
+        The channels argument is either shared by all the scopes, or a
+        dictionary of channels indexed by scope name. The keyword arguments
+        are passed to stamp_acquisition.
+        Return the results as a dictionary of (time stamp, string) sorted
+        by time stamp, and the errors as a dictionary.
+        """
+        names = self.available
+        if isinstance(channels, Mapping) and \
+           set(channels) <= set(self.connections):
+            names = [name for name in names if name in channels]
+            get_channels = channels.__getitem__
+        else:
+            def get_channels(name):
+                return channels
+
+        def acquire(name):
+            connection = self.connections[name]
+            return connection.stamp_acquisition(get_channels(name), **kwargs)
+
+        results, errors = self.run(acquire, names)
+        ordered = sorted(results.items(), key=lambda item: item[1][0])
+        return OrderedDict(ordered), errors
@@ -0,0 +1,259 @@
+"""Provide the instrumentation of the SCPI layer."""
+
+# Imports
+import json
+import socket
+import threading
+from functools import wraps
+from timeit import default_timer as time
+from vxi11.vxi11 import Vxi11Exception
+from rohdescope.cache import scpi_path
+
+# VXI-11 timeout error code
+TIMEOUT_ERROR = 15
+
+
+# Command family
+def command_family(command):
+    """Return the family of a command: its header in short form without
+    the suffixes, e.g. CHA:DAT for CHANnel2:DATA? and *ESR for *ESR?.
+
+    Compound commands are labeled by their first command, followed by +.
+    """
+    first, _, rest = command.strip().lstrip(":").partition(";")
+    if first.startswith("*"):
+        family = first.split(" ")[0].rstrip("?").upper()
+    else:
+        family = ":".join(node.rstrip("0123456789")
+                          for node in scpi_path(first)) or "?"
+    return family + "+" if rest.strip() else family
+
+
+# Stage decorator
+def stage_timer(name):
+    """Return a decorator recording the duration of a connection method
+    as an acquisition stage.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.stage(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Counters
+class CommandCounters(object):
+    """Counters of a command family."""
+    __slots__ = ("count", "lock_wait", "wire_time", "bytes_sent",
+                 "bytes_received", "errors", "timeouts")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        """Return the counters as a dictionary."""
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class StageCounters(object):
+    """Counters of an acquisition stage."""
+    __slots__ = ("count", "total", "maximum", "last")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        """Return the counters as a dictionary."""
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+# Transfer context
+class Transfer(object):
+    """Context acquiring a link lock and measuring a transfer.
+
+    The received attribute is set by the caller to the number of bytes
+    received. The optional callback is called with the error, or None.
+    """
+    __slots__ = ("metrics", "command", "lock", "callback", "start",
+                 "acquired", "received")
+
+    def __init__(self, metrics, command, lock, callback=None):
+        self.metrics = metrics
+        self.command = command
+        self.lock = lock
+        self.callback = callback
+        self.received = 0
+
+    def __enter__(self):
+        self.start = time()
+        self.lock.acquire()
+        self.acquired = time()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        stop = time()
+        self.lock.release()
+        self.metrics.record(
+            self.command, self.acquired - self.start, stop - self.acquired,
+            len(self.command), self.received, value)
+        if self.callback:
+            self.callback(value)
+
+
+# Stage context
+class Stage(object):
+    """Context measuring an acquisition stage."""
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.metrics.record_stage(self.name, time() - self.start)
+
+
+# Metrics class
+class Metrics(object):
+    """Collect the command and stage timings of a scope connection.
+
+    Commands are grouped by family (see command_family) and counted with
+    their lock wait, wire time, bytes transferred, errors and timeouts.
+    Stages (wait, readout, parse, convert) are counted with their total,
+    maximal and last durations. Recording costs a few microseconds, so
+    it can stay enabled; a disabled instance records nothing.
+    """
+
+    # Maximum number of cached command families
+    family_cache_size = 1024
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.families = {}
+        self.reset()
+
+    def reset(self):
+        """Reset all the counters."""
+        with self.lock:
+            self.commands = {}
+            self.stages = {}
+            self.started = time()
+
+    # Recording
+
+    def transfer(self, command, lock, callback=None):
+        """Return a context acquiring the lock and measuring a transfer."""
+        return Transfer(self, command, lock, callback)
+
+    def stage(self, name):
+        """Return a context measuring an acquisition stage."""
+        return Stage(self, name)
+
+    def get_family(self, command):
+        """Return the family of a command, using a cache."""
+        family = self.families.get(command)
+        if family is None:
+            family = command_family(command)
+            if len(self.families) < self.family_cache_size:
+                self.families[command] = family
+        return family
+
+    def record(self, command, lock_wait, wire_time, sent=0, received=0,
+               error=None):
+        """Record a transfer and its error, if any."""
+        if not self.enabled:
+            return
+        family = self.get_family(command)
+        with self.lock:
+            counters = self.commands.get(family)
+            if counters is None:
+                counters = self.commands[family] = CommandCounters()
+            counters.count += 1
+            counters.lock_wait += lock_wait
+            counters.wire_time += wire_time
+            counters.bytes_sent += sent
+            counters.bytes_received += received
+            if error is not None:
+                counters.errors += 1
+                if isinstance(error, socket.timeout) or (
+                        isinstance(error, Vxi11Exception) and
+                        error.err == TIMEOUT_ERROR):
+                    counters.timeouts += 1
+
+    def record_stage(self, name, duration):
+        """Record the duration of an acquisition stage."""
+        if not self.enabled:
+            return
+        with self.lock:
+            counters = self.stages.get(name)
+            if counters is None:
+                counters = self.stages[name] = StageCounters()
+            counters.count += 1
+            counters.total += duration
+            counters.maximum = max(counters.maximum, duration)
+            counters.last = duration
+
+    # Export
+
+    def snapshot(self):
+        """Return a copy of the counters as a dictionary."""
+        with self.lock:
+            return {
+                "uptime": time() - self.started,
+                "commands": dict((family, counters.as_dict())
+                                 for family, counters in
+                                 self.commands.items()),
+                "stages": dict((name, counters.as_dict())
+                               for name, counters in self.stages.items())}
+
+    def to_json(self, **kwargs):
+        """Return the counters as a JSON string."""
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix="rohdescope", labels=None):
+        """Return the counters in the Prometheus text format.
+
+        The labels are an optional dictionary added to every sample
+        (e.g. {"host": "scope1"}).
+        """
+        snapshot = self.snapshot()
+        labels = sorted((labels or {}).items())
+        metrics = [
+            ("commands", "count", "total", "Number of commands"),
+            ("commands", "lock_wait", "lock_wait_seconds_total",
+             "Time spent waiting for the link lock"),
+            ("commands", "wire_time", "wire_seconds_total",
+             "Time spent on the link"),
+            ("commands", "bytes_sent", "sent_bytes_total", "Bytes sent"),
+            ("commands", "bytes_received", "received_bytes_total",
+             "Bytes received"),
+            ("commands", "errors", "errors_total", "Number of errors"),
+            ("commands", "timeouts", "timeouts_total", "Number of timeouts"),
+            ("stages", "count", "total", "Number of stage runs"),
+            ("stages", "total", "seconds_total", "Time spent in the stage"),
+            ("stages", "maximum", "max_seconds",
+             "Maximal duration of the stage")]
+        lines = []
+        for group, field, suffix, description in metrics:
+            label = "family" if group == "commands" else "stage"
+            name = "{0}_{1}_{2}".format(prefix, group.rstrip("s"), suffix)
+            kind = "gauge" if field == "maximum" else "counter"
+            lines.append("# HELP {0} {1}".format(name, description))
+            lines.append("# TYPE {0} {1}".format(name, kind))
+            for key, counters in sorted(snapshot[group].items()):
+                pairs = labels + [(label, key)]
+                text = ",".join('{0}="{1}"'.format(
+                    pair[0], str(pair[1]).replace('"', '\\"'))
+                    for pair in pairs)
+                lines.append("{0}{{{1}}} {2}".format(
+                    name, text, counters[field]))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,171 @@
+"""Provide a memory-mapped recorder for long acquisition runs."""
+
+# Imports
+import numpy
+from numpy.lib.format import open_memmap
+from rohdescope.common import Backoff, CHANNELS
+
+
+# Frame record type
+def frame_dtype(frame_size):
+    """Return the record type of a frame with the given data size.
+
+    The sequence field is written last: a frame is complete
+    once it is non-zero.
+    """
+    return numpy.dtype([
+        ("sequence", "<u8"),
+        ("timestamp", "<f8"),
+        ("time_scale", "<f8"),
+        ("record_length", "<i8"),
+        ("scales", "<f8", (CHANNELS,)),
+        ("positions", "<f8", (CHANNELS,)),
+        ("sizes", "<u8", (CHANNELS,)),
+        ("data", "u1", (frame_size,))])
+
+
+# Recorder class
+class CaptureRecorder(object):
+    """Append raw frames to a preallocated memory-mapped NPY file.
+
+    Each frame is stored in a fixed size record along with its time stamp
+    and settings (see frame_dtype), so readers can access any frame
+    directly, even while the capture is running. The frame is the raw
+    string returned by stamp_acquisition; a list of strings (RTM) is
+    stored as consecutive parts whose sizes are recorded.
+    """
+
+    def __init__(self, filename, capacity, frame_size):
+        self.filename = filename
+        self.frames = open_memmap(
+            filename, "w+", frame_dtype(frame_size), (capacity,))
+        self.count = 0
+
+    @property
+    def capacity(self):
+        """Maximum number of frames."""
+        return len(self.frames)
+
+    def append(self, timestamp, frame, settings=None):
+        """Append a frame with its time stamp and optional settings
+        (a SettingsSnapshot).
+        """
+        index = self.count
+        if index >= self.capacity:
+            raise IndexError("The capture file is full")
+        frames = self.frames
+        parts = frame if isinstance(frame, list) else [frame]
+        if len(parts) > CHANNELS:
+            raise ValueError("Too many parts in the frame")
+        # Copy the data
+        data = frames["data"][index]
+        sizes = numpy.zeros(CHANNELS, numpy.uint64)
+        offset = 0
+        for part, part_index in zip(parts, range(CHANNELS)):
+            part = numpy.frombuffer(part, numpy.uint8)
+            if offset + part.size > data.size:
+                raise ValueError("The frame exceeds the frame size")
+            data[offset:offset+part.size] = part
+            sizes[part_index] = part.size
+            offset += part.size
+        frames["sizes"][index] = sizes
+        frames["timestamp"][index] = timestamp
+        # Copy the settings
+        scales = numpy.full(CHANNELS, numpy.nan)
+        positions = numpy.full(CHANNELS, numpy.nan)
+        if settings is not None:
+            frames["time_scale"][index] = settings.time_scale
+            frames["record_length"][index] = settings.record_length
+            for channel, value in settings.channels.items():
+                if 1 <= channel <= CHANNELS:
+                    scales[channel - 1] = value.scale
+                    positions[channel - 1] = value.position
+        else:
+            frames["time_scale"][index] = numpy.nan
+            frames["record_length"][index] = -1
+        frames["scales"][index] = scales
+        frames["positions"][index] = positions
+        # Mark the frame as complete
+        frames["sequence"][index] = index + 1
+        self.count += 1
+
+    def flush(self):
+        """Write the pending changes to the disk."""
+        self.frames.flush()
+
+    def close(self):
+        """Flush and release the memory map."""
+        if self.frames is not None:
+            self.flush()
+        self.frames = None
+
+
+# Reader class
+class CaptureReader(object):
+    """Read the frames of a capture file with zero copies.
+
+    The file can be read while it is being recorded.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.frames = numpy.load(filename, mmap_mode="r")
+
+    def __len__(self):
+        """Return the number of complete frames."""
+        sequences = self.frames["sequence"]
+        low, high = 0, len(sequences)
+        while low < high:
+            middle = (low + high) // 2
+            if sequences[middle]:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, index):
+        """Return the (time stamp, frame) tuple of a frame.
+
+        The frame is a view on the file, or a list of views
+        if it was recorded as several parts.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("No such frame: {0}".format(index))
+        data = self.frames["data"][index]
+        sizes = self.frames["sizes"][index]
+        offsets = numpy.cumsum(sizes)
+        parts = [data[offset-size:offset]
+                 for size, offset in zip(sizes, offsets) if size]
+        frame = parts if len(parts) > 1 else parts[0]
+        return float(self.frames["timestamp"][index]), frame
+
+    def get_settings(self, index):
+        """Return the settings of a frame as a dictionary.
+
+        Scales and positions are dictionaries indexed by channel.
+        """
+        record = self.frames[index]
+        channels = range(1, CHANNELS + 1)
+        return {
+            "time_scale": float(record["time_scale"]),
+            "record_length": int(record["record_length"]),
+            "scales": dict((channel, float(value)) for channel, value in
+                           zip(channels, record["scales"])
+                           if not numpy.isnan(value)),
+            "positions": dict((channel, float(value)) for channel, value in
+                              zip(channels, record["positions"])
+                              if not numpy.isnan(value))}
+
+    def follow(self, start=0, tick=0.01):
+        """Yield the (time stamp, frame) tuples from the start index,
+        waiting for new frames when the end of the capture is reached.
+        """
+        index = start
+        backoff = Backoff(tick)
+        while index < len(self.frames):
+            if index < len(self):
+                yield self.read(index)
+                index += 1
+                backoff.reset()
+            else:
+                backoff.sleep()
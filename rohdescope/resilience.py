@@ -0,0 +1,157 @@
+"""Provide the resilience helpers of the scope connections."""
+
+# Imports
+import socket
+import threading
+from timeit import default_timer as time
+from vxi11.rpc import RPCError
+from vxi11.vxi11 import Vxi11Exception
+from vxi11.vxi11 import ERR_INVALID_LINK_IDENTIFIER
+from vxi11.vxi11 import ERR_CHANNEL_NOT_ESTABLISHED
+
+# Transport errors indicating a broken link
+LINK_ERRORS = (RPCError, socket.error, EOFError)
+
+# VXI-11 error codes indicating a lost link
+LOST_LINK_CODES = (ERR_INVALID_LINK_IDENTIFIER, ERR_CHANNEL_NOT_ESTABLISHED)
+
+# Queries clearing a register, that cannot be retried
+DESTRUCTIVE_QUERIES = ("*ESR?", "SYST:ERR?", "SYSTEM:ERROR?", "SYST:ERR:NEXT?")
+
+
+# Link errors
+def is_link_error(error):
+    """Return whether an error breaks the link: a transport error or a
+    lost link. The other VXI-11 errors (e.g. a device timeout or a bad
+    parameter) leave the link usable.
+    """
+    if isinstance(error, Vxi11Exception):
+        return not isinstance(error, CircuitOpenError) and \
+            error.err in LOST_LINK_CODES
+    return isinstance(error, LINK_ERRORS)
+
+
+# Idempotence
+def is_idempotent(command):
+    """Return whether a command can be retried safely: a query or a
+    compound of queries, none of them clearing a register.
+    """
+    parts = [part.strip().upper() for part in command.split(";")]
+    return all(part.endswith("?") and part not in DESTRUCTIVE_QUERIES
+               for part in parts if part)
+
+
+# Circuit open exception
+class CircuitOpenError(Vxi11Exception):
+    """Raised instead of accessing a scope known to be unreachable."""
+
+    def __init__(self, note="circuit open"):
+        super(CircuitOpenError, self).__init__(None, note)
+
+
+# Circuit breaker class
+class CircuitBreaker(object):
+    """Fail fast while a scope is unreachable.
+
+    The circuit opens after the given number of consecutive failures.
+    Once open, the calls fail immediately until the reset timeout has
+    elapsed; the circuit is then half open and lets the calls through:
+    the next success closes it, the next failure opens it again.
+    """
+
+    # States
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half open"
+
+    # Default reset timeout in seconds
+    default_reset_timeout = 5.0
+
+    def __init__(self, threshold=3, reset_timeout=None):
+        if reset_timeout is None:
+            reset_timeout = self.default_reset_timeout
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened = None
+
+    @property
+    def state(self):
+        """State of the circuit."""
+        if self.opened is None:
+            return self.CLOSED
+        if time() < self.opened + self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """Raise CircuitOpenError if the circuit is open."""
+        if self.state == self.OPEN:
+            raise CircuitOpenError()
+
+    def success(self):
+        """Record a successful call, closing the circuit."""
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+
+    def failure(self):
+        """Record a failed call, possibly opening the circuit."""
+        with self.lock:
+            self.failures += 1
+            if self.opened is not None or self.failures >= self.threshold:
+                self.opened = time()
+
+
+# Health probe class
+class HealthProbe(object):
+    """Check the health of a scope connection in a background thread.
+
+    A broken link is relinked by the probe, so the request threads can
+    fail fast instead of waiting for the instrument timeout. A healthy
+    link idle for more than the period is checked by reading the
+    status byte.
+    """
+
+    def __init__(self, connection, period=5.0):
+        self.connection = connection
+        self.period = period
+        self.stopped = threading.Event()
+        self.thread = None
+        self.checks = 0
+        self.relinks = 0
+        self.error = None
+
+    def start(self):
+        """Start the probe thread."""
+        if self.running:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop the probe thread and wait for it to finish."""
+        self.stopped.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    @property
+    def running(self):
+        """Property to indicate whether the probe thread is alive."""
+        return bool(self.thread and self.thread.is_alive())
+
+    def run(self):
+        """Check the connection periodically until stopped."""
+        connection = self.connection
+        while not self.stopped.wait(self.period):
+            try:
+                if connection.broken:
+                    self.relinks += 1
+                    connection.relink()
+                elif time() > connection.last_activity + self.period:
+                    self.checks += 1
+                    connection.check_link()
+            except Exception as exc:
+                self.error = exc
@@ -0,0 +1,72 @@
+"""Provide the structures holding the scope settings."""
+
+# Imports
+import numpy
+from collections import namedtuple
+
+
+# Channel settings
+ChannelSettings = namedtuple(
+    "ChannelSettings", "scale position offset enabled coupling")
+
+
+# Settings snapshot
+class SettingsSnapshot(namedtuple("SettingsSnapshot", [
+        "time_scale", "time_range", "time_position", "record_length",
+        "trigger_source", "trigger_slope", "trigger_levels", "channels",
+        "timestamp", "duration", "queries"])):
+    """Settings of the scope read in a single round trip.
+
+    The channels and trigger_levels fields are dictionaries indexed
+    by channel. The duration is the time spent on the round trip,
+    and queries the number of queries it contained.
+    """
+
+    __slots__ = ()
+
+    @property
+    def round_trips_saved(self):
+        """Number of round trips saved compared to the accessors."""
+        return self.queries - 1
+
+    @property
+    def scales(self):
+        """Channel scales, as expected by get_waveforms."""
+        return dict((channel, settings.scale)
+                    for channel, settings in self.channels.items())
+
+    @property
+    def positions(self):
+        """Channel positions, as expected by get_waveforms."""
+        return dict((channel, settings.position)
+                    for channel, settings in self.channels.items())
+
+
+# Data header
+class DataHeader(namedtuple("DataHeader", [
+        "start", "stop", "length", "values_per_sample"])):
+    """Time mapping of an exported waveform (CHANnel:DATA:HEADer?).
+
+    The start and stop times are in seconds relative to the trigger,
+    the length is in samples, and each sample holds values_per_sample
+    values (2 for the min and max of an envelope or a peak detection).
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, answer):
+        """Build a data header from the answer of the header query."""
+        start, stop, length, values = answer.split(",")[:4]
+        return cls(float(start), float(stop), int(float(length)),
+                   int(float(values)))
+
+    @property
+    def interval(self):
+        """Time between two samples in seconds."""
+        return (self.stop - self.start) / self.length
+
+    def get_times(self):
+        """Return the time of each sample as an array."""
+        return numpy.linspace(self.start, self.stop, self.length,
+                              endpoint=False)
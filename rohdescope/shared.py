@@ -0,0 +1,251 @@
+"""Provide the publication of frames to other processes in shared memory.
+
+This module requires python 3.8 or later.
+"""
+
+# Imports
+import numpy
+import weakref
+from multiprocessing import shared_memory, resource_tracker
+from timeit import default_timer as time
+from rohdescope.common import Backoff, CHANNELS
+
+# Alignment of the slots in the shared memory
+ALIGNMENT = 64
+
+# Header record type
+HEADER_DTYPE = numpy.dtype([
+    ("sequence", "<u8"),
+    ("slots", "<u8"),
+    ("capacity", "<u8"),
+    ("channels", "<i8", (CHANNELS,)),
+    ("dtype", "S16")], align=True)
+
+
+# Slot record type
+def slot_dtype(capacity, dtype):
+    """Return the record type of a slot holding a frame of the given
+    capacity (in samples per channel) and data type.
+
+    The sequence field is zero while the slot is being written.
+    """
+    return numpy.dtype([
+        ("sequence", "<u8"),
+        ("timestamp", "<f8"),
+        ("lengths", "<u8", (CHANNELS,)),
+        ("data", numpy.dtype(dtype), (CHANNELS, capacity))], align=True)
+
+
+# Layout helper
+def map_slots(buf, header):
+    """Return the slot array mapped after the header in the buffer."""
+    dtype = slot_dtype(int(header["capacity"]), header["dtype"][()].decode())
+    offset = -(-HEADER_DTYPE.itemsize // ALIGNMENT) * ALIGNMENT
+    return numpy.ndarray((int(header["slots"]),), dtype, buf, offset)
+
+
+# Attach helper
+def attach(name):
+    """Attach an existing shared memory without tracking it, so it is not
+    removed when the process exits (the publisher owns it).
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the memory to the tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+# Publisher class
+class FramePublisher(object):
+    """Publish parsed frames into a shared memory ring of slots.
+
+    There is a single publisher and any number of subscribers in other
+    processes (see FrameSubscriber). A frame is a dictionary of 1-D values
+    indexed by channel (e.g. from parse_waveform_string), copied into the
+    oldest slot along with its time stamp and sequence number. The
+    publisher owns the shared memory and removes it when closed.
+    """
+
+    def __init__(self, name, channels, capacity, dtype, slots=16):
+        if slots < 2:
+            raise ValueError("The ring needs at least 2 slots")
+        if len(channels) > CHANNELS:
+            raise ValueError("Too many channels")
+        self.channels = list(channels)
+        header = numpy.zeros((), HEADER_DTYPE)
+        header["slots"] = slots
+        header["capacity"] = capacity
+        header["channels"][:len(channels)] = channels
+        header["dtype"] = numpy.dtype(dtype).str.encode()
+        offset = -(-HEADER_DTYPE.itemsize // ALIGNMENT) * ALIGNMENT
+        size = offset + slots * slot_dtype(capacity, dtype).itemsize
+        self.memory = shared_memory.SharedMemory(name, True, size)
+        self.header = numpy.ndarray((), HEADER_DTYPE, self.memory.buf)
+        self.header[()] = header
+        self.slots = map_slots(self.memory.buf, self.header)
+        self.sequence = 0
+
+    @property
+    def name(self):
+        """Name of the shared memory."""
+        return self.memory.name
+
+    def publish(self, timestamp, frame):
+        """Copy a frame into the oldest slot and publish it."""
+        if any(numpy.ndim(frame[channel]) != 1 for channel in self.channels):
+            raise ValueError("The frame values must be 1-D arrays "
+                             "(e.g. no envelopes)")
+        slots = self.slots
+        index = self.sequence % len(slots)
+        # Mark the slot as being written
+        slots["sequence"][index] = 0
+        data = slots["data"][index]
+        lengths = slots["lengths"][index]
+        for channel_index, channel in enumerate(self.channels):
+            values = frame[channel]
+            if len(values) > data.shape[1]:
+                raise ValueError("The frame exceeds the slot capacity")
+            data[channel_index, :len(values)] = values
+            lengths[channel_index] = len(values)
+        slots["timestamp"][index] = timestamp
+        # Publish the slot
+        self.sequence += 1
+        slots["sequence"][index] = self.sequence
+        self.header["sequence"] = self.sequence
+
+    def close(self):
+        """Release and remove the shared memory."""
+        if self.memory is None:
+            return
+        self.header = self.slots = None
+        self.memory.close()
+        self.memory.unlink()
+        self.memory = None
+
+
+# Subscriber class
+class FrameSubscriber(object):
+    """Read the frames of a publisher in another process with zero copies.
+
+    The frames are (sequence, timestamp, frame) tuples, the frame being
+    a dictionary of read-only views indexed by channel. The slots are
+    recycled by the publisher, so a frame is only valid as long as
+    is_valid returns True for its sequence number: check it after
+    processing the views, as with a seqlock. The frames must not be
+    used after close.
+    """
+
+    def __init__(self, name):
+        self.memory = attach(name)
+        self.header = numpy.ndarray((), HEADER_DTYPE, self.memory.buf)
+        self.slots = map_slots(self.memory.buf, self.header)
+        self.slots.flags.writeable = False
+        self.channels = [int(channel) for channel in
+                         self.header["channels"] if channel]
+        self.read_sequence = 0
+        self.missed = 0
+        self.closed = False
+        self.mapped = weakref.ref(self.slots)
+        self.deferred = None
+
+    @property
+    def sequence(self):
+        """Sequence number of the latest published frame."""
+        return int(self.header["sequence"])
+
+    def is_valid(self, sequence):
+        """Return whether the frame has not been recycled yet."""
+        index = (sequence - 1) % len(self.slots)
+        return int(self.slots["sequence"][index]) == sequence
+
+    def read(self, sequence):
+        """Return the (sequence, timestamp, frame) tuple of a frame,
+        or None if it has been recycled.
+        """
+        if sequence < 1 or not self.is_valid(sequence):
+            return None
+        index = (sequence - 1) % len(self.slots)
+        data = self.slots["data"][index]
+        lengths = self.slots["lengths"][index]
+        frame = dict((channel, data[channel_index, :lengths[channel_index]])
+                     for channel_index, channel in enumerate(self.channels))
+        timestamp = float(self.slots["timestamp"][index])
+        if not self.is_valid(sequence):
+            return None
+        self.read_sequence = max(self.read_sequence, sequence)
+        return sequence, timestamp, frame
+
+    def latest(self):
+        """Return the latest frame, or None if there is none."""
+        return self.read(self.sequence)
+
+    def wait(self, timeout=None, tick=0.01):
+        """Wait for a frame newer than the last one read and return it,
+        or None on timeout.
+        """
+        backoff = Backoff(tick)
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            if self.sequence > self.read_sequence:
+                result = self.latest()
+                if result is not None:
+                    return result
+            if deadline is not None and time() > deadline:
+                return None
+            backoff.sleep()
+
+    def follow(self, tick=0.01):
+        """Yield the frames in order from the next one, waiting for
+        new frames when the latest is reached.
+
+        The frames recycled before being read are skipped and counted
+        as missed.
+        """
+        backoff = Backoff(tick)
+        while not self.closed:
+            sequence = self.read_sequence + 1
+            latest = self.sequence
+            if sequence > latest:
+                backoff.sleep()
+                continue
+            oldest = max(latest - len(self.slots) + 2, 1)
+            if sequence < oldest:
+                self.missed += oldest - sequence
+                sequence = oldest
+            result = self.read(sequence)
+            if result is None:
+                self.missed += 1
+                self.read_sequence = sequence
+                continue
+            backoff.reset()
+            yield result
+
+    def close(self):
+        """Release the shared memory and return whether it is released.
+
+        The memory is not released while frames returned by the subscriber
+        are still referenced (their views would be unmapped): it is then
+        released once they are dropped.
+        """
+        self.closed = True
+        self.header = self.slots = None
+        if self.memory is None:
+            return True
+        # The views of the frames keep the slot array alive
+        slots = self.mapped()
+        if slots is not None:
+            if not self.deferred:
+                self.deferred = weakref.finalize(slots, self.close)
+            return False
+        try:
+            self.memory.close()
+        except BufferError:
+            return False
+        self.memory = None
+        return True
@@ -0,0 +1,708 @@
+"""Provide a simulator of the RTM and RTO scopes.
+
+The simulator can be used in-process, through the factory keyword of the
+connection classes:
+
+    simulator = ScopeSimulator("RTO", record_length=10**5)
+    scope = RTOConnection("sim", factory=simulator.instrument,
+                          instrument_timeout=5000)
+
+or served over VXI-11 on the local host (see SimulatorServer).
+"""
+
+# Imports
+import struct
+import threading
+import numpy
+from time import sleep
+from timeit import default_timer as time
+from vxi11.vxi11 import Vxi11Exception
+from rohdescope.cache import scpi_path
+from rohdescope.common import pack_uint, pack_opaque, unpack_opaque
+from rohdescope.connection import DATA_FORMAT
+
+# Python 2 compatibility
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+
+# Scope simulator class
+class ScopeSimulator(object):
+    """Emulate the SCPI command set of an RTM or RTO scope.
+
+    The latency (in seconds) is added to every message, the bandwidth
+    (in bytes per second, unlimited if None) limits the readout, and the
+    trigger period (in seconds) sets the duration of an acquisition.
+    The scope clock runs with the given offset (in seconds) and relative
+    drift with respect to the host clock.
+    Unknown settings are stored and returned as they are; unknown queries
+    add an error to the queue read by SYSTem:ERRor?.
+    """
+
+    # Identifiers by model
+    identifiers = {
+        "RTM": "Rohde&Schwarz,RTM2054,1317.5000K54/100000,05.502",
+        "RTO": "Rohde&Schwarz,RTO,1316.1000K04/100000,2.45.1.1"}
+
+    # Default data formats by model
+    data_formats = {"RTM": "UINT,8", "RTO": "INT,8"}
+
+    # Trigger names by model
+    trigger_names = {"RTM": "TRIG:A", "RTO": "TRIG"}
+
+    # Channel names by model
+    channel_names = {"RTM": "CH{0}", "RTO": "CHAN{0}"}
+
+    # Acquisition count commands by model
+    count_commands = {"RTM": "ACQuire:NSINgle:COUNt",
+                      "RTO": "ACQuire:COUNt"}
+
+    # Waveform frequencies in periods per record, by channel
+    frequencies = {1: 2, 2: 3, 3: 5, 4: 7}
+
+    # Number of points of the display resolution (RTM)
+    display_points = 1000
+
+    def __init__(self, model="RTO", record_length=10000, latency=0.0,
+                 bandwidth=None, trigger_period=1e-3, channels=4,
+                 clock_offset=0.0, clock_drift=0.0):
+        self.model = model.upper()
+        self.record_length = record_length
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.trigger_period = trigger_period
+        self.channels = channels
+        self.clock_offset = clock_offset
+        self.clock_drift = clock_drift
+        self.lock = threading.RLock()
+        self.reset()
+
+    # Settings
+
+    def reset(self):
+        """Reset the settings, the status and the history."""
+        with self.lock:
+            self.settings = self.get_defaults()
+            self.blocks = {}
+            self.errors = []
+            self.esr = 0
+            self.ese = 0
+            self.sre = 0
+            self.pending = False
+            self.done = 0.0
+            self.continuous = True
+            self.history = 1
+
+    def get_defaults(self):
+        """Return the default settings, indexed by SCPI path."""
+        trigger = self.trigger_names[self.model]
+        defaults = {
+            "TIMebase:SCALe": "1E-06",
+            "TIMebase:RANGe": "1E-05",
+            "TIMebase:POSition": "0",
+            "TIMebase:HORizontal:POSition": "0",
+            "TIMebase:REFerence": "50",
+            "ACQuire:POINts": str(self.record_length),
+            "ACQuire:POINts:AUTO": "RES",
+            "ACQuire:MODE": "RTIM",
+            "ACQuire:COUNt": "1",
+            "ACQuire:NSINgle:COUNt": "1",
+            "ACQuire:SEGMented:STATe": "0",
+            "FORMat:DATA": self.data_formats[self.model],
+            "FORMat:BORDer": "LSBFirst",
+            "CHANnel:HISTory:CURRent": "0",
+            "STATus:OPERation:CONDition": "0",
+            "EXPort:WAVeform:MULTichannel": "0",
+            "EXPort:WAVeform:SCOPe": "WFM",
+            "EXPort:WAVeform:STARt": "0",
+            "EXPort:WAVeform:STOP": "0",
+            trigger + ":SOURce": self.channel_names[self.model].format(1),
+            trigger + ":EDGE:SLOPe": "POS"}
+        for channel in range(1, self.channels + 1):
+            prefix = "CHANnel{0}:".format(channel)
+            defaults.update({
+                prefix + "SCALe": "0.1",
+                prefix + "POSition": "0",
+                prefix + "OFFSet": "0",
+                prefix + "RANGe": "1",
+                prefix + "STATe": "1",
+                prefix + "COUPling": "DC",
+                prefix + "TYPE": "SAMP",
+                prefix + "WAVeform1:TYPE": "SAMP",
+                prefix + "DATA:POINts": "DMAX",
+                prefix + "ARIThmetics": "OFF",
+                prefix + "EXPortstate": "0",
+                trigger + ":LEVel{0}".format(channel): "0"})
+        return dict((scpi_path(key), value)
+                    for key, value in defaults.items())
+
+    def get_setting(self, command):
+        """Return the value of a setting given by its command."""
+        return self.settings[scpi_path(command)]
+
+    def is_on(self, command):
+        """Return whether a boolean setting is enabled."""
+        return self.get_setting(command).upper() in ("1", "ON")
+
+    # Message processing
+
+    def instrument(self, host=None, **kwargs):
+        """Return a new in-process instrument (i.e. a new link)."""
+        return SimulatedInstrument(self)
+
+    def process(self, message):
+        """Process a message and return the answer as bytes,
+        or None if the message contains no query.
+        """
+        answers = []
+        with self.lock:
+            for command in message.split(";"):
+                command = command.strip()
+                if command:
+                    answer = self.execute(command)
+                    if answer is not None:
+                        answers.append(answer)
+        if not answers:
+            return None
+        return b";".join(answers) + b"\n"
+
+    def execute(self, command):
+        """Execute a single command and return its answer, if any."""
+        header, _, argument = command.partition(" ")
+        argument = argument.strip()
+        if header.startswith("*"):
+            return self.execute_common(header.upper(), argument)
+        path = scpi_path(header)
+        query = header.endswith("?")
+        # Acquisition control (RUN and RUNS share their short form)
+        name = header.upper()
+        if name in ("RUNS", "RUNSINGLE", "SING", "SINGLE"):
+            return self.start_acquisition(single=True)
+        if name in ("RUN", "RUNCONT"):
+            return self.start_acquisition(single=False)
+        if name == "STOP":
+            self.done = time()
+            self.continuous = False
+            return None
+        # Waveform data
+        if query and len(path) == 2 and path[1] == "DAT" and \
+           path[0][:3] == "CHA":
+            return self.get_channel_block(int(path[0][3:]))
+        if query and path[1:] == ("WAV1", "DAT", "VAL"):
+            return self.get_export_block(int(path[0][3:]))
+        if query and path[-2:] == ("DAT", "HEA"):
+            return self.get_data_header(int(path[0][3:]))
+        # History (TSRelative and TSRAll share their 3 letter form)
+        if query and name.endswith(":TSRALL?"):
+            return self.get_history_timestamps(range(1 - self.history, 1))
+        if query and path[-2:] == ("HIS", "TSA"):
+            return self.get_absolute_timestamp()
+        if query and path[-2:] == ("HIS", "TSR"):
+            return self.get_history_timestamps([self.get_history_index()])
+        # Automatic measurements
+        if query and path[0][:3] == "MEA" and path[1:2] == ("RES",):
+            return self.get_measurement(int(path[0][3:] or 1))
+        # Error queue
+        if query and path == ("SYS", "ERR"):
+            if not self.errors:
+                return b'0,"No error"'
+            return self.errors.pop(0).encode()
+        # Settings
+        return self.execute_setting(path, query, argument)
+
+    def execute_common(self, name, argument):
+        """Execute a common command (*XXX)."""
+        if name == "*IDN?":
+            return self.identifiers[self.model].encode()
+        if name == "*RST":
+            self.reset()
+        elif name == "*CLS":
+            self.esr = 0
+            self.errors = []
+        elif name == "*OPC":
+            self.pending = True
+        elif name == "*OPC?":
+            sleep(max(self.done - time(), 0))
+            return b"1"
+        elif name == "*ESR?":
+            esr, self.esr = self.get_event_status(), 0
+            return str(esr).encode()
+        elif name == "*ESE":
+            self.ese = int(argument)
+        elif name == "*SRE":
+            self.sre = int(argument)
+        elif name.endswith("?"):
+            self.add_error(-113, "Undefined header;" + name)
+            return b"0"
+        return None
+
+    def execute_setting(self, path, query, argument):
+        """Store or return a setting."""
+        if not path:
+            self.add_error(-102, "Syntax error")
+            return None
+        if not query:
+            # Boolean values are returned as 0 or 1
+            value = {"ON": "1", "OFF": "0"}.get(argument.upper(), argument)
+            self.settings[path] = value
+            return None
+        value = self.settings.get(path)
+        if value is None:
+            self.add_error(-113, "Undefined header;" + ":".join(path))
+            return b"0"
+        return value.encode()
+
+    def add_error(self, code, message):
+        """Add an error to the error queue."""
+        self.errors.append('{0},"{1}"'.format(code, message))
+
+    # Status
+
+    def start_acquisition(self, single=True):
+        """Start an acquisition completing after the trigger periods."""
+        count = int(self.get_setting(self.count_commands[self.model]))
+        self.history = count if single else 1
+        self.continuous = not single
+        self.done = time() + self.trigger_period * self.history
+        self.settings[scpi_path("CHANnel:HISTory:CURRent")] = "0"
+
+    def get_event_status(self):
+        """Return the event status register, updating the operation
+        complete bit.
+        """
+        if self.pending and time() >= self.done:
+            self.esr |= 1
+            self.pending = False
+        return self.esr
+
+    def read_stb(self):
+        """Return the status byte."""
+        with self.lock:
+            status = 0
+            if self.get_event_status() & self.ese:
+                status |= 2**5
+            if status & self.sre:
+                status |= 2**6
+            return status
+
+    # History
+
+    def get_history_index(self):
+        """Return the current history index (0 for the latest)."""
+        return int(self.get_setting("CHANnel:HISTory:CURRent"))
+
+    def get_history_timestamps(self, indexes):
+        """Return the relative time stamps of the given history indexes."""
+        return ",".join(str(index * self.trigger_period)
+                        for index in indexes).encode()
+
+    def get_absolute_timestamp(self):
+        """Return the time of day of the latest trigger on the scope clock.
+
+        The scope keeps triggering periodically in continuous mode.
+        """
+        now = time()
+        period = self.trigger_period
+        if self.continuous and now > self.done + period:
+            trigger = now - (now - self.done) % period
+        else:
+            trigger = self.done - period
+        clock = (trigger * (1 + self.clock_drift) + self.clock_offset) % 86400
+        hours, rest = divmod(clock, 3600)
+        minutes, seconds = divmod(rest, 60)
+        return "{0:02d}:{1:02d}:{2:09.6f}".format(
+            int(hours), int(minutes), seconds).encode()
+
+    # Waveform data
+
+    @property
+    def data_dtype(self):
+        """Numpy type corresponding to the data format and byte order."""
+        data_format = self.get_setting("FORMat:DATA")
+        kind, bits = DATA_FORMAT.match(data_format).groups()
+        kind = {"INT": "i", "UINT": "u", "REAL": "f"}[kind.upper()]
+        border = self.get_setting("FORMat:BORDer").upper()
+        order = ">" if border.startswith("MSBF") else "<"
+        return numpy.dtype(order + kind + str(int(bits) // 8))
+
+    def get_layout(self, channel):
+        """Return the exported part of the record of a channel as
+        (start index, stop index, step, values per sample).
+
+        The RTM exports the display resolution if the data points are set
+        to DEFault, the RTO exports a time range for the MANual export
+        scope, and the peak detection gives 2 values per sample.
+        """
+        length = int(self.get_setting("ACQuire:POINts"))
+        start, stop, step = 0, length, 1
+        prefix = "CHANnel{0}:".format(channel)
+        if self.model == "RTM":
+            points = self.get_setting(prefix + "DATA:POINts").upper()
+            if points.startswith("DEF"):
+                step = max(length // self.display_points, 1)
+            kind = self.get_setting(prefix + "TYPE")
+        else:
+            scope = self.get_setting("EXPort:WAVeform:SCOPe").upper()
+            if scope.startswith("MAN"):
+                origin, interval = self.get_time_axis()
+                start, stop = [
+                    int(round((float(self.get_setting(command)) - origin) /
+                              interval))
+                    for command in ("EXPort:WAVeform:STARt",
+                                    "EXPort:WAVeform:STOP")]
+                start, stop = min(max(start, 0), length), min(stop, length)
+            kind = self.get_setting(prefix + "WAVeform1:TYPE")
+        values = 2 if kind.upper().startswith("PDET") else 1
+        return start, max(stop, start), step, values
+
+    def get_time_axis(self):
+        """Return the time of the first point and the sample interval."""
+        length = int(self.get_setting("ACQuire:POINts"))
+        time_range = float(self.get_setting("TIMebase:RANGe"))
+        command = "TIMebase:POSition"
+        if self.model == "RTO":
+            command = "TIMebase:HORizontal:POSition"
+        position = float(self.get_setting(command))
+        return position - time_range / 2, time_range / length
+
+    def get_data_header(self, channel):
+        """Return the data header of a channel (start time, stop time,
+        number of samples and values per sample).
+        """
+        start, stop, step, values = self.get_layout(channel)
+        origin, interval = self.get_time_axis()
+        samples = (stop - start) // step
+        header = (origin + start * interval,
+                  origin + (start + samples * step) * interval,
+                  samples, values)
+        return "{0},{1},{2},{3}".format(*header).encode()
+
+    def get_waveform(self, channel, segments=1):
+        """Return the raw values of a channel for the given segments."""
+        dtype = self.data_dtype
+        length = int(self.get_setting("ACQuire:POINts"))
+        phase = numpy.arange(length) % length
+        frequency = self.frequencies.get(channel, 1)
+        divisions = 3 * numpy.sin(2 * numpy.pi * frequency * phase / length)
+        divisions += numpy.random.normal(0, 0.05, len(divisions))
+        # Reduce the record
+        start, stop, step, values = self.get_layout(channel)
+        samples = (stop - start) // step
+        groups = divisions[start:start+samples*step].reshape(samples, step)
+        if values == 2:
+            divisions = numpy.column_stack(
+                (groups.min(axis=1), groups.max(axis=1))).ravel()
+        else:
+            divisions = groups[:, 0]
+        divisions = numpy.tile(divisions, segments)
+        # Floating point values are in volts
+        if dtype.kind == "f":
+            prefix = "CHANnel{0}:".format(channel)
+            scale = float(self.get_setting(prefix + "SCALe"))
+            position = float(self.get_setting(prefix + "POSition"))
+            return ((divisions - position) * scale).astype(dtype)
+        info = numpy.iinfo(dtype)
+        raw = divisions * (info.max - info.min) / 10.0
+        raw += (info.max + info.min) * 0.5
+        return numpy.clip(raw, info.min, info.max).astype(dtype)
+
+    def get_measurement(self, index):
+        """Return the result of an automatic measurement, computed on the
+        waveform of its source (invalid if not supported).
+        """
+        prefix = "MEASurement{0}:".format(index)
+        source = self.settings.get(scpi_path(prefix + "SOURce"), "")
+        kind = self.settings.get(scpi_path(prefix + "MAIN"), "")[:4].upper()
+        digits = "".join(char for char in source if char.isdigit())
+        if not digits:
+            return b"9.91E+37"
+        channel = int(digits[0])
+        # Compute the waveform in volts
+        prefix = "CHANnel{0}:".format(channel)
+        scale = float(self.get_setting(prefix + "SCALe"))
+        position = float(self.get_setting(prefix + "POSition"))
+        raw = self.get_waveform(channel).astype(numpy.double)
+        if self.data_dtype.kind != "f":
+            info = numpy.iinfo(self.data_dtype)
+            divisions = (raw - (info.max + info.min) * 0.5) * 10.0 / (
+                info.max - info.min)
+            raw = (divisions - position) * scale
+        time_range = float(self.get_setting("TIMebase:RANGe"))
+        frequency = self.frequencies.get(channel, 1) / time_range
+        results = {
+            "PEAK": raw.max() - raw.min(),
+            "PDEL": raw.max() - raw.min(),
+            "AMPL": raw.max() - raw.min(),
+            "UPEA": raw.max(),
+            "MAXI": raw.max(),
+            "HIGH": raw.max(),
+            "LPEA": raw.min(),
+            "MINI": raw.min(),
+            "LOW": raw.min(),
+            "MEAN": raw.mean(),
+            "RMS": numpy.sqrt(numpy.mean(raw ** 2)),
+            "AREA": raw.sum() * time_range / len(raw),
+            "FREQ": frequency,
+            "PERI": 1 / frequency,
+            "RTIM": numpy.arcsin(0.8) / numpy.pi / frequency,
+            "FTIM": numpy.arcsin(0.8) / numpy.pi / frequency}
+        value = results.get(kind)
+        if value is None:
+            return b"9.91E+37"
+        return "{0:.6E}".format(value).encode()
+
+    def make_block(self, channels, segments=1):
+        """Return a definite length block with the interleaved samples
+        of the given channels.
+
+        The blocks are cached per data settings.
+        """
+        settings = [self.get_setting(command) for command in (
+            "FORMat:DATA", "FORMat:BORDer", "ACQuire:POINts",
+            "TIMebase:RANGe")] + list(self.get_time_axis())
+        for channel in channels:
+            prefix = "CHANnel{0}:".format(channel)
+            settings.append(self.get_setting(prefix + "SCALe"))
+            settings.append(self.get_setting(prefix + "POSition"))
+            settings.append(self.get_layout(channel))
+        key = tuple(channels), segments, tuple(settings)
+        block = self.blocks.get(key)
+        if block is None:
+            waveforms = [self.get_waveform(channel, segments)
+                         for channel in channels]
+            counts = [self.get_layout(channel)[3] for channel in channels]
+            frame = sum(counts)
+            data = numpy.empty(sum(len(waveform) for waveform in waveforms),
+                               waveforms[0].dtype)
+            offset = 0
+            for waveform, values in zip(waveforms, counts):
+                for value in range(values):
+                    data[offset::frame] = waveform[value::values]
+                    offset += 1
+            payload = data.tobytes()
+            size = str(len(payload))
+            header = "#{0}{1}".format(len(size), size).encode()
+            block = self.blocks[key] = header + payload
+        return block
+
+    def get_channel_block(self, channel):
+        """Return the block of a single channel (RTM)."""
+        return self.make_block([channel])
+
+    def get_export_block(self, channel):
+        """Return the exported block (RTO), containing all the channels
+        with an export state if the multichannel export is enabled,
+        and all the history segments if the history replay is enabled.
+        """
+        channels = []
+        if self.is_on("EXPort:WAVeform:MULTichannel"):
+            channels = [index for index in range(1, self.channels + 1)
+                        if self.is_on("CHANnel{0}:EXPortstate".format(index))
+                        and self.is_on("CHANnel{0}:STATe".format(index))]
+        channels = channels or [channel]
+        segments = 1
+        replay = scpi_path("CHANnel{0}:HISTory:REPLay".format(channel))
+        if self.settings.get(replay, "0").upper() in ("1", "ON"):
+            segments = self.history
+        return self.make_block(channels, segments)
+
+
+# Simulated instrument class
+class SimulatedInstrument(object):
+    """In-process replacement of a vxi11 instrument (i.e. a link)
+    bound to a scope simulator.
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.output = b""
+        self.position = 0
+
+    def delay(self, size=0):
+        """Sleep for the latency and the transfer of the given size."""
+        duration = self.simulator.latency
+        if self.simulator.bandwidth:
+            duration += float(size) / self.simulator.bandwidth
+        if duration > 0:
+            sleep(duration)
+
+    def write_raw(self, data):
+        """Send a message to the simulator."""
+        self.delay(len(data))
+        answer = self.simulator.process(bytes(data).decode())
+        self.output, self.position = answer or b"", 0
+
+    def read_raw(self, num=-1):
+        """Read the answer, or the given number of bytes of the answer."""
+        remaining = len(self.output) - self.position
+        if not remaining:
+            raise Vxi11Exception(15, "read")
+        size = remaining if num < 0 else min(num, remaining)
+        data = self.output
+        if size != len(data):
+            data = data[self.position:self.position+size]
+        self.position += size
+        self.delay(size)
+        return data
+
+    def write(self, message, encoding="utf-8"):
+        """Write a string message."""
+        self.write_raw(message.encode(encoding))
+
+    def read(self, num=-1, encoding="utf-8"):
+        """Read a string answer."""
+        return self.read_raw(num).decode(encoding).rstrip("\r\n")
+
+    def ask(self, message, num=-1, encoding="utf-8"):
+        """Write a message and read the answer."""
+        self.write(message, encoding)
+        return self.read(num, encoding)
+
+    def read_stb(self):
+        """Return the status byte."""
+        self.delay()
+        return self.simulator.read_stb()
+
+    def close(self):
+        """Close the link."""
+        self.output, self.position = b"", 0
+
+
+# VXI-11 request handler
+class VXI11Handler(socketserver.BaseRequestHandler):
+    """Serve the ONC RPC calls of a VXI-11 client.
+
+    Only the portmapper GETPORT call and the core procedures used by
+    the vxi11 package are supported.
+    """
+
+    # Program numbers
+    portmapper_program = 100000
+
+    # Maximum size of a device write
+    max_recv_size = 2**20
+
+    def receive(self, size):
+        """Receive the given number of bytes."""
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def receive_record(self):
+        """Receive an RPC record made of fragments."""
+        record, last = b"", False
+        while not last:
+            mark, = struct.unpack(">I", self.receive(4))
+            last = mark & 0x80000000
+            record += self.receive(mark & 0x7fffffff)
+        return record
+
+    def handle(self):
+        """Process the calls until the client disconnects."""
+        links = {}
+        try:
+            while True:
+                record = self.receive_record()
+                xid, _, _, program, _, procedure = struct.unpack_from(
+                    ">6I", record)
+                # Skip the credentials and the verifier
+                _, offset = unpack_opaque(record, 28)
+                _, offset = unpack_opaque(record, offset + 4)
+                result = self.call(links, program, procedure, record[offset:])
+                reply = pack_uint(xid, 1, 0, 0, 0, 0) + result
+                self.request.sendall(pack_uint(0x80000000 | len(reply)))
+                self.request.sendall(reply)
+        except EOFError:
+            pass
+
+    def call(self, links, program, procedure, args):
+        """Run a procedure and return its packed result."""
+        server = self.server
+        if program == self.portmapper_program:
+            return pack_uint(server.core_port)
+        # Create link
+        if procedure == 10:
+            link = len(links) + 1
+            links[link] = [server.simulator.instrument(), b""]
+            return pack_uint(0, link, 0, self.max_recv_size)
+        link, = struct.unpack_from(">I", args)
+        # Device write
+        if procedure == 11:
+            flags, = struct.unpack_from(">I", args, 12)
+            data, _ = unpack_opaque(args, 16)
+            links[link][1] += data
+            if flags & 8:
+                links[link][0].write_raw(links[link][1])
+                links[link][1] = b""
+            return pack_uint(0, len(data))
+        # Device read
+        if procedure == 12:
+            instrument = links[link][0]
+            size, = struct.unpack_from(">I", args, 4)
+            try:
+                data = instrument.read_raw(size)
+            except Vxi11Exception:
+                return pack_uint(15, 0) + pack_opaque(b"")
+            end = instrument.position == len(instrument.output)
+            return pack_uint(0, 4 if end else 0) + pack_opaque(data)
+        # Read status byte
+        if procedure == 13:
+            return pack_uint(0, links[link][0].read_stb())
+        # Destroy link
+        if procedure == 23:
+            links.pop(link, None)
+        return pack_uint(0)
+
+
+# Threading TCP server class
+class ThreadingServer(socketserver.ThreadingTCPServer):
+    """Threading TCP server sharing a scope simulator."""
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 256
+
+
+# Simulator server class
+class SimulatorServer(object):
+    """Serve a scope simulator over VXI-11.
+
+    The vxi11 package locates the core channel through the portmapper,
+    which has to listen on port 111 (this usually requires root
+    privileges, and no other portmapper running on the host).
+    """
+
+    def __init__(self, simulator, host="127.0.0.1", port=0,
+                 portmapper_port=111):
+        self.simulator = simulator
+        self.servers = []
+        for address in ((host, port), (host, portmapper_port)):
+            server = ThreadingServer(address, VXI11Handler)
+            server.simulator = simulator
+            self.servers.append(server)
+        # The portmapper answers with the core port
+        for server in self.servers:
+            server.core_port = self.port
+
+    @property
+    def port(self):
+        """Port of the core channel."""
+        return self.servers[0].server_address[1]
+
+    def start(self):
+        """Serve in background threads."""
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Stop serving and close the sockets."""
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,140 @@
+"""Provide lazy waveform objects and shared time axes."""
+
+# Imports
+import threading
+import numpy
+from collections import OrderedDict
+
+
+# Lazy property
+class lazy_property(object):
+    """Property computed on first access and memoized in the instance."""
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = self.func(instance)
+        instance.__dict__[self.__name__] = value
+        return value
+
+
+# Time axis cache
+class TimeAxisCache(object):
+    """Least recently used cache of read-only time axes,
+    shared by the waveforms with the same time mapping.
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.axes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, start, stop, length):
+        """Return the time of each sample between start and stop."""
+        key = start, stop, length
+        with self.lock:
+            axis = self.axes.pop(key, None)
+            if axis is None:
+                axis = numpy.linspace(start, stop, length, endpoint=False)
+                axis.flags.writeable = False
+            self.axes[key] = axis
+            while len(self.axes) > self.size:
+                self.axes.popitem(last=False)
+        return axis
+
+    def clear(self):
+        """Remove all the time axes."""
+        with self.lock:
+            self.axes.clear()
+
+
+# Default time axis cache
+time_axes = TimeAxisCache()
+
+
+# Waveform class
+class Waveform(object):
+    """Raw values of a channel along with the settings they were taken
+    with.
+
+    The values in volts, the time axis and the statistics are computed
+    on first access and memoized. The minimum, maximum and mean are
+    computed on the raw values and converted, so they do not need the
+    values in volts. The raw values may be a view on a reusable buffer:
+    the derived quantities have to be accessed before it is recycled.
+    """
+
+    def __init__(self, connection, channel, raw, scale, position,
+                 start, stop, timestamp=None):
+        self.connection = connection
+        self.channel = channel
+        self.raw = raw
+        self.scale = scale
+        self.position = position
+        self.start = start
+        self.stop = stop
+        self.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __repr__(self):
+        return "Waveform(channel={0}, length={1}, start={2}, stop={3})".format(
+            self.channel, len(self), self.start, self.stop)
+
+    # Conversion
+
+    def convert(self, raw):
+        """Convert raw values (array or scalar) to volts."""
+        if self.raw.dtype.kind == "f":
+            return raw
+        median, factor, offset = self.connection.get_conversion(
+            self.raw.dtype, self.scale, self.position)
+        return (raw - median) * factor - offset
+
+    @lazy_property
+    def volts(self):
+        """Values in volts."""
+        result = self.connection.convert_waveforms(
+            {self.channel: self.raw}, {self.channel: self.scale},
+            {self.channel: self.position})
+        return result[self.channel]
+
+    @lazy_property
+    def times(self):
+        """Time of each sample in seconds (shared and read-only)."""
+        return time_axes.get(self.start, self.stop, len(self.raw))
+
+    @property
+    def interval(self):
+        """Time between two samples in seconds."""
+        return (self.stop - self.start) / len(self.raw)
+
+    # Statistics
+
+    @lazy_property
+    def minimum(self):
+        """Minimal value in volts."""
+        return float(self.convert(self.raw.min()))
+
+    @lazy_property
+    def maximum(self):
+        """Maximal value in volts."""
+        return float(self.convert(self.raw.max()))
+
+    @lazy_property
+    def mean(self):
+        """Mean value in volts."""
+        return float(self.convert(self.raw.mean(dtype=numpy.double)))
+
+    @lazy_property
+    def rms(self):
+        """Root mean square value in volts."""
+        volts = self.volts
+        return float(numpy.sqrt(numpy.dot(volts.ravel(), volts.ravel()) /
+                                volts.size))
@@ -0,0 +1,37 @@
+"""Shared fixtures running the connections against the scope simulator."""
+
+# Imports
+import pytest
+from rohdescope import RTMConnection, RTOConnection
+from rohdescope.simulator import ScopeSimulator
+
+# Connection classes by model
+CLASSES = {"RTM": RTMConnection, "RTO": RTOConnection}
+
+
+def make_connection(simulator, **kwargs):
+    """Return a connected scope bound to the simulator."""
+    cls = CLASSES[simulator.model]
+    kwargs.setdefault("instrument_timeout", 5000)
+    kwargs.setdefault("factory", lambda host, **_: simulator.instrument())
+    scope = cls("sim", **kwargs)
+    scope.connect()
+    # Update the export states
+    for channel in range(1, simulator.channels + 1):
+        scope.get_channel_enabled(channel)
+    return scope
+
+
+@pytest.fixture(params=["RTM", "RTO"])
+def simulator(request):
+    """Scope simulator of each model."""
+    return ScopeSimulator(request.param, record_length=4000,
+                          trigger_period=1e-4, channels=2)
+
+
+@pytest.fixture
+def scope(simulator):
+    """Connection to the simulator."""
+    scope = make_connection(simulator)
+    yield scope
+    scope.disconnect()
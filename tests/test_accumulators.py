@@ -0,0 +1,80 @@
+"""Tests of the streaming accumulators."""
+
+# Imports
+import numpy
+import pytest
+from rohdescope.accumulators import MeanAccumulator, VarianceAccumulator
+from rohdescope.accumulators import EnvelopeAccumulator
+from rohdescope.accumulators import ExponentialAccumulator
+
+
+def make_frames(scope, count, length=100):
+    random = numpy.random.RandomState(0)
+    dtype = scope.data_dtype
+    info = numpy.iinfo(dtype)
+    return [dict((channel, random.randint(info.min, info.max, length)
+                  .astype(dtype)) for channel in (1, 2))
+            for _ in range(count)]
+
+
+def test_fold_frames(scope):
+    frames = make_frames(scope, 5)
+    accumulators = [MeanAccumulator(), VarianceAccumulator(),
+                    EnvelopeAccumulator(), ExponentialAccumulator(0.5)]
+    for frame in frames:
+        for accumulator in accumulators:
+            accumulator.add(frame)
+    volts = [scope.convert_waveforms(frame) for frame in frames]
+    for channel in (1, 2):
+        stack = numpy.array([values[channel] for values in volts])
+        mean, deviation, envelope, average = (
+            accumulator.result(scope)[channel] for accumulator in accumulators)
+        assert numpy.allclose(mean, stack.mean(axis=0))
+        assert numpy.allclose(deviation, stack.std(axis=0, ddof=1))
+        assert numpy.allclose(envelope[0], stack.min(axis=0))
+        assert numpy.allclose(envelope[1], stack.max(axis=0))
+        expected = stack[0]
+        for values in stack[1:]:
+            expected = expected + 0.5 * (values - expected)
+        assert numpy.allclose(average, expected)
+
+
+def test_frame_length_change(scope):
+    accumulator = MeanAccumulator()
+    accumulator.add(make_frames(scope, 1)[0])
+    with pytest.raises(ValueError):
+        accumulator.add(make_frames(scope, 1, 50)[0])
+
+
+def test_accumulate_waveforms(simulator, scope):
+    mean, envelope = MeanAccumulator(), EnvelopeAccumulator()
+    result = scope.accumulate_waveforms([1, 2], 3, [mean, envelope])
+    assert result == [mean, envelope]
+    assert mean.count == envelope.count == 3
+    for channel in (1, 2):
+        values = mean.result(scope)[channel]
+        low, high = envelope.result(scope)[channel]
+        assert len(values) == simulator.record_length
+        assert numpy.all(low <= values + 1e-9)
+        assert numpy.all(values <= high + 1e-9)
+
+
+def test_fold_envelope_frames(simulator, scope):
+    if simulator.model != "RTO":
+        pytest.skip("RTO only")
+    mean, deviation = MeanAccumulator(), VarianceAccumulator()
+    frames = []
+    for _ in range(3):
+        _, values, _ = scope.acquire_reduced(
+            [1, 2], points=500, envelope=True, keep=True)
+        frame = dict((channel, numpy.ascontiguousarray(data))
+                     for channel, data in values.items())
+        frames.append(frame)
+        mean.add(frame)
+        deviation.add(frame)
+    scope.clear_reduction()
+    stack = numpy.array([frame[1] for frame in frames])
+    assert stack.shape[1:] == (500, 2)
+    assert numpy.allclose(mean.result(scope)[1], stack.mean(axis=0))
+    assert numpy.allclose(deviation.result(scope)[1],
+                          stack.std(axis=0, ddof=1))
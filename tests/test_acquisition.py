@@ -0,0 +1,62 @@
+"""Tests of the frame buffer and the background acquisition engine."""
+
+# Imports
+import time
+import pytest
+from rohdescope.acquisition import FrameBuffer
+
+
+def wait_for(predicate, timeout=10.):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_frame_buffer():
+    with pytest.raises(ValueError):
+        FrameBuffer(1)
+    buf = FrameBuffer(4)
+    assert buf.latest() is None
+    assert buf.recycle() is None
+    for index in range(6):
+        buf.push(float(index), [index])
+    assert buf.latest() == (6, 5., [5])
+    assert [slot[0] for slot in buf.last(10)] == [4, 5, 6]
+    assert buf.recycle() == [2]
+    assert not buf.is_valid(3)
+    assert buf.is_valid(4)
+
+
+def test_frame_buffer_dropped():
+    buf = FrameBuffer(3)
+    for index in range(3):
+        buf.push(float(index), [index])
+    assert buf.dropped == 0
+    buf.push(3., [3])
+    assert buf.dropped == 1
+    buf.latest()
+    buf.push(4., [4])
+    assert buf.dropped == 1
+
+
+def test_acquisition_engine(scope):
+    engine = scope.start_acquisition([1, 2], size=4)
+    try:
+        assert engine.running
+        wait_for(lambda: engine.count >= 6)
+        engine.pause()
+        assert engine.paused
+        sequence, stamp, frame = engine.latest()
+        assert engine.buffer.is_valid(sequence)
+        data = scope.parse_waveform_string([1, 2], frame)
+        assert sorted(data) == [1, 2]
+        assert len(data[1]) == scope.get_record_length()
+        assert engine.errors == 0
+        engine.resume()
+        count = engine.count
+        wait_for(lambda: engine.count > count)
+    finally:
+        scope.stop_acquisition()
+    assert not engine.running
+    assert engine.rate > 0
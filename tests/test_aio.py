@@ -0,0 +1,122 @@
+"""Tests of the asyncio connection."""
+
+# Imports
+import asyncio
+import pytest
+from rohdescope.aio import AsyncRTMConnection, AsyncRTOConnection
+
+# Asyncio connection classes by model
+CLASSES = {"RTM": AsyncRTMConnection, "RTO": AsyncRTOConnection}
+
+
+class AsyncSimulatedInstrument(object):
+    """Coroutine interface of a simulated instrument."""
+
+    def __init__(self, simulator):
+        self.instrument = simulator.instrument()
+        self.messages = []
+
+    async def write(self, message):
+        self.messages.append(message)
+        self.instrument.write(message)
+
+    async def ask(self, message):
+        self.messages.append(message)
+        return self.instrument.ask(message)
+
+    async def read_raw(self, num=-1):
+        return self.instrument.read_raw(num)
+
+    async def close(self):
+        self.instrument.close()
+
+
+def run(simulator, coroutine_function):
+    """Connect an asyncio connection to the simulator and run
+    the coroutine function with it.
+    """
+    async def main():
+        scope = CLASSES[simulator.model]("sim", instrument_timeout=5000)
+        scope.scope = AsyncSimulatedInstrument(simulator)
+        await scope.connect()
+        # Update the export states
+        for channel in range(1, simulator.channels + 1):
+            await scope.get_channel_enabled(channel)
+        return await coroutine_function(scope)
+    return asyncio.run(main())
+
+
+def test_mirrored_accessors(simulator):
+    async def main(scope):
+        await scope.set_channel_scale(1, 0.5)
+        return await scope.get_channel_scale(1)
+    assert run(simulator, main) == 0.5
+
+
+def test_block_accessors_are_not_mirrored(simulator):
+    async def main(scope):
+        with pytest.raises(AttributeError):
+            scope.get_segments
+        return True
+    assert run(simulator, main)
+
+
+def test_replay_runs_once_per_query(simulator):
+    passes = []
+
+    async def main(scope):
+        base = scope.replay_class
+
+        class Counting(base):
+            def __init__(self, *args):
+                passes.append(self)
+                base.__init__(self, *args)
+
+        scope.replay_class = Counting
+        scope.scope.messages[:] = []
+        await scope.configure()
+        return list(scope.scope.messages)
+
+    messages = run(simulator, main)
+    queries = [message for message in messages if message.endswith("?")]
+    assert len(passes) == len(queries) + 1
+    assert len(messages) == len(queries) + len(passes[-1].writes)
+
+
+def test_data_format_reaches_the_model(simulator):
+    async def main(scope):
+        await scope.set_data_format("INT,16")
+        data = await scope.get_waveform_data([1, 2])
+        return scope.model.data_format, data
+    data_format, data = run(simulator, main)
+    assert data_format == "INT,16"
+    assert data[1].dtype.itemsize == 2
+    assert len(data[1]) == simulator.record_length
+
+
+def test_measurements_reach_the_model(simulator):
+    async def main(scope):
+        await scope.set_measurements([(1, "mean")])
+        return await scope.get_measurement_results()
+    results = run(simulator, main)
+    assert list(results) == [(1, "mean")]
+
+
+def test_reduction_reaches_the_model(simulator):
+    points = 500 if simulator.model == "RTO" else "DEF"
+
+    async def main(scope):
+        await scope.set_reduction([1, 2], points)
+        reduction = scope.model.reduction
+        saved = list(scope.model.saved_reduction)
+        reduced = await scope.get_waveform_data([1, 2])
+        await scope.clear_reduction()
+        full = await scope.get_waveform_data([1, 2])
+        return reduction, saved, reduced, full, scope.model
+
+    reduction, saved, reduced, full, model = run(simulator, main)
+    assert reduction == ((1, 2), points, None, None, None)
+    assert len(saved) == len(set(saved))
+    assert len(reduced[1]) < simulator.record_length
+    assert len(full[1]) == simulator.record_length
+    assert model.reduction is None and not model.saved_reduction
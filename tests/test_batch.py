@@ -0,0 +1,59 @@
+"""Tests of the batched writes."""
+
+# Imports
+import pytest
+from rohdescope.common import CommandError
+
+
+@pytest.fixture
+def messages(simulator, monkeypatch):
+    """Messages received by the simulator."""
+    messages = []
+    process = simulator.process
+
+    def record(message):
+        messages.append(message)
+        return process(message)
+
+    monkeypatch.setattr(simulator, "process", record)
+    return messages
+
+
+def test_writes_are_coalesced(simulator, scope, messages):
+    with scope.batch():
+        scope.set_channel_scale(1, 0.5)
+        scope.set_channel_scale(2, 0.25)
+        assert not messages
+    assert len(messages) == 1
+    assert scope.get_channel_scale(2) == 0.25
+
+
+def test_queries_flush_the_writes(scope, messages):
+    with scope.batch():
+        scope.set_channel_scale(1, 0.5)
+        assert scope.get_channel_scale(1) == 0.5
+        assert len(messages) == 2
+    assert len(messages) == 2
+
+
+def test_nested_batches(simulator, scope, messages):
+    simulator.add_error(-100, "Command error")
+    with pytest.raises(CommandError):
+        with scope.batch():
+            with scope.batch(check=True):
+                scope.set_channel_scale(1, 0.5)
+            assert not messages
+            scope.set_channel_scale(2, 0.25)
+    assert len(messages) > 1
+    assert "CHAN2" in messages[0].upper()
+
+
+def test_exception_drops_the_writes(scope, messages):
+    with pytest.raises(ValueError):
+        with scope.batch():
+            scope.set_channel_scale(1, 0.5)
+            raise ValueError
+    assert not messages
+    with scope.batch():
+        pass
+    assert not messages
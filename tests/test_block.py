@@ -0,0 +1,44 @@
+"""Tests of the chunked block readout."""
+
+# Imports
+import numpy
+from conftest import make_connection
+
+
+def test_streamed_readout(simulator):
+    scope = make_connection(simulator, chunk_size=1000)
+    try:
+        expected = scope.get_waveform_data([1, 2])
+        received = []
+        out = scope.empty_buffer([1, 2])
+        string = scope.get_waveform_string(
+            [1, 2], out, lambda block, size: received.append((block, size)))
+        data = scope.parse_waveform_string([1, 2], string)
+    finally:
+        scope.disconnect()
+    blocks = string if isinstance(string, list) else [string]
+    assert len(received) > 2 * len(blocks)
+    assert all(size <= block.size for block, size in received)
+    assert sum(size == block.size for block, size in received) == len(blocks)
+    for channel in (1, 2):
+        assert numpy.array_equal(data[channel], expected[channel])
+
+
+def test_reused_buffer(scope):
+    out = numpy.zeros(2 * 10**5, numpy.uint8)
+    with scope.lock:
+        scope.scope.write(scope.waveform_query.format(1))
+        block = scope.read_block(out)
+    assert numpy.shares_memory(block, out)
+    assert bytes(block[:1]) == b"#"
+
+
+def test_memory_mapped_readout(scope, tmp_path):
+    path = str(tmp_path / "block.bin")
+    with scope.lock:
+        scope.scope.write(scope.waveform_query.format(1))
+        block = scope.read_block(path)
+    assert isinstance(block, numpy.memmap)
+    block.flush()
+    with open(path, "rb") as stream:
+        assert stream.read() == bytes(block)
@@ -0,0 +1,66 @@
+"""Tests of the settings cache and the settings snapshot."""
+
+# Imports
+from rohdescope.cache import SettingsCache, scpi_path
+from conftest import make_connection
+
+
+def count(scope, family):
+    """Return the number of commands of a family sent to the scope."""
+    commands = scope.metrics.snapshot()["commands"]
+    return commands.get(family, {}).get("count", 0)
+
+
+def test_scpi_path_short_and_long_forms():
+    assert scpi_path("CHANnel1:SCALe?") == scpi_path(":CHAN1:SCAL 0.5")
+    assert scpi_path("*RST") == ()
+
+
+def test_write_invalidates_node_and_coupled_nodes():
+    cache = SettingsCache()
+    for query in ("CHAN1:SCAL?", "CHAN2:SCAL?", "TIM:RANG?",
+                  "ACQ:POIN?", "TRIG:SOUR?"):
+        cache.store(query, "1")
+    cache.invalidate("CHAN1:SCAL 2")
+    assert cache.get("CHAN1:SCAL?") is None
+    assert cache.get("CHAN2:SCAL?") == "1"
+    cache.invalidate("TIM:RANG 1E-3")
+    assert cache.get("ACQ:POIN?") is None
+    assert cache.get("TRIG:SOUR?") == "1"
+    cache.invalidate("*RST")
+    assert not cache.entries
+
+
+def test_volatile_and_compound_queries_are_not_cached():
+    cache = SettingsCache()
+    assert not cache.cacheable("CHAN1:DATA?")
+    assert not cache.cacheable("CHAN1:SCAL?;CHAN2:SCAL?")
+    assert not cache.cacheable("*ESR?")
+
+
+def test_connection_cache(simulator):
+    scope = make_connection(simulator, cache=True)
+    first = scope.get_channel_scale(1)
+    assert scope.get_channel_scale(1) == first
+    assert count(scope, "CHA:SCA") == 1
+    scope.set_channel_scale(1, 0.5)
+    assert scope.get_channel_scale(1) == 0.5
+    assert count(scope, "CHA:SCA") == 3
+
+
+def test_settings_snapshot_matches_accessors(scope):
+    channels = [1, 2]
+    snapshot = scope.get_settings_snapshot(channels)
+    assert snapshot.time_range == scope.get_time_range()
+    assert snapshot.record_length == scope.get_record_length()
+    assert snapshot.scales == scope.get_channel_scales(channels)
+    assert snapshot.round_trips_saved == snapshot.queries - 1
+
+
+def test_cache_ttl_without_cache(simulator):
+    scope = make_connection(simulator, cache_ttl=1.0)
+    try:
+        assert scope.cache is None
+        assert "cache_ttl" not in scope.kwargs
+    finally:
+        scope.disconnect()
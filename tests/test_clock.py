@@ -0,0 +1,72 @@
+"""Tests of the clock correlation."""
+
+# Imports
+import math
+import pytest
+from rohdescope.clock import ClockCorrelator, parse_scope_time
+from rohdescope.simulator import ScopeSimulator
+from conftest import make_connection
+
+# Simulated scope clock
+OFFSET, DRIFT = 50000.0, 2e-4
+
+
+def true_time(stamp):
+    return (stamp.scope_time - OFFSET) / (1 + DRIFT)
+
+
+@pytest.fixture
+def clocked(simulator):
+    simulator = ScopeSimulator(
+        simulator.model, record_length=1000, trigger_period=1e-3,
+        channels=2, clock_offset=OFFSET, clock_drift=DRIFT)
+    connection = make_connection(simulator, hardware_timestamps=True)
+    yield connection
+    connection.disconnect()
+
+
+def test_parse_scope_time():
+    assert parse_scope_time('"12:34:56.789012"') == pytest.approx(45296.789012)
+    assert parse_scope_time("3.5") == 3.5
+
+
+def test_intervals():
+    correlator = ClockCorrelator(spacing=0.0)
+    for index in range(20):
+        host = 1000.0 + index
+        lower, upper = host - 0.01 * (index % 3 + 1), host + 0.002
+        stamp = correlator.correct(host * (1 + DRIFT) + OFFSET, lower, upper)
+        assert lower <= stamp <= upper
+        assert abs(stamp - host) <= stamp.uncertainty + 1e-9
+    assert correlator.drift == pytest.approx(-DRIFT / (1 + DRIFT), abs=1e-3)
+
+
+def test_upper_bound_only():
+    correlator = ClockCorrelator()
+    stamp = correlator.correct(OFFSET + 10.0, None, 12.0)
+    assert float(stamp) == 12.0
+    assert math.isinf(stamp.uncertainty)
+    assert not correlator.samples
+
+
+def test_single_acquisitions(clocked):
+    for _ in range(20):
+        stamp, _ = clocked.stamp_acquisition([1, 2], single=True)
+        assert abs(stamp - true_time(stamp)) <= stamp.uncertainty + 1e-6
+
+
+def test_continuous_acquisitions(clocked):
+    clocked.issue_run()
+    stamp, _ = clocked.stamp_acquisition([1, 2], single=False)
+    assert math.isinf(stamp.uncertainty)
+    # Bound the drift with spaced single acquisitions
+    clocked.correlator.spacing = 0.0
+    for _ in range(10):
+        clocked.stamp_acquisition([1, 2], single=True)
+    samples = list(clocked.correlator.samples)
+    clocked.issue_run()
+    for _ in range(10):
+        stamp, _ = clocked.stamp_acquisition([1, 2], single=False)
+        assert 0 < stamp.uncertainty < 0.1
+        assert abs(stamp - true_time(stamp)) <= stamp.uncertainty + 1e-6
+    assert list(clocked.correlator.samples) == samples
@@ -0,0 +1,68 @@
+"""Tests of the RTM compound readout."""
+
+# Imports
+import numpy
+import pytest
+from rohdescope.common import split_blocks
+from rohdescope.simulator import ScopeSimulator
+from conftest import make_connection
+
+
+@pytest.fixture
+def rtm():
+    """Connection to an RTM simulator with 4 channels."""
+    simulator = ScopeSimulator("RTM", record_length=4000,
+                               trigger_period=1e-4, channels=4)
+    messages = []
+    process = simulator.process
+
+    def record(message):
+        messages.append(message)
+        return process(message)
+
+    simulator.process = record
+    scope = make_connection(simulator)
+    scope.messages = messages
+    yield scope
+    scope.disconnect()
+
+
+def read(scope, channels, **kwargs):
+    del scope.messages[:]
+    data = scope.get_waveform_data(channels, **kwargs)
+    return data, [message for message in scope.messages
+                  if "DATA?" in message.upper()]
+
+
+def test_single_query(rtm):
+    assert rtm.compound_readout
+    data, queries = read(rtm, [1, 2, 3, 4])
+    assert len(queries) == 1
+    assert sorted(data) == [1, 2, 3, 4]
+    rtm.firmware_version = (4, 0)
+    assert not rtm.compound_readout
+    expected, queries = read(rtm, [1, 2, 3, 4])
+    assert len(queries) == 4
+    for channel in (1, 2, 3, 4):
+        assert len(data[channel]) == len(expected[channel]) == 4000
+
+
+def test_streamed_compound_readout(rtm):
+    expected, _ = read(rtm, [1, 3])
+    out = [numpy.empty(10**4, numpy.uint8) for _ in range(2)]
+    del rtm.messages[:]
+    strings = rtm.get_waveform_string([1, 3], out)
+    assert len(rtm.messages) == 1
+    data = rtm.parse_waveform_string([1, 3], strings)
+    for channel in (1, 3):
+        assert len(data[channel]) == len(expected[channel])
+    assert all(numpy.shares_memory(string, buf)
+               for string, buf in zip(strings, out))
+
+
+def test_split_blocks():
+    answer = b"#13abc;#210" + b"x" * 10 + b";12.5\n"
+    parts = split_blocks(answer)
+    assert bytes(parts[0]) == b"#13abc"
+    assert bytes(parts[1]) == b"#210" + b"x" * 10
+    assert parts[2] == "12.5"
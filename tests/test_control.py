@@ -0,0 +1,86 @@
+"""Tests of the acquisition rate controller."""
+
+# Imports
+import pytest
+from conftest import make_connection
+
+
+def count_calls(monkeypatch, scope, name):
+    calls = []
+    method = getattr(scope, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return method(*args, **kwargs)
+
+    monkeypatch.setattr(scope, name, wrapper)
+    return calls
+
+
+def run(scope, count):
+    for _ in range(count):
+        scope.stamp_acquisition([1, 2], single=True)
+
+
+def test_tick_and_wait_mode(scope):
+    controller = scope.enable_rate_control(period=0.0)
+    run(scope, 5)
+    state = controller.get_state()
+    assert state["trigger_rate"] > 0
+    assert controller.min_tick <= scope.tick <= controller.max_tick
+    assert state["points"] is None
+    scope.disable_rate_control()
+    assert scope.controller is None
+    assert scope.tick == scope.default_tick
+
+
+def test_initial_tick_is_restored(simulator):
+    scope = make_connection(simulator, tick=0.005)
+    try:
+        scope.enable_rate_control(period=0.0)
+        run(scope, 5)
+        assert scope.tick != 0.005
+        scope.disable_rate_control()
+        assert scope.tick == 0.005
+    finally:
+        scope.disconnect()
+
+
+def test_enable_replaces_the_controller(simulator, scope):
+    if simulator.model != "RTO":
+        pytest.skip("RTO only")
+    scope.enable_rate_control(
+        channels=[1, 2], target_rate=1e5, period=0.0, min_points=500)
+    run(scope, 5)
+    assert len(scope.get_waveform_data([1, 2])[1]) == 500
+    controller = scope.enable_rate_control(period=0.0)
+    assert scope.controller is controller
+    assert len(scope.get_waveform_data([1, 2])[1]) == \
+        simulator.record_length
+
+
+def test_record_length_is_read_once(simulator, scope, monkeypatch):
+    if simulator.model != "RTO":
+        pytest.skip("RTO only")
+    calls = count_calls(monkeypatch, scope, "get_record_length")
+    controller = scope.enable_rate_control(
+        channels=[1, 2], target_rate=1e5, period=0.0, min_points=500)
+    run(scope, 10)
+    assert len(calls) == 1
+    assert controller.points == 500
+    assert len(scope.get_waveform_data([1, 2])[1]) == 500
+    scope.disable_rate_control()
+    assert len(scope.get_waveform_data([1, 2])[1]) == \
+        simulator.record_length
+    assert not scope.saved_reduction
+
+
+def test_rtm_points_are_not_controlled(simulator, scope, monkeypatch):
+    if simulator.model != "RTM":
+        pytest.skip("RTM only")
+    calls = count_calls(monkeypatch, scope, "set_reduction")
+    controller = scope.enable_rate_control(
+        channels=[1, 2], target_rate=1e5, period=0.0)
+    run(scope, 5)
+    assert controller.points is None
+    assert not calls
@@ -0,0 +1,63 @@
+"""Tests of the lookup table conversion."""
+
+# Imports
+import numpy
+import pytest
+from rohdescope.benchmark import legacy_convert
+
+# Raw types
+DTYPES = ["int8", "uint8", "<i2", ">i2"]
+
+
+def make_data(dtype, length=5000):
+    dtype = numpy.dtype(dtype)
+    info = numpy.iinfo(dtype)
+    data = numpy.arange(length) % (info.max - info.min + 1) + info.min
+    return {1: data.astype(dtype), 2: data[::-1].astype(dtype)}
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+@pytest.mark.parametrize("volts", [False, True])
+def test_matches_legacy_conversion(scope, dtype, volts):
+    data = make_data(dtype, 2**16 + 10)
+    scales = {1: 0.5, 2: 2.} if volts else None
+    positions = {1: -1., 2: 3.} if volts else None
+    result = scope.convert_waveforms(data, scales, positions)
+    expected = legacy_convert(data, scales, positions)
+    for channel in (1, 2):
+        assert result[channel].dtype == numpy.double
+        numpy.testing.assert_allclose(result[channel], expected[channel])
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_lookup_table(scope, dtype):
+    table = scope.get_lookup_table(1, dtype, 0.5, 1.)
+    assert len(table) == 2 ** (8 * numpy.dtype(dtype).itemsize)
+    assert scope.get_lookup_table(1, dtype, 0.5, 1.) is table
+    assert scope.get_lookup_table(1, dtype, 0.25, 1.) is not table
+    raw = make_data(dtype)[1]
+    unsigned = raw.view(raw.dtype.byteorder + "u" + str(raw.itemsize))
+    expected = legacy_convert({1: raw}, {1: 0.5}, {1: 1.})[1]
+    numpy.testing.assert_allclose(table[unsigned], expected)
+
+
+def test_reused_output(scope):
+    data = make_data("int8")
+    out = {1: numpy.zeros(6000), 2: numpy.zeros(6000)}
+    result = scope.convert_waveforms(data, out=out)
+    for channel in (1, 2):
+        assert len(result[channel]) == 5000
+        assert numpy.shares_memory(result[channel], out[channel])
+        numpy.testing.assert_allclose(
+            result[channel], legacy_convert(data)[channel])
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_single_precision(scope, dtype):
+    data = make_data(dtype)
+    result = scope.convert_waveforms(data, dtype=numpy.float32)
+    expected = legacy_convert(data)
+    for channel in (1, 2):
+        assert result[channel].dtype == numpy.float32
+        numpy.testing.assert_allclose(
+            result[channel], expected[channel], rtol=1e-6, atol=1e-6)
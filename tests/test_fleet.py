@@ -0,0 +1,59 @@
+"""Tests of the scope fleet."""
+
+# Imports
+import pytest
+from rohdescope.fleet import ScopeFleet
+from rohdescope.simulator import ScopeSimulator
+from conftest import make_connection
+
+
+@pytest.fixture
+def fleet():
+    """Fleet of an RTM and an RTO simulator."""
+    connections = {}
+    for model in ("RTM", "RTO"):
+        simulator = ScopeSimulator(model, record_length=4000,
+                                   trigger_period=1e-4, channels=2)
+        connections[model.lower()] = make_connection(simulator)
+    fleet = ScopeFleet(connections)
+    yield fleet
+    fleet.disconnect()
+    fleet.close()
+
+
+def test_acquire(fleet):
+    results, errors = fleet.acquire([1, 2])
+    assert not errors
+    assert sorted(results) == ["rtm", "rto"]
+    stamps = [stamp for stamp, string in results.values()]
+    assert stamps == sorted(stamps)
+    for name, (stamp, string) in results.items():
+        connection = fleet.connections[name]
+        data = connection.parse_waveform_string([1, 2], string)
+        assert len(data[2]) == connection.get_record_length()
+
+
+def test_acquire_channels_per_scope(fleet):
+    results, errors = fleet.acquire({"rto": [2]})
+    assert not errors
+    assert list(results) == ["rto"]
+
+
+def test_failed_scope_is_skipped(fleet, monkeypatch):
+    def fail(*args, **kwargs):
+        raise IOError("Link lost")
+
+    monkeypatch.setattr(fleet.connections["rtm"], "stamp_acquisition", fail)
+    results, errors = fleet.acquire([1])
+    assert list(results) == ["rto"]
+    assert isinstance(errors["rtm"], IOError)
+    assert fleet.failed == ["rtm"]
+    assert fleet.available == ["rto"]
+    results, errors = fleet.acquire([1])
+    assert list(results) == ["rto"] and not errors
+    monkeypatch.undo()
+    results, errors = fleet.reconnect()
+    assert list(results) == ["rtm"] and not errors
+    assert fleet.failed == []
+    results, errors = fleet.acquire([1])
+    assert sorted(results) == ["rtm", "rto"]
@@ -0,0 +1,67 @@
+"""Tests of the RTM readout over several links."""
+
+# Imports
+import numpy
+from rohdescope.simulator import ScopeSimulator
+from conftest import make_connection
+
+
+def make_scope(simulator, links, instruments):
+    """Return an RTM connection recording the messages of each link."""
+    def factory(host, **kwargs):
+        instrument = simulator.instrument()
+        messages = []
+        write_raw = instrument.write_raw
+
+        def record(data):
+            messages.append(bytes(data).decode())
+            return write_raw(data)
+
+        instrument.write_raw = record
+        instruments.append(messages)
+        return instrument
+
+    return make_connection(simulator, links=links, factory=factory)
+
+
+def test_parallel_readout():
+    simulator = ScopeSimulator("RTM", record_length=4000,
+                               trigger_period=1e-4, channels=4)
+    instruments = []
+    scope = make_scope(simulator, 1, [])
+    try:
+        expected = scope.get_waveform_data([1, 2, 3, 4])
+    finally:
+        scope.disconnect()
+    scope = make_scope(simulator, 3, instruments)
+    try:
+        assert len(instruments) == 3
+        for messages in instruments:
+            del messages[:]
+        data = scope.get_waveform_data([1, 2, 3, 4])
+    finally:
+        scope.disconnect()
+    for channel in (1, 2, 3, 4):
+        assert numpy.array_equal(data[channel], expected[channel])
+    # The channels are distributed over the links
+    for index, channels in enumerate([(1, 4), (2,), (3,)]):
+        queries = [message for message in instruments[index]
+                   if "DATA?" in message.upper()]
+        assert queries
+        for channel in channels:
+            assert any("CHAN{0}".format(channel) in query
+                       for query in queries)
+
+
+def test_relink():
+    simulator = ScopeSimulator("RTM", record_length=4000,
+                               trigger_period=1e-4, channels=2)
+    instruments = []
+    scope = make_scope(simulator, 2, instruments)
+    try:
+        scope.relink()
+        assert len(instruments) > 2
+        data = scope.get_waveform_data([1, 2])
+    finally:
+        scope.disconnect()
+    assert len(data[1]) == len(data[2]) == 4000
@@ -0,0 +1,52 @@
+"""Tests of the automatic measurements."""
+
+# Imports
+import math
+import pytest
+
+
+def test_acquire_measurements(simulator, scope):
+    measurements = [(1, "frequency"), (2, "peak_to_peak"), (1, "mean")]
+    stamp, results = scope.acquire_measurements(measurements)
+    assert sorted(results) == sorted(measurements)
+    time_range = scope.get_time_range()
+    frequency = simulator.frequencies[1] / time_range
+    assert results[1, "frequency"] == pytest.approx(frequency, rel=1e-5)
+    values = scope.get_waveforms(
+        [2], scope.get_channel_scales([2]), scope.get_channel_positions([2]))
+    peak_to_peak = values[2].max() - values[2].min()
+    assert results[2, "peak_to_peak"] == pytest.approx(peak_to_peak, rel=0.1)
+    assert abs(results[1, "mean"]) < 0.1 * peak_to_peak
+
+
+def test_configuration_is_sent_once(simulator, scope, monkeypatch):
+    messages = []
+    process = simulator.process
+
+    def record(message):
+        messages.append(message)
+        return process(message)
+
+    monkeypatch.setattr(simulator, "process", record)
+    scope.set_measurements([(1, "rms")])
+    count = len(messages)
+    assert any("MEASurement1:SOURce" in message for message in messages)
+    scope.set_measurements([(1, "rms")])
+    assert len(messages) == count
+    stamp, results = scope.acquire_measurements(single=False)
+    assert list(results) == [(1, "rms")]
+    assert len(messages) == count + 1
+
+
+def test_invalid_results(scope):
+    scope.set_measurements([(1, "frequency"), (2, "rms")])
+    scope.write("MEASurement2:MAIN UNKNown")
+    results = scope.get_measurement_results()
+    assert not math.isnan(results[1, "frequency"])
+    assert math.isnan(results[2, "rms"])
+
+
+def test_too_many_measurements(scope):
+    with pytest.raises(ValueError):
+        scope.set_measurements([(1, "mean")] * (scope.measurement_count + 1))
+    assert scope.get_measurement_results() == {}
@@ -0,0 +1,73 @@
+"""Tests of the command and stage metrics."""
+
+# Imports
+import json
+import pytest
+from vxi11.vxi11 import Vxi11Exception
+from rohdescope.metrics import Metrics, command_family
+from conftest import make_connection
+
+
+@pytest.mark.parametrize("command, family", [
+    ("CHANnel2:DATA?", "CHA:DAT"),
+    ("CHAN1:SCAL 0.5", "CHA:SCA"),
+    ("*ESR?", "*ESR"),
+    ("RUNS;*OPC?", "RUN+")])
+def test_command_family(command, family):
+    assert command_family(command) == family
+
+
+def test_record_transfers():
+    metrics = Metrics()
+    metrics.record("CHAN1:SCAL?", 0.1, 0.2, 12, 4)
+    metrics.record("CHAN2:SCAL?", 0., 0.3, 12, 4,
+                   Vxi11Exception(15, "read"))
+    metrics.record_stage("wait", 0.5)
+    metrics.record_stage("wait", 0.25)
+    snapshot = metrics.snapshot()
+    counters = snapshot["commands"]["CHA:SCA"]
+    assert counters["count"] == 2
+    assert counters["lock_wait"] == pytest.approx(0.1)
+    assert counters["wire_time"] == pytest.approx(0.5)
+    assert counters["bytes_received"] == 8
+    assert counters["errors"] == counters["timeouts"] == 1
+    stage = snapshot["stages"]["wait"]
+    assert stage["count"] == 2
+    assert stage["maximum"] == 0.5
+    assert stage["last"] == 0.25
+    assert json.loads(metrics.to_json())["commands"] == snapshot["commands"]
+
+
+def test_disabled_metrics():
+    metrics = Metrics(False)
+    metrics.record("*IDN?", 0., 0.1)
+    metrics.record_stage("wait", 0.1)
+    assert metrics.snapshot()["commands"] == {}
+    assert metrics.snapshot()["stages"] == {}
+
+
+def test_prometheus_export():
+    metrics = Metrics()
+    metrics.record("CHAN1:DATA?", 0., 0.2, 12, 1000)
+    metrics.record_stage("readout", 0.2)
+    text = metrics.to_prometheus(labels={"host": "scope1"})
+    lines = text.splitlines()
+    assert "# TYPE rohdescope_command_total counter" in lines
+    assert "# TYPE rohdescope_stage_max_seconds gauge" in lines
+    assert ('rohdescope_command_received_bytes_total'
+            '{host="scope1",family="CHA:DAT"} 1000') in lines
+    assert 'rohdescope_stage_total{host="scope1",stage="readout"} 1' in lines
+
+
+def test_connection_metrics(simulator):
+    scope = make_connection(simulator)
+    try:
+        scope.metrics.reset()
+        data = scope.get_waveform_data([1, 2])
+        scope.convert_waveforms(data)
+        snapshot = scope.get_metrics()
+    finally:
+        scope.disconnect()
+    assert sum(counters["bytes_received"] for counters in
+               snapshot["commands"].values()) >= 2 * len(data[1])
+    assert {"parse", "convert"} <= set(snapshot["stages"])
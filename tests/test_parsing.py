@@ -0,0 +1,86 @@
+"""Tests of the waveform block parsing."""
+
+# Imports
+import numpy
+import pytest
+from rohdescope import RTOConnection
+
+
+def make_block(data):
+    """Return a definite length block holding the raw data."""
+    payload = data.tobytes()
+    size = str(len(payload))
+    return "#{0}{1}".format(len(size), size).encode() + payload
+
+
+def test_parse_returns_writable_copies():
+    scope = RTOConnection("sim")
+    data = numpy.arange(12, dtype=numpy.int8)
+    result = scope.parse_waveform_string([1, 2], make_block(data))
+    assert result[1].tolist() == data[0::2].tolist()
+    assert result[2].tolist() == data[1::2].tolist()
+    result[1] += 1
+    assert result[1].flags.writeable
+
+
+def test_parse_views_on_request():
+    scope = RTOConnection("sim")
+    block = make_block(numpy.arange(12, dtype=numpy.int8))
+    result = scope.parse_waveform_string([1, 2], block, copy=False)
+    assert not result[1].flags.writeable
+    assert not result[1].flags.owndata
+
+
+def test_parse_into_out_arrays():
+    scope = RTOConnection("sim")
+    block = make_block(numpy.arange(12, dtype=numpy.int8))
+    out = {1: numpy.zeros(6, numpy.int8), 2: numpy.zeros(6, numpy.int8)}
+    result = scope.parse_waveform_string([1, 2], block, out)
+    assert result[1].base is out[1] or result[1] is out[1]
+    assert out[2].tolist() == list(range(1, 12, 2))
+
+
+def test_waveform_data_is_writable(simulator, scope):
+    data = scope.get_waveform_data([1, 2])
+    data[1][:] = 0
+    assert len(data[1]) == simulator.record_length
+
+
+@pytest.mark.parametrize("byte_order", ["LSBFirst", "MSBFirst"])
+@pytest.mark.parametrize("data_format, kind", [
+    ("INT,16", "i2"), ("UINT,16", "u2"), ("REAL,32", "f4")])
+def test_parse_wide_formats(data_format, kind, byte_order):
+    scope = RTOConnection("sim")
+    scope.data_format = data_format
+    scope.byte_order = byte_order
+    order = ">" if byte_order == "MSBFirst" else "<"
+    dtype = numpy.dtype(order + kind)
+    assert scope.data_dtype == dtype
+    data = (numpy.arange(12) * 1001).astype(dtype)
+    result = scope.parse_waveform_string([1, 2, 3], make_block(data))
+    for index, channel in enumerate([1, 2, 3]):
+        assert result[channel].tolist() == data[index::3].tolist()
+
+
+@pytest.mark.parametrize("data_format", ["INT,16", "UINT,16"])
+def test_wide_format_round_trip(simulator, scope, data_format):
+    expected = scope.convert_waveforms(scope.get_waveform_data([1, 2]))
+    scope.byte_order = "MSBFirst"
+    scope.set_data_format(data_format)
+    assert simulator.get_setting("FORMat:BORDer") == "MSBFirst"
+    data = scope.get_waveform_data([1, 2])
+    result = scope.convert_waveforms(data)
+    for channel in (1, 2):
+        assert data[channel].dtype == scope.data_dtype
+        assert len(result[channel]) == len(expected[channel])
+        # Same waveform, up to the simulated noise
+        error = result[channel] - expected[channel]
+        assert numpy.abs(error).mean() < 0.2
+
+
+def test_real_values_pass_through(simulator, scope):
+    scope.set_data_format("REAL,32")
+    data = scope.get_waveform_data([1])
+    assert data[1].dtype.kind == "f"
+    result = scope.convert_waveforms(data, {1: 0.5}, {1: 1.})
+    assert numpy.array_equal(result[1], data[1])
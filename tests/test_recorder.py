@@ -0,0 +1,64 @@
+"""Tests of the capture recorder and reader."""
+
+# Imports
+import threading
+import numpy
+import pytest
+from rohdescope.recorder import CaptureRecorder, CaptureReader
+
+
+def test_record_and_read(scope, tmp_path):
+    filename = str(tmp_path / "capture.npy")
+    settings = scope.get_settings_snapshot([1, 2])
+    recorder = CaptureRecorder(filename, 4, 2 * 10**4)
+    stamps, frames = [], []
+    for _ in range(3):
+        stamp, frame = scope.stamp_acquisition([1, 2])
+        recorder.append(stamp, frame, settings)
+        stamps.append(stamp)
+        frames.append(frame)
+    recorder.flush()
+    reader = CaptureReader(filename)
+    assert len(reader) == 3
+    for index in range(3):
+        stamp, frame = reader.read(index)
+        assert stamp == stamps[index]
+        expected = scope.parse_waveform_string([1, 2], frames[index])
+        data = scope.parse_waveform_string([1, 2], frame)
+        for channel in (1, 2):
+            assert numpy.array_equal(data[channel], expected[channel])
+    result = reader.get_settings(0)
+    assert result["record_length"] == settings.record_length
+    assert result["scales"] == dict(
+        (channel, value.scale) for channel, value in settings.channels.items())
+    with pytest.raises(IndexError):
+        reader.read(3)
+    recorder.close()
+
+
+def test_full_capture(tmp_path):
+    recorder = CaptureRecorder(str(tmp_path / "capture.npy"), 1, 16)
+    recorder.append(1., b"0123")
+    with pytest.raises(IndexError):
+        recorder.append(2., b"4567")
+    with pytest.raises(ValueError):
+        CaptureRecorder(str(tmp_path / "other.npy"), 1, 2).append(1., b"abc")
+
+
+def test_follow_running_capture(tmp_path):
+    filename = str(tmp_path / "capture.npy")
+    recorder = CaptureRecorder(filename, 5, 16)
+    recorder.append(0., b"frame0")
+    reader = CaptureReader(filename)
+    assert reader.get_settings(0)["record_length"] == -1
+
+    def record():
+        for index in range(1, 5):
+            recorder.append(float(index), "frame{0}".format(index).encode())
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    frames = [(stamp, bytes(frame)) for stamp, frame in reader.follow()]
+    thread.join()
+    assert frames == [(float(index), "frame{0}".format(index).encode())
+                      for index in range(5)]
@@ -0,0 +1,49 @@
+"""Tests of the scope-side data reduction."""
+
+# Imports
+import pytest
+from rohdescope.simulator import ScopeSimulator
+from conftest import make_connection
+
+
+def test_rtm_points_are_validated(simulator, scope):
+    if simulator.model != "RTM":
+        pytest.skip("RTM only")
+    with pytest.raises(ValueError):
+        scope.set_reduction([1], 500)
+    _, values, headers = scope.acquire_reduced([1], points="DEF")
+    assert headers[1].length == simulator.display_points
+    assert len(values[1]) == simulator.display_points
+
+
+def test_reduced_read_restores_the_settings(simulator, scope):
+    kwargs = {"points": "DEF"}
+    if simulator.model == "RTO":
+        kwargs = {"points": 500, "start": -2e-6, "stop": 2e-6}
+    _, values, headers = scope.acquire_reduced([1, 2], **kwargs)
+    assert len(values[1]) < simulator.record_length
+    assert scope.get_record_length() == simulator.record_length
+    assert len(scope.get_waveform_data([1, 2])[1]) == simulator.record_length
+    assert not scope.saved_reduction
+
+
+def test_kept_reduction_is_cleared(simulator, scope):
+    if simulator.model != "RTO":
+        pytest.skip("RTO only")
+    scope.acquire_reduced([1], points=500, keep=True)
+    assert scope.get_record_length() == 500
+    scope.acquire_reduced([1], points=200, keep=True)
+    scope.set_reduction([1])
+    assert scope.get_record_length() == simulator.record_length
+    assert simulator.get_setting("EXPort:WAVeform:SCOPe") == "WFM"
+
+
+def test_mixed_envelope_and_samples():
+    simulator = ScopeSimulator("RTO", record_length=1000, channels=2)
+    scope = make_connection(simulator)
+    scope.write("CHAN1:WAV1:TYPE PDET")
+    _, values, headers = scope.acquire_reduced([1, 2])
+    assert headers[1].values_per_sample == 2
+    assert values[1].shape == (1000, 2)
+    assert values[2].shape == (1000,)
+    assert (values[1][:, 0] <= values[1][:, 1]).all()
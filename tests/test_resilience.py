@@ -0,0 +1,120 @@
+"""Tests of the link resilience."""
+
+# Imports
+import socket
+import threading
+import pytest
+from vxi11.vxi11 import Vxi11Exception
+from vxi11.vxi11 import ERR_INVALID_LINK_IDENTIFIER
+from vxi11.vxi11 import ERR_CHANNEL_NOT_ESTABLISHED
+from vxi11.vxi11 import ERR_CHANNEL_ALREADY_ESTABLISHED
+from rohdescope.resilience import CircuitOpenError, is_idempotent
+from rohdescope.resilience import is_link_error
+from conftest import make_connection
+
+
+class FlakyInstrument(object):
+    """Simulated instrument raising the queued errors on the next reads."""
+
+    def __init__(self, simulator, errors):
+        self.instrument = simulator.instrument()
+        self.errors = errors
+
+    def read_raw(self, num=-1):
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.instrument.read_raw(num)
+
+    def ask(self, message):
+        self.instrument.write(message)
+        return self.read_raw().decode().rstrip("\n")
+
+    def __getattr__(self, name):
+        return getattr(self.instrument, name)
+
+
+def make_flaky(simulator, **kwargs):
+    """Return a connection to the simulator over flaky instruments,
+    along with the error queue and the list of instruments.
+    """
+    errors, instruments = [], []
+
+    def factory(host, **_):
+        instruments.append(FlakyInstrument(simulator, errors))
+        return instruments[-1]
+
+    scope = make_connection(simulator, factory=factory, **kwargs)
+    return scope, errors, instruments
+
+
+def test_error_classification():
+    assert is_link_error(socket.error("reset"))
+    assert is_link_error(EOFError())
+    assert is_link_error(Vxi11Exception(ERR_INVALID_LINK_IDENTIFIER, "read"))
+    assert is_link_error(Vxi11Exception(ERR_CHANNEL_NOT_ESTABLISHED, "read"))
+    assert not is_link_error(
+        Vxi11Exception(ERR_CHANNEL_ALREADY_ESTABLISHED, "read"))
+    assert not is_link_error(Vxi11Exception(15, "read"))
+    assert not is_link_error(CircuitOpenError())
+    assert is_idempotent("CHAN1:SCAL?;CHAN2:SCAL?")
+    assert not is_idempotent("*ESR?")
+    assert not is_idempotent("RUNS")
+
+
+def test_readout_relinks_after_link_error(simulator):
+    scope, errors, instruments = make_flaky(simulator)
+    count = len(instruments)
+    errors.append(socket.error("reset"))
+    with pytest.raises(socket.error):
+        scope.get_waveform_string([1, 2])
+    assert scope.broken
+    scope.get_waveform_string([1, 2])
+    assert len(instruments) > count
+    assert not scope.broken
+
+
+def test_readout_retries(simulator):
+    scope, errors, instruments = make_flaky(simulator, retries=1)
+    errors.append(socket.error("reset"))
+    data = scope.get_waveform_data([1, 2])
+    assert len(data[1]) == simulator.record_length
+
+
+def test_device_error_keeps_the_link(simulator):
+    scope, errors, instruments = make_flaky(simulator, breaker=1)
+    count = len(instruments)
+    errors.append(Vxi11Exception(15, "read"))
+    with pytest.raises(Vxi11Exception):
+        scope.ask("*OPC?")
+    assert not scope.broken
+    assert scope.breaker.state == scope.breaker.CLOSED
+    scope.get_time_scale()
+    assert len(instruments) == count
+
+
+def test_failed_relink_stays_broken(simulator):
+    scope, errors, instruments = make_flaky(
+        simulator, breaker=1, breaker_timeout=60)
+    errors.append(socket.error("reset"))
+    with pytest.raises(socket.error):
+        scope.ask("*IDN?")
+    with pytest.raises(CircuitOpenError):
+        scope.relink()
+    assert scope.broken
+
+
+def test_relink_waits_for_transfers(simulator, scope):
+    done = threading.Event()
+
+    def relink():
+        scope.relink()
+        done.set()
+
+    with scope.lock:
+        thread = threading.Thread(target=relink)
+        thread.start()
+        assert not done.wait(0.05)
+        assert scope.scope is not None
+    thread.join()
+    assert done.is_set()
+    assert scope.get_time_scale()
@@ -0,0 +1,40 @@
+"""Tests of the segmented acquisition."""
+
+# Imports
+import pytest
+from rohdescope.cache import scpi_path
+
+
+def test_acquire_segments(simulator, scope):
+    timestamps, data = scope.acquire_segments([1, 2], 4)
+    assert len(timestamps) == 4
+    assert data[1].shape == (4, simulator.record_length)
+    volts = scope.convert_segments(data)
+    assert volts[1].shape == (4, simulator.record_length)
+
+
+def test_history_replay_is_turned_off(simulator, scope):
+    scope.acquire_segments([1, 2], 3)
+    replay = scpi_path("CHANnel1:HISTory:REPLay")
+    assert simulator.settings.get(replay, "OFF").upper() in ("0", "OFF")
+    assert len(scope.get_waveform_data([1, 2])[1]) == simulator.record_length
+
+
+def test_rtm_segments_without_compound_readout(simulator, scope,
+                                               monkeypatch):
+    if simulator.model != "RTM":
+        pytest.skip("RTM only")
+    expected, _ = scope.acquire_segments([1, 2], 3)
+    scope.firmware_version = (4, 0)
+    messages = []
+    process = simulator.process
+
+    def record(message):
+        messages.append(message)
+        return process(message)
+
+    monkeypatch.setattr(simulator, "process", record)
+    timestamps, data = scope.acquire_segments([1, 2], 3)
+    assert list(timestamps) == list(expected)
+    assert data[2].shape == (3, simulator.record_length)
+    assert all(message.count("?") <= 1 for message in messages)
@@ -0,0 +1,75 @@
+"""Tests of the shared memory frames."""
+
+# Imports
+import numpy
+import pytest
+
+shared = pytest.importorskip("rohdescope.shared")
+
+
+@pytest.fixture
+def publisher():
+    publisher = shared.FramePublisher(None, [1, 2], 100, "int8", slots=4)
+    yield publisher
+    publisher.close()
+
+
+def publish(publisher, value):
+    frame = dict((channel, numpy.full(50, value, "int8"))
+                 for channel in publisher.channels)
+    publisher.publish(float(value), frame)
+
+
+def test_read_frames(publisher):
+    subscriber = shared.FrameSubscriber(publisher.name)
+    publish(publisher, 1)
+    sequence, timestamp, frame = subscriber.wait(timeout=1)
+    assert (sequence, timestamp) == (1, 1.0)
+    assert sorted(frame) == [1, 2]
+    assert frame[1].tolist() == [1] * 50
+    del frame
+    assert subscriber.close()
+
+
+def test_recycled_frames(publisher):
+    subscriber = shared.FrameSubscriber(publisher.name)
+    for value in range(1, 7):
+        publish(publisher, value)
+    assert subscriber.read(1) is None
+    assert not subscriber.is_valid(2)
+    assert subscriber.latest()[0] == 6
+    assert subscriber.close()
+
+
+def test_close_with_referenced_frames(publisher):
+    subscriber = shared.FrameSubscriber(publisher.name)
+    publish(publisher, 1)
+    frame = subscriber.latest()[2]
+    assert not subscriber.close()
+    assert subscriber.memory is not None
+    del frame
+    assert subscriber.close()
+    assert subscriber.memory is None
+    assert subscriber.close()
+
+
+def test_deferred_close(publisher):
+    subscriber = shared.FrameSubscriber(publisher.name)
+    publish(publisher, 1)
+    values = subscriber.latest()[2][2][10:20]
+    assert not subscriber.close()
+    assert values.tolist() == [1] * 10
+    del values
+    assert subscriber.memory is None
+
+
+def test_envelope_frames_are_rejected(publisher):
+    subscriber = shared.FrameSubscriber(publisher.name)
+    publish(publisher, 1)
+    frame = dict((channel, numpy.zeros((50, 2), "int8"))
+                 for channel in publisher.channels)
+    with pytest.raises(ValueError, match="1-D"):
+        publisher.publish(2.0, frame)
+    assert publisher.sequence == 1
+    assert subscriber.is_valid(1)
+    assert subscriber.close()
@@ -0,0 +1,54 @@
+"""Tests of the service request wait."""
+
+# Imports
+import time
+import pytest
+from vxi11.vxi11 import Vxi11Exception
+from conftest import make_connection
+
+
+@pytest.fixture
+def messages(simulator, monkeypatch):
+    """Messages received by the simulator, with the status byte reads."""
+    messages = []
+    process = simulator.process
+    read_stb = simulator.read_stb
+
+    def record(message):
+        messages.append(message)
+        return process(message)
+
+    def record_stb():
+        messages.append("STB")
+        return read_stb()
+
+    monkeypatch.setattr(simulator, "process", record)
+    monkeypatch.setattr(simulator, "read_stb", record_stb)
+    return messages
+
+
+def test_service_request_wait(simulator, messages):
+    simulator.trigger_period = 0.01
+    scope = make_connection(simulator, srq=True)
+    try:
+        del messages[:]
+        start = time.time()
+        scope.run_single(busy=True)
+        elapsed = time.time() - start
+    finally:
+        scope.disconnect()
+    assert elapsed >= 0.01
+    assert "STB" in messages
+    assert any("*SRE" in message for message in messages)
+    assert sum("*ESR?" in message for message in messages) == 1
+    assert not simulator.pending
+
+
+def test_service_request_timeout(simulator, messages):
+    simulator.trigger_period = 10.
+    scope = make_connection(simulator, srq=True, instrument_timeout=100)
+    try:
+        with pytest.raises(Vxi11Exception):
+            scope.run_single(busy=True)
+    finally:
+        scope.disconnect()
@@ -0,0 +1,52 @@
+"""Tests of the lazy waveform objects."""
+
+# Imports
+import numpy
+import pytest
+from rohdescope.waveform import TimeAxisCache, Waveform
+
+
+def test_time_axis_cache():
+    cache = TimeAxisCache(size=2)
+    axis = cache.get(0., 1., 10)
+    assert cache.get(0., 1., 10) is axis
+    assert not axis.flags.writeable
+    assert axis[1] == pytest.approx(0.1)
+    cache.get(0., 2., 10)
+    cache.get(0., 3., 10)
+    assert cache.get(0., 1., 10) is not axis
+
+
+def test_lazy_values(scope):
+    raw = numpy.array([-128, -64, 0, 64, 127], numpy.int8)
+    waveform = Waveform(scope, 1, raw, 0.5, 1., -1e-3, 1e-3)
+    assert "volts" not in waveform.__dict__
+    expected = scope.convert_waveforms({1: raw}, {1: 0.5}, {1: 1.})[1]
+    assert numpy.array_equal(waveform.volts, expected)
+    assert waveform.volts is waveform.volts
+    assert waveform.minimum == pytest.approx(expected.min())
+    assert waveform.maximum == pytest.approx(expected.max())
+    assert waveform.mean == pytest.approx(expected.mean())
+    assert waveform.rms == pytest.approx(numpy.sqrt((expected ** 2).mean()))
+    assert waveform.interval == pytest.approx(4e-4)
+    assert waveform.times[0] == -1e-3
+    assert len(waveform.times) == len(waveform) == 5
+
+
+def test_get_waveforms(scope):
+    scope.set_channel_scale(1, 0.5)
+    snapshot = scope.get_settings_snapshot([1, 2])
+    expected = scope.get_waveforms([1, 2], snapshot.scales,
+                                   snapshot.positions)
+    waveforms = scope.get_waveforms([1, 2], waveforms=True)
+    assert sorted(waveforms) == [1, 2]
+    assert waveforms[1].scale == 0.5
+    assert waveforms[1].times is waveforms[2].times
+    for channel in (1, 2):
+        waveform = waveforms[channel]
+        assert len(waveform.volts) == len(expected[channel])
+        assert waveform.stop - waveform.start == pytest.approx(
+            scope.get_time_range())
+        # Same waveform, up to the simulated noise
+        error = waveform.volts - expected[channel]
+        assert numpy.abs(error).mean() < 0.1